@@ -0,0 +1,15 @@
+"""
+Reproducible benchmarks of the main kernels: graph loading, initial routes, simulate_danger,
+the neighborhood functions and full simulated annealing runs, on Road_layouts/example1-3.txt
+and on synthetic networks from synthetic_networks (1k - 100k edges).
+
+Run from the Problem_implementation directory:
+
+    python -m benchmarks --profile quick --output results.json
+    python -m benchmarks --profile quick --baseline results.json
+
+Results are written as JSON (ops/sec, peak memory, final danger for every case and kernel) and can be
+compared with a stored baseline - see runner.compare_with_baseline.
+"""
+
+from benchmarks.runner import PROFILES, run_benchmarks, compare_with_baseline
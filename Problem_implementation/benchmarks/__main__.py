@@ -0,0 +1,60 @@
+import argparse
+import json
+import sys
+import tempfile
+
+from benchmarks.cases import example_cases, synthetic_cases
+from benchmarks.runner import KERNELS, PROFILES, run_benchmarks, compare_with_baseline
+from synthetic_networks import TOPOLOGIES
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Road clearing benchmarks")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="quick")
+    parser.add_argument("--sizes", type=int, nargs="*",
+                        help="numbers of edges of synthetic graphs (default: taken from the profile)")
+    parser.add_argument("--topology", choices=sorted(TOPOLOGIES), default="grid",
+                        help="topology of synthetic graphs (see synthetic_networks)")
+    parser.add_argument("--no-examples", action="store_true", help="skip Road_layouts/example1-3.txt")
+    parser.add_argument("--kernels", nargs="*", choices=list(KERNELS), help="kernels to run (default: all)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-memory", action="store_true", help="do not measure peak memory (faster)")
+    parser.add_argument("--output", help="JSON file for the results (default: standard output)")
+    parser.add_argument("--baseline", help="JSON file with results to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed relative drop of ops/sec before reporting a regression")
+    args = parser.parse_args(argv)
+
+    sizes = PROFILES[args.profile]["sizes"] if args.sizes is None else args.sizes
+
+    def log(line):
+        print(line, file=sys.stderr)
+
+    with tempfile.TemporaryDirectory() as directory:
+        cases = [] if args.no_examples else example_cases()
+        cases += synthetic_cases(sizes, directory, args.seed, args.topology)
+        results = run_benchmarks(cases, args.profile, args.kernels, args.seed, not args.no_memory, log)
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        comparison = compare_with_baseline(results, baseline, args.tolerance)
+        log("\nComparison with baseline (speedup = current / baseline ops/sec):")
+        for row in comparison:
+            flag = "REGRESSION" if row["regression"] else ""
+            danger = " (final danger changed)" if row["danger_changed"] else ""
+            log(f"{row['case']:<18} {row['kernel']:<45} {row['speedup']:>6.2f}x {flag}{danger}")
+        if any(row["regression"] for row in comparison):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,26 @@
+"""
+Benchmark inputs: the example road layouts and synthetic networks (synthetic_networks) written in the same .txt format.
+"""
+
+import os
+
+from synthetic_networks import write_layout
+
+ROAD_LAYOUTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                                "Road_layouts")
+EXAMPLE_LAYOUTS = ["example1.txt", "example2.txt", "example3.txt"]
+
+
+def example_cases():
+    # (case name, path of the layout file)
+    return [(os.path.splitext(name)[0], os.path.join(ROAD_LAYOUTS_DIR, name)) for name in EXAMPLE_LAYOUTS]
+
+
+def synthetic_cases(sizes, directory, seed=0, topology="grid"):
+    # Writes synthetic layouts of the requested sizes (directed edges) to 'directory' and returns (case name, path) pairs
+    cases = []
+    for size in sizes:
+        path = os.path.join(directory, f"{topology}_{size}.txt")
+        write_layout(path, topology, size, seed)
+        cases.append((f"{topology}_{size}", path))
+    return cases
@@ -0,0 +1,272 @@
+"""
+Benchmark kernels, timing/memory measurement and comparison with a baseline.
+"""
+
+import gc
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import data_structures
+from map_import import load_graph_from_file
+from solution import RoadClearingProblem, Machine, OPERATOR_NAMES
+
+SNOWFALL_FORECAST = [3, 4, 5, 6]
+MACHINE_SPEEDS = [30, 40, 50]
+TMAX = 2  # In hours
+
+PROFILES = {
+    # sizes - numbers of directed edges of synthetic graphs
+    "quick": {"sizes": [1000, 10000], "repeats": 3, "operator_calls": 20, "sa_iterations": 200},
+    "full": {"sizes": [1000, 10000, 100000], "repeats": 5, "operator_calls": 50, "sa_iterations": 500},
+}
+
+SA_PARAMETERS = {"initial_temperature": 100, "cooling_rate": 0.99}
+
+# Batched annealing is measured on an evaluation-bound run: a cheap neighborhood function (change_path) and
+# the vectorized evaluation, with and without batching - the ops/sec of the two kernels show the speedup
+BATCH_OPERATOR = 3
+BATCH_SIZE = 8
+
+# simulate_danger deep-copies the object graph and copy.deepcopy recurses along chains of neighbouring vertices:
+# the recursion limit is raised for it, but above this size the C stack overflows anyway, so the kernel is skipped
+SIMULATE_DANGER_MAX_EDGES = 20000
+SIMULATE_DANGER_RECURSION_LIMIT = 50000
+KERNEL_MAX_EDGES = {"simulate_danger": SIMULATE_DANGER_MAX_EDGES}
+
+
+def new_problem(graph, seed):
+    # Problem with fixed initial routes (Machine.generate_initial_route is random)
+    random.seed(seed)
+    return RoadClearingProblem(SNOWFALL_FORECAST, graph, [Machine(speed) for speed in MACHINE_SPEEDS], TMAX)
+
+
+# --- Kernels ---
+# Every kernel prepares its input and returns a function run() -> (number of operations, final danger or None).
+# run() is called several times, so it must start from the same state every time.
+
+def kernel_load_graph(path, graph, settings):
+    def run():
+        load_graph_from_file(path)
+        return 1, None
+    return run
+
+
+def kernel_initial_route(path, graph, settings):
+    machines = [Machine(speed) for speed in MACHINE_SPEEDS]
+
+    def run():
+        for machine in machines:
+            machine.generate_initial_route(graph, TMAX, len(SNOWFALL_FORECAST))
+        return len(machines), None
+    return run
+
+
+def kernel_simulate_danger(path, graph, settings):
+    problem = new_problem(graph, settings["seed"])
+
+    def run():
+        recursion_limit = sys.getrecursionlimit()
+        sys.setrecursionlimit(max(recursion_limit, SIMULATE_DANGER_RECURSION_LIMIT))
+        try:
+            return 1, problem.simulate_danger()
+        finally:
+            sys.setrecursionlimit(recursion_limit)
+    return run
+
+
+def make_operator_kernel(operator):
+    def kernel(path, graph, settings):
+        problem = new_problem(graph, settings["seed"])
+
+        def run():
+            # Each call starts from the initial solution - the move is undone right away
+            for _ in range(settings["operator_calls"]):
+                move = problem.generate_neighbor(0.5, [operator])
+                if move is not None:
+                    move.undo(problem.machines)
+            return settings["operator_calls"], None
+        return run
+    return kernel
+
+
+def kernel_simulated_annealing(path, graph, settings):
+    problem = new_problem(graph, settings["seed"])
+    initial_routes = data_structures.route_snapshot(problem.machines)
+
+    def run():
+        data_structures.restore_routes(problem.machines, initial_routes, graph)
+        _, best_danger, diagnostics = problem.simulated_annealing(
+            SA_PARAMETERS["initial_temperature"], SA_PARAMETERS["cooling_rate"], settings["sa_iterations"])
+        return len(diagnostics[0]) - 1, best_danger
+    return run
+
+
+def make_batch_kernel(batch_size):
+    def kernel(path, graph, settings):
+        problem = new_problem(graph, settings["seed"])
+        initial_routes = data_structures.route_snapshot(problem.machines)
+
+        def run():
+            data_structures.restore_routes(problem.machines, initial_routes, graph)
+            _, best_danger, diagnostics = problem.simulated_annealing(
+                SA_PARAMETERS["initial_temperature"], SA_PARAMETERS["cooling_rate"], settings["sa_iterations"],
+                choose_neighbour_function=[BATCH_OPERATOR], evaluation="vectorized", batch_size=batch_size)
+            return len(diagnostics[0]) - 1, best_danger
+        return run
+    return kernel
+
+
+KERNELS = {
+    "load_graph": kernel_load_graph,
+    "initial_route": kernel_initial_route,
+    "simulate_danger": kernel_simulate_danger,
+    **{f"operator_{operator}_{name}": make_operator_kernel(operator) for operator, name in OPERATOR_NAMES.items()},
+    "simulated_annealing": kernel_simulated_annealing,
+    "simulated_annealing_vectorized": make_batch_kernel(1),
+    f"simulated_annealing_vectorized_batch_{BATCH_SIZE}": make_batch_kernel(BATCH_SIZE),
+}
+
+
+# --- Measurement ---
+
+def measure(run, repeats, seed, memory=True):
+    """
+    Calls run() 'repeats' times (each time after seeding the random generator) and measures the time.
+    Peak memory is measured with tracemalloc in one additional call, so it does not distort the timing.
+    """
+    ops = 0
+    elapsed = 0.0
+    final_danger = None
+    for _ in range(repeats):
+        random.seed(seed)
+        gc.collect()
+        start = time.perf_counter()
+        done, final_danger = run()
+        elapsed += time.perf_counter() - start
+        ops += done
+
+    result = {
+        "repeats": repeats,
+        "ops": ops,
+        "time": elapsed,
+        "ops_per_sec": ops / elapsed if elapsed > 0 else float("inf"),
+        "final_danger": final_danger,
+    }
+
+    if memory:
+        random.seed(seed)
+        gc.collect()
+        tracemalloc.start()
+        try:
+            run()
+            result["peak_memory_kb"] = tracemalloc.get_traced_memory()[1] / 1024
+        finally:
+            tracemalloc.stop()
+
+    return result
+
+
+def run_benchmarks(cases, profile="quick", kernels=None, seed=0, memory=True, log=None):
+    """
+    Runs the kernels on every case. Kernels with a size limit (KERNEL_MAX_EDGES) are skipped on larger graphs -
+    their entries have a 'skipped' key instead of the measurements.
+
+    :param cases: list of (case name, path of a .txt layout)
+    :param profile: name of a profile from PROFILES (numbers of repeats, operator calls and SA iterations)
+    :param kernels: names of kernels to run (None - all kernels)
+    :param log: optional function called with a progress line after every measurement
+    :return: dict {'meta': {...}, 'results': [one dict per (case, kernel)]}
+    """
+    settings = dict(PROFILES[profile], seed=seed)
+    kernel_names = list(KERNELS) if kernels is None else kernels
+
+    results = []
+    for case, path in cases:
+        graph = load_graph_from_file(path)
+        for kernel_name in kernel_names:
+            # Full SA runs are much longer than the other kernels - one run is enough
+            repeats = 1 if kernel_name.startswith("simulated_annealing") else settings["repeats"]
+            entry = {"case": case, "edges": len(graph.edges), "vertices": len(graph.vertices), "kernel": kernel_name}
+            max_edges = KERNEL_MAX_EDGES.get(kernel_name)
+            if max_edges is not None and len(graph.edges) > max_edges:
+                entry["skipped"] = f"more than {max_edges} edges"
+                results.append(entry)
+                if log is not None:
+                    log(format_result(entry))
+                continue
+            try:
+                run = KERNELS[kernel_name](path, graph, settings)
+                entry.update(measure(run, repeats, seed, memory))
+            except Exception as e:  # A failing kernel must not stop the whole suite
+                entry["error"] = f"{type(e).__name__}: {e}"
+            results.append(entry)
+            if log is not None:
+                log(format_result(entry))
+
+    return {"meta": environment_info(profile, seed), "results": results}
+
+
+def environment_info(profile, seed):
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                                timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+
+    return {
+        "profile": profile,
+        "settings": dict(PROFILES[profile], seed=seed, snowfall_forecast=SNOWFALL_FORECAST,
+                         machine_speeds=MACHINE_SPEEDS, Tmax=TMAX, **SA_PARAMETERS),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def format_result(entry):
+    name = f"{entry['case']:<18} {entry['kernel']:<45}"
+    if "error" in entry:
+        return f"{name} ERROR {entry['error']}"
+    if "skipped" in entry:
+        return f"{name} skipped ({entry['skipped']})"
+    memory = f"{entry['peak_memory_kb']:>10.0f} KiB" if "peak_memory_kb" in entry else ""
+    danger = f"  danger={entry['final_danger']}" if entry["final_danger"] is not None else ""
+    return f"{name} {entry['ops_per_sec']:>12.2f} ops/s {memory}{danger}"
+
+
+# --- Baseline comparison ---
+
+def compare_with_baseline(current, baseline, tolerance=0.2):
+    """
+    Compares results with a baseline produced by run_benchmarks (matched by case and kernel).
+
+    A kernel is a regression if its ops/sec dropped by more than 'tolerance' (fraction) or its final danger
+    changed (with fixed seeds the danger should be identical unless the algorithm changed).
+
+    :return: list of dicts (one per matched entry) with keys 'case', 'kernel', 'speedup' (current / baseline
+             ops/sec), 'danger_changed', 'regression'
+    """
+    baseline_results = {(entry["case"], entry["kernel"]): entry for entry in baseline["results"]}
+
+    comparison = []
+    for entry in current["results"]:
+        reference = baseline_results.get((entry["case"], entry["kernel"]))
+        # Failed and skipped kernels have no measurements
+        if reference is None or "ops_per_sec" not in entry or "ops_per_sec" not in reference:
+            continue
+
+        speedup = entry["ops_per_sec"] / reference["ops_per_sec"]
+        danger_changed = entry["final_danger"] != reference["final_danger"]
+        comparison.append({
+            "case": entry["case"],
+            "kernel": entry["kernel"],
+            "speedup": speedup,
+            "danger_changed": danger_changed,
+            "regression": speedup < 1 - tolerance or danger_changed,
+        })
+    return comparison
@@ -0,0 +1,192 @@
+"""
+Binary, memory-mappable road network format (.rcg) for CompactGraph.
+
+The file holds the CSR arrays of CompactGraph exactly as they are kept in memory, so open_binary_graph maps
+them with np.memmap without parsing or copying: loading is independent of the network size and processes
+opening the same file share its pages through the OS page cache. A CompactGraph opened from a file is also
+pickled as a reference to the file (see CompactGraph.__reduce_ex__), so worker processes of
+parallel_simulated_annealing/parallel_tempering and road_clearing_cli map the file instead of receiving
+a copy of the arrays.
+
+Layout (little-endian):
+- header (HEADER_SIZE bytes): magic b"RCGRAPH\\0", format version (uint32), flags (uint32, bit 0 - true_location),
+  number of vertices (int64), number of edges (int64), base vertex (int64, -1 - no base),
+  then the byte offset (int64) of every array in ARRAYS and OPTIONAL_ARRAYS (0 - optional array not stored)
+- arrays in the order of ARRAYS and OPTIONAL_ARRAYS, each aligned to ALIGNMENT bytes
+
+Convert a .txt layout:
+
+    python binary_graph.py ../Road_layouts/example1.txt example1.rcg
+"""
+
+import argparse
+import os
+import struct
+
+import numpy as np
+
+from data_structures import CompactGraph
+
+MAGIC = b"RCGRAPH\0"
+FORMAT_VERSION = 1
+EXTENSION = ".rcg"
+
+FLAG_TRUE_LOCATION = 1
+
+# (CompactGraph attribute, dtype, length: "vertices", "vertices+1" or "edges")
+ARRAYS = [
+    ("vertex_x", "<f8", "vertices"),
+    ("vertex_y", "<f8", "vertices"),
+    ("offsets", "<i8", "vertices+1"),
+    ("sources", "<i4", "edges"),
+    ("targets", "<i4", "edges"),
+    ("edge_length", "<f8", "edges"),
+    ("edge_priority", "<i2", "edges"),
+    ("edge_lanes", "<i2", "edges"),
+    ("reverse", "<i4", "edges"),
+]
+
+# Arrays stored only if the attribute is not None (files without them have zero offsets in the header)
+OPTIONAL_ARRAYS = [
+    ("osm_node_ids", "<i8", "vertices"),
+]
+
+_HEADER = struct.Struct("<8sIIqqq" + "q" * (len(ARRAYS) + len(OPTIONAL_ARRAYS)))
+HEADER_SIZE = 128
+ALIGNMENT = 64
+
+
+def _array_length(kind, num_vertices, num_edges):
+    return {"vertices": num_vertices, "vertices+1": num_vertices + 1, "edges": num_edges}[kind]
+
+
+def is_binary_graph(path):
+    # Whether the file starts with the .rcg magic bytes
+    with open(path, "rb") as file:
+        return file.read(len(MAGIC)) == MAGIC
+
+
+def write_binary_graph(graph, path):
+    """
+    Writes a Graph or CompactGraph to a .rcg file (atomically - through a temporary file and os.replace).
+    Vertex and edge ids of a CompactGraph are preserved; a Graph is converted with CompactGraph.from_graph.
+    """
+    if not isinstance(graph, CompactGraph):
+        graph = CompactGraph.from_graph(graph)
+
+    num_vertices = len(graph.vertex_x)
+    num_edges = len(graph.targets)
+    arrays = []
+    offsets = []
+    position = HEADER_SIZE
+    for name, dtype, kind in ARRAYS + OPTIONAL_ARRAYS:
+        if getattr(graph, name) is None:
+            offsets.append(0)
+            continue
+        array = np.ascontiguousarray(getattr(graph, name), dtype=dtype)
+        if len(array) != _array_length(kind, num_vertices, num_edges):
+            raise ValueError(f"CompactGraph.{name} has {len(array)} elements, expected {kind}")
+        position = -(-position // ALIGNMENT) * ALIGNMENT
+        arrays.append((position, array))
+        offsets.append(position)
+        position += array.nbytes
+
+    header = _HEADER.pack(MAGIC, FORMAT_VERSION, FLAG_TRUE_LOCATION if graph.true_location else 0,
+                          num_vertices, num_edges, -1 if graph.base is None else graph.base, *offsets)
+
+    directory = os.path.dirname(os.path.abspath(path))
+    temporary_path = os.path.join(directory, f".{os.path.basename(path)}.{os.getpid()}.tmp")
+    try:
+        with open(temporary_path, "wb") as file:
+            file.write(header.ljust(HEADER_SIZE, b"\0"))
+            for offset, array in arrays:
+                file.write(b"\0" * (offset - file.tell()))
+                file.write(memoryview(array).cast("B"))
+        os.replace(temporary_path, path)
+    except BaseException:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+        raise
+
+
+def read_header(path):
+    """
+    Reads and validates the header of a .rcg file.
+
+    :return: dict with keys 'version', 'true_location', 'vertices', 'edges', 'base' (None if not set)
+             and 'offsets' (array name -> byte offset; stored optional arrays only)
+    """
+    with open(path, "rb") as file:
+        data = file.read(HEADER_SIZE)
+        file_size = os.fstat(file.fileno()).st_size
+
+    if len(data) < _HEADER.size or data[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"{path}: not a binary road network file")
+    magic, version, flags, num_vertices, num_edges, base, *offsets = _HEADER.unpack_from(data)
+    if version != FORMAT_VERSION:
+        raise ValueError(f"{path}: unsupported format version {version} (supported: {FORMAT_VERSION})")
+
+    stored = {}
+    for index, ((name, dtype, kind), offset) in enumerate(zip(ARRAYS + OPTIONAL_ARRAYS, offsets)):
+        if offset == 0 and index >= len(ARRAYS):
+            continue
+        end = offset + _array_length(kind, num_vertices, num_edges) * np.dtype(dtype).itemsize
+        if offset < HEADER_SIZE or end > file_size:
+            raise ValueError(f"{path}: array '{name}' lies outside the file (truncated file?)")
+        stored[name] = offset
+
+    return {
+        'version': version,
+        'true_location': bool(flags & FLAG_TRUE_LOCATION),
+        'vertices': num_vertices,
+        'edges': num_edges,
+        'base': None if base < 0 else base,
+        'offsets': stored,
+    }
+
+
+def open_binary_graph(path, base=None):
+    """
+    Opens a .rcg file as a CompactGraph backed by read-only memory maps (no parsing, no copies).
+
+    :param base: base vertex index overriding the one stored in the file (None - keep the stored one)
+    """
+    header = read_header(path)
+    num_vertices, num_edges = header['vertices'], header['edges']
+
+    arrays = {}
+    for name, dtype, kind in ARRAYS + OPTIONAL_ARRAYS:
+        length = _array_length(kind, num_vertices, num_edges)
+        if name not in header['offsets']:
+            arrays[name] = None
+        elif length == 0:
+            arrays[name] = np.zeros(0, dtype=dtype)
+        else:
+            arrays[name] = np.memmap(path, dtype=dtype, mode="r", offset=header['offsets'][name], shape=(length,))
+
+    optional = {name: arrays.pop(name) for name, _, _ in OPTIONAL_ARRAYS}
+    graph = CompactGraph(base=header['base'] if base is None else base,
+                         true_location=header['true_location'], **arrays)
+    for name, array in optional.items():
+        setattr(graph, name, array)
+    graph.mapped_file = os.path.abspath(path)
+    return graph
+
+
+def main(argv=None):
+    from map_import import load_graph_from_file
+
+    parser = argparse.ArgumentParser(description="Convert a road layout to the binary .rcg format")
+    parser.add_argument("input", help=".txt road layout (or another .rcg file)")
+    parser.add_argument("output", help="output .rcg file")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="worker processes parsing a .txt layout while the graph is built (default: 0)")
+    args = parser.parse_args(argv)
+
+    graph = load_graph_from_file(args.input, graph_cls=CompactGraph, parse_workers=args.workers)
+    write_binary_graph(graph, args.output)
+    print(f"{args.output}: {len(graph.vertex_x)} vertices, {len(graph.targets)} edges")
+
+
+if __name__ == "__main__":
+    main()
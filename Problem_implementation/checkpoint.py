@@ -0,0 +1,202 @@
+"""
+Checkpoints of simulated annealing chains (see RoadClearingProblem.simulated_annealing and resume_from).
+
+A checkpoint is an uncompressed NumPy .npz archive:
+- 'meta' - UTF-8 JSON with the scalar state (format version, iteration, temperature, dangers, SA parameters,
+  cooling schedule state, problem description, operator statistics, ...)
+- 'current_routes', 'best_routes' - routes as edge ids: flat int32 array of edge ids plus 'stage_lengths'
+  (int32, machines x stages)
+- 'danger_history', 'current_danger_history', 'temperature_history' - float64 diagnostics so far
+- 'random_state' - state of the 'random' module (uint32 Mersenne Twister words)
+- 'usage_routes', 'usage_stage_lengths', 'usage_order' - state of the edge usage index (edge_usage.EdgeUsageIndex:
+  routes recorded by the index and the order of its street queue; optional)
+
+Files are replaced atomically (written to a temporary file in the same directory, then os.replace), so
+a crash during a write leaves the previous checkpoint intact.
+"""
+
+import json
+import logging
+import os
+import random
+import threading
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_VERSION = 1
+
+
+def _encode_routes(routes):
+    # routes: list (machines) of lists (stages) of edge ids or Edge objects
+    stage_lengths = np.array([[len(stage) for stage in route] for route in routes], dtype=np.int32)
+    edge_ids = np.fromiter((edge if isinstance(edge, int) else edge.id
+                            for route in routes for stage in route for edge in stage),
+                           dtype=np.int32, count=int(stage_lengths.sum()))
+    return edge_ids, stage_lengths
+
+
+def _decode_routes(edge_ids, stage_lengths):
+    edge_ids = edge_ids.tolist()
+    routes = []
+    position = 0
+    for lengths in stage_lengths.tolist():
+        route = []
+        for length in lengths:
+            route.append(edge_ids[position:position + length])
+            position += length
+        routes.append(route)
+    return routes
+
+
+def save_checkpoint(path, state):
+    """
+    Writes a checkpoint atomically.
+
+    :param state: dict with keys 'meta' (JSON-serializable dict), 'current_routes', 'best_routes' (lists of stages
+                  of edge ids or Edge objects), 'history' (the three diagnostics lists, may be longer than
+                  meta['iteration'] + 1 - only that prefix is saved), 'random_state' (random.getstate()) and
+                  optionally 'usage' (EdgeUsageIndex.state())
+    """
+    meta = dict(state['meta'], version=CHECKPOINT_VERSION)
+    length = meta['iteration'] + 1
+    version, words, gauss_next = state['random_state']
+    meta['random_version'] = version
+    meta['random_gauss_next'] = gauss_next
+
+    current_edges, current_lengths = _encode_routes(state['current_routes'])
+    best_edges, best_lengths = _encode_routes(state['best_routes'])
+    danger, current_danger, temperature = (np.array(history[:length], dtype=np.float64)
+                                           for history in state['history'])
+    usage = {}
+    if state.get('usage') is not None:
+        usage_routes, usage_order = state['usage']
+        usage['usage_routes'], usage['usage_stage_lengths'] = _encode_routes(usage_routes)
+        usage['usage_order'] = np.array(usage_order, dtype=np.int32)
+
+    directory = os.path.dirname(os.path.abspath(path))
+    temporary_path = os.path.join(directory, f".{os.path.basename(path)}.{os.getpid()}.tmp")
+    try:
+        with open(temporary_path, "wb") as file:
+            np.savez(file,
+                     meta=np.frombuffer(json.dumps(meta).encode("utf-8"), dtype=np.uint8),
+                     current_routes=current_edges, current_stage_lengths=current_lengths,
+                     best_routes=best_edges, best_stage_lengths=best_lengths,
+                     danger_history=danger, current_danger_history=current_danger,
+                     temperature_history=temperature,
+                     random_state=np.array(words, dtype=np.uint32),
+                     **usage)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary_path, path)
+    except BaseException:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+        raise
+
+
+def load_checkpoint(path):
+    """
+    Reads a checkpoint written by save_checkpoint.
+
+    :return: dict with keys 'meta', 'current_routes', 'best_routes' (lists of stages of edge ids), 'history'
+             (three lists: dangers, current dangers, temperatures), 'random_state' (for random.setstate) and
+             'usage' ((recorded routes as edge ids, queue order) for EdgeUsageIndex.restore, None if not saved)
+    """
+    with np.load(path, allow_pickle=False) as archive:
+        meta = json.loads(archive['meta'].tobytes().decode("utf-8"))
+        if meta.get('version') != CHECKPOINT_VERSION:
+            raise ValueError(f"{path}: unsupported checkpoint version {meta.get('version')}")
+
+        return {
+            'meta': meta,
+            'current_routes': _decode_routes(archive['current_routes'], archive['current_stage_lengths']),
+            'best_routes': _decode_routes(archive['best_routes'], archive['best_stage_lengths']),
+            'history': [archive['danger_history'].tolist(), archive['current_danger_history'].tolist(),
+                        archive['temperature_history'].tolist()],
+            'random_state': (meta['random_version'], tuple(archive['random_state'].tolist()),
+                             meta['random_gauss_next']),
+            'usage': ((_decode_routes(archive['usage_routes'], archive['usage_stage_lengths']),
+                       archive['usage_order'].tolist()) if 'usage_order' in archive else None),
+        }
+
+
+class CheckpointWriter:
+    """
+    Writes checkpoints of a running chain in a background thread, so the annealing loop only captures its state.
+
+    The captured state holds references to the routes and diagnostics lists, not copies: routes are never
+    modified in place and the diagnostics lists only grow, so the writer can convert them later. If the loop
+    submits a new checkpoint while the previous one is still being written, only the newest one is written next.
+
+    :param every: checkpoint interval in iterations (None - not used)
+    :param interval: checkpoint interval in seconds (None - not used)
+    :param start_iteration: number of iterations done before the writer was created (resumed chains)
+    """
+
+    def __init__(self, path, every=None, interval=None, start_iteration=0):
+        self.path = path
+        self.every = every
+        self.interval = interval
+        self.written = 0  # Number of written checkpoints
+        self.error = None  # Last exception raised by a write (logged; the chain keeps running)
+
+        self._last_iteration = start_iteration
+        self._last_time = time.perf_counter()
+        self._pending = None
+        self._closed = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="checkpoint-writer", daemon=True)
+        self._thread.start()
+
+    def due(self, iteration):
+        # Whether a periodic checkpoint should be written after 'iteration' completed iterations
+        if self.every is not None and iteration - self._last_iteration >= self.every:
+            return True
+        return self.interval is not None and time.perf_counter() - self._last_time >= self.interval
+
+    def submit(self, state):
+        self._last_iteration = state['meta']['iteration']
+        self._last_time = time.perf_counter()
+        with self._condition:
+            self._pending = state
+            self._condition.notify()
+
+    def close(self):
+        # Waits until the last submitted checkpoint is written
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._pending is None and not self._closed:
+                    self._condition.wait()
+                state, self._pending = self._pending, None
+            if state is None:
+                return
+            try:
+                save_checkpoint(self.path, state)
+                self.written += 1
+            except Exception as e:  # A failed checkpoint must not stop the chain
+                self.error = e
+                logger.warning("Failed to write checkpoint %s: %s", self.path, e)
+
+
+def capture_state(meta, machines, best_routes, history, usage_index=None):
+    """
+    Captures the state of a chain for CheckpointWriter.submit - cheap, no copies of routes or diagnostics
+    (see CheckpointWriter); only the street queue order of 'usage_index' is copied.
+    """
+    return {
+        'meta': meta,
+        'current_routes': [machine.route for machine in machines],
+        'best_routes': best_routes,
+        'history': history,
+        'random_state': random.getstate(),
+        'usage': usage_index.state() if usage_index is not None else None,
+    }
@@ -0,0 +1,281 @@
+"""
+Cooling schedules of simulated annealing (see RoadClearingProblem.simulated_annealing, 'schedule' parameter).
+
+A schedule owns the temperature of a chain: the annealing loop runs an iteration at 'temperature', then calls
+'update' with the outcome of the step and continues with the returned temperature.
+
+Available schedules (SCHEDULES - selected by name):
+- "geometric" - T <- T * cooling_rate (default, the original schedule)
+- "lundy_mees" - T <- T / (1 + beta * T) (Lundy & Mees)
+- "logarithmic" - T_k = T_0 / (1 + c * ln(1 + k))
+- "adaptive" - T <- T * exp(gain * (target - rate)), where 'rate' is the acceptance rate over the last 'window'
+  iterations and 'target' falls geometrically from 'target_acceptance' to 'final_acceptance' at max_iterations
+
+By default the first step of "lundy_mees" equals a geometric step (beta = (1 / cooling_rate - 1) / T_0) and
+"logarithmic" ends at the same temperature as "lundy_mees" - both cool slower and slower instead of freezing
+halfway through the iteration budget; 'final_temperature' sets the temperature at max_iterations instead.
+
+Every schedule can reheat: with 'reheat_after' = N the temperature is raised to 'reheat_temperature' (default:
+half of the initial temperature) when the best danger has not improved for N iterations, and instead of stopping
+the chain when it falls below 'min_temperature'; 'max_reheats' limits the number of reheats.
+
+The decisions of a schedule (reheats; acceptance rates and targets of the adaptive schedule, once per window)
+are appended to 'decisions' - dicts with keys 'iteration', 'decision', 'temperature' and decision-specific ones.
+The state of a schedule is JSON-serializable (state/restore), so checkpointed chains resume bit-exactly.
+"""
+
+import math
+from collections import deque
+
+MIN_TEMPERATURE = 1e-3  # The chain stops below this temperature (unless the schedule reheats)
+
+
+class CoolingSchedule:
+    """
+    Base class of the schedules - geometric cooling and reheating.
+
+    :param options: schedule options - COMMON_OPTIONS and the OPTIONS of the schedule (ValueError for unknown ones)
+    """
+    name = "geometric"
+    COMMON_OPTIONS = {'reheat_after': None, 'reheat_temperature': None, 'max_reheats': None,
+                      'min_temperature': MIN_TEMPERATURE}
+    OPTIONS = {}
+
+    def __init__(self, initial_temperature, cooling_rate, max_iterations, **options):
+        unknown = set(options) - set(self.COMMON_OPTIONS) - set(self.OPTIONS)
+        if unknown:
+            raise ValueError(f"unknown options of the '{self.name}' schedule: {', '.join(sorted(unknown))}")
+        self.options = dict(self.COMMON_OPTIONS, **self.OPTIONS)
+        self.options.update(options)
+
+        self.initial_temperature = initial_temperature
+        self.cooling_rate = cooling_rate
+        self.max_iterations = max_iterations
+        self.min_temperature = self.options['min_temperature']
+        self.reheat_after = self.options['reheat_after']
+        self.reheat_temperature = self.options['reheat_temperature']
+        if self.reheat_temperature is None:
+            self.reheat_temperature = initial_temperature / 2
+        self.max_reheats = self.options['max_reheats']
+        if self.reheat_after is not None and self.reheat_after < 1:
+            raise ValueError("'reheat_after' must be a positive number of iterations")
+
+        self.temperature = initial_temperature
+        self.stagnation = 0  # Iterations since the last improvement of the best danger
+        self.reheats = 0
+        self.decisions = []
+
+    def final_temperature(self):
+        # Temperature at max_iterations of the schedules with derived parameters (see the module), >= min_temperature
+        final = self.options.get('final_temperature')
+        if final is None:
+            final = self.initial_temperature / (1 + (1 / self.cooling_rate - 1) * self.max_iterations)
+        return max(final, self.min_temperature)
+
+    def next_temperature(self, temperature, iteration):
+        # Temperature of the iteration following 'iteration' (run at 'temperature') - without feedback and reheating
+        return temperature * self.cooling_rate
+
+    def observe(self, iteration, accepted):
+        # Feedback from the outcome of an iteration (adaptive schedules)
+        pass
+
+    def restart(self, iteration):
+        # Called after a reheat - the schedule continues from the new temperature
+        pass
+
+    def update(self, iteration, accepted, improved):
+        """
+        Advances the schedule after iteration 'iteration'.
+
+        :param accepted: whether the move of the iteration was accepted
+        :param improved: whether the iteration improved the best danger
+        :return: temperature of the next iteration
+        """
+        self.stagnation = 0 if improved else self.stagnation + 1
+        self.observe(iteration, accepted)
+        self.temperature = self.next_temperature(self.temperature, iteration)
+
+        if self.can_reheat():
+            if self.stagnation >= self.reheat_after:
+                self.reheat(iteration, "stagnation")
+            elif self.temperature < self.min_temperature:
+                self.reheat(iteration, "frozen")
+        return self.temperature
+
+    def reheat(self, iteration, reason):
+        if self.temperature >= self.reheat_temperature:  # Still hot (adaptive schedules) - nothing to reheat
+            self.stagnation = 0
+            return
+        self.decisions.append({'iteration': iteration, 'decision': "reheat", 'reason': reason,
+                               'temperature': self.reheat_temperature, 'previous_temperature': self.temperature,
+                               'stagnation': self.stagnation})
+        self.temperature = self.reheat_temperature
+        self.stagnation = 0
+        self.reheats += 1
+        self.restart(iteration)
+
+    def can_reheat(self):
+        return self.reheat_after is not None and (self.max_reheats is None or self.reheats < self.max_reheats)
+
+    def preview(self, iteration, count):
+        """
+        Temperatures of up to 'count' iterations starting with 'iteration' (speculative steps of batched annealing
+        are generated with them). The preview ends with the first iteration after which the schedule could reheat,
+        so the temperatures are exactly those 'update' returns: in a batch only the last step can be accepted
+        (and improve the best danger), so the stagnation of the other steps is known in advance.
+        """
+        can_reheat = self.can_reheat()
+        if can_reheat:
+            count = min(count, max(self.reheat_after - self.stagnation, 1))
+        temperatures = [self.temperature]
+        for offset in range(count - 1):
+            temperature = self.next_temperature(temperatures[-1], iteration + offset)
+            if can_reheat and temperature < self.min_temperature:
+                break
+            temperatures.append(temperature)
+        return temperatures
+
+    def frozen(self):
+        # Whether the chain should stop (the temperature fell below min_temperature and was not reheated)
+        return self.temperature < self.min_temperature
+
+    def state(self):
+        # JSON-serializable state for checkpoints (the decisions are copied - the loop keeps appending to them)
+        return {'temperature': self.temperature, 'stagnation': self.stagnation, 'reheats': self.reheats,
+                'decisions': list(self.decisions)}
+
+    def restore(self, state):
+        self.temperature = state['temperature']
+        self.stagnation = state['stagnation']
+        self.reheats = state['reheats']
+        self.decisions = list(state['decisions'])
+
+
+class GeometricSchedule(CoolingSchedule):
+    name = "geometric"
+
+
+class LundyMeesSchedule(CoolingSchedule):
+    """T <- T / (1 + beta * T) - cools fast while hot and slowly near the end. beta=None - derived (see module)."""
+    name = "lundy_mees"
+    OPTIONS = {'beta': None, 'final_temperature': None}
+
+    def __init__(self, initial_temperature, cooling_rate, max_iterations, **options):
+        super().__init__(initial_temperature, cooling_rate, max_iterations, **options)
+        self.beta = self.options['beta']
+        if self.beta is None and self.options['final_temperature'] is None:
+            self.beta = (1 / cooling_rate - 1) / initial_temperature  # The first step equals a geometric one
+        elif self.beta is None:
+            self.beta = max((1 / self.final_temperature() - 1 / initial_temperature) / max(max_iterations, 1), 0.0)
+
+    def next_temperature(self, temperature, iteration):
+        return temperature / (1 + self.beta * temperature)
+
+
+class LogarithmicSchedule(CoolingSchedule):
+    """
+    T_k = T_0 / (1 + c * ln(1 + k)), k - iterations since the start (or the last reheat, which becomes T_0).
+    c=None - derived (see module).
+    """
+    name = "logarithmic"
+    OPTIONS = {'c': None, 'final_temperature': None}
+
+    def __init__(self, initial_temperature, cooling_rate, max_iterations, **options):
+        super().__init__(initial_temperature, cooling_rate, max_iterations, **options)
+        self.c = self.options['c']
+        if self.c is None:
+            self.c = max((initial_temperature / self.final_temperature() - 1) / math.log(1 + max(max_iterations, 1)),
+                         0.0)
+        self.reference_temperature = initial_temperature
+        self.reference_iteration = 0
+
+    def next_temperature(self, temperature, iteration):
+        return self.reference_temperature / (1 + self.c * math.log(2 + iteration - self.reference_iteration))
+
+    def restart(self, iteration):
+        self.reference_temperature = self.temperature
+        self.reference_iteration = iteration + 1
+
+    def state(self):
+        return dict(super().state(), reference_temperature=self.reference_temperature,
+                    reference_iteration=self.reference_iteration)
+
+    def restore(self, state):
+        super().restore(state)
+        self.reference_temperature = state['reference_temperature']
+        self.reference_iteration = state['reference_iteration']
+
+
+class AdaptiveSchedule(CoolingSchedule):
+    """
+    Steers the temperature towards a target acceptance rate measured over a sliding window of iterations
+    (the temperature is kept until the window is full). The rate and the target are recorded once per window.
+    """
+    name = "adaptive"
+    OPTIONS = {'window': 100, 'target_acceptance': 0.5, 'final_acceptance': 0.02, 'gain': 0.02}
+
+    def __init__(self, initial_temperature, cooling_rate, max_iterations, **options):
+        super().__init__(initial_temperature, cooling_rate, max_iterations, **options)
+        self.window = int(self.options['window'])
+        self.target_acceptance = self.options['target_acceptance']
+        self.final_acceptance = self.options['final_acceptance']
+        self.gain = self.options['gain']
+        if self.window < 1:
+            raise ValueError("'window' must be a positive number of iterations")
+        if not 0 < self.final_acceptance <= 1 or not 0 < self.target_acceptance <= 1:
+            raise ValueError("'target_acceptance' and 'final_acceptance' must be in (0, 1]")
+
+        self.outcomes = deque(maxlen=self.window)  # Acceptance of the last 'window' iterations
+        self.accepted = 0  # Number of accepted moves in 'outcomes'
+        self.factor = 1.0  # Multiplier of the temperature decided by the last observation
+
+    def target(self, iteration):
+        progress = min(iteration / max(self.max_iterations, 1), 1.0)
+        return self.target_acceptance * (self.final_acceptance / self.target_acceptance) ** progress
+
+    def observe(self, iteration, accepted):
+        if len(self.outcomes) == self.window:
+            self.accepted -= self.outcomes[0]
+        self.outcomes.append(accepted)
+        self.accepted += accepted
+        if len(self.outcomes) < self.window:
+            return
+
+        rate = self.accepted / self.window
+        target = self.target(iteration)
+        self.factor = math.exp(self.gain * (target - rate))
+        if (iteration + 1) % self.window == 0:
+            self.decisions.append({'iteration': iteration, 'decision': "adapt", 'acceptance_rate': rate,
+                                   'target': target, 'temperature': self.temperature * self.factor})
+
+    def next_temperature(self, temperature, iteration):
+        return temperature * self.factor
+
+    def preview(self, iteration, count):
+        # Once the window is full, every iteration changes the factor - the next temperature is known only then
+        return super().preview(iteration, min(count, max(self.window - len(self.outcomes), 1)))
+
+    def state(self):
+        return dict(super().state(), outcomes=[bool(outcome) for outcome in self.outcomes], factor=self.factor)
+
+    def restore(self, state):
+        super().restore(state)
+        self.outcomes = deque(state['outcomes'], maxlen=self.window)
+        self.accepted = sum(self.outcomes)
+        self.factor = state['factor']
+
+
+SCHEDULES = {schedule.name: schedule
+             for schedule in (GeometricSchedule, LundyMeesSchedule, LogarithmicSchedule, AdaptiveSchedule)}
+
+
+def get_schedule(name, initial_temperature, cooling_rate, max_iterations, options=None):
+    """
+    Creates a schedule from SCHEDULES by name.
+
+    :param options: dict of schedule options (None - defaults), see the schedule classes and COMMON_OPTIONS
+    """
+    if name not in SCHEDULES:
+        raise ValueError(f"Unknown cooling schedule: {name} (use {', '.join(SCHEDULES)})")
+    return SCHEDULES[name](initial_temperature, cooling_rate, max_iterations, **(options or {}))
@@ -0,0 +1,321 @@
+"""
+Danger evaluators used by the simulated annealing loop.
+
+All evaluators compute exactly the same value as RoadClearingProblem.simulate_danger:
+for every stage, streets cleared by any machine get snow level 0, every other street accumulates
+the stage's snowfall, and the danger of a stage is the sum of snow_level * priority * lanes over all
+(directed) edges of the road layout.
+"""
+
+import numpy as np
+from data_structures import CompactGraph
+
+
+def get_street_ids(road_layout):
+    """
+    Assigns an undirected street id to every directed edge of the road layout.
+    Two edges share a street id if they connect the same pair of vertices (as in Edge.__eq__),
+    so clearing one of them clears the other as well.
+
+    :return: (list street id per Edge.id, number of streets)
+    """
+    if isinstance(road_layout, CompactGraph):
+        first = np.minimum(road_layout.sources, road_layout.targets).astype(np.int64)
+        second = np.maximum(road_layout.sources, road_layout.targets).astype(np.int64)
+        _, street_of_edge = np.unique(first * len(road_layout.vertex_x) + second, return_inverse=True)
+        street_of_edge = street_of_edge.ravel().tolist()
+        return street_of_edge, (max(street_of_edge) + 1 if street_of_edge else 0)
+
+    streets = {}
+    street_of_edge = []
+    for edge in road_layout.edges:
+        start, end = edge.start.id, edge.end.id
+        key = (start, end) if start <= end else (end, start)
+        street_of_edge.append(streets.setdefault(key, len(streets)))
+    return street_of_edge, len(streets)
+
+
+def is_integer_forecast(snowfall_forecast):
+    # Whether all snowfall values are whole numbers (ints or integral floats) - then all dangers are exact
+    return all(float(snowfall).is_integer() for snowfall in snowfall_forecast)
+
+
+def get_edge_weights(road_layout):
+    # priority * lanes for every directed edge, indexed by Edge.id
+    if isinstance(road_layout, CompactGraph):
+        return (road_layout.edge_priority.astype(np.int64) * road_layout.edge_lanes).tolist()
+    return [edge.priority * edge.lanes for edge in road_layout.edges]
+
+
+class IncrementalDangerEvaluator:
+    """
+    Keeps, for every stage and street, the number of machines clearing it and the danger contributed by
+    each street. When a machine's route changes, only streets whose cleared/uncleared status changes in some
+    stage are re-simulated, so an update costs O(size of the route difference * number of stages)
+    instead of O(number of stages * number of edges).
+
+    The running total is identical to simulate_danger only if all sums are exact, i.e. for forecasts of whole
+    numbers (see is_integer_forecast) - other forecasts raise ValueError, because the running total would drift
+    from simulate_danger in the last bits (RoadClearingProblem.get_danger_evaluator uses
+    VectorizedDangerEvaluator for them instead).
+    """
+
+    def __init__(self, road_layout, snowfall_forecast, machines=None):
+        if not is_integer_forecast(snowfall_forecast):
+            raise ValueError("IncrementalDangerEvaluator requires a snowfall forecast of whole numbers")
+        self.snowfall_forecast = list(snowfall_forecast)
+        self.num_stages = len(self.snowfall_forecast)
+        self.street_of_edge, num_streets = get_street_ids(road_layout)
+
+        # Weight of a street = sum of priority * lanes of all its directed edges
+        self.street_weight = [0] * num_streets
+        for edge_id, weight in enumerate(get_edge_weights(road_layout)):
+            self.street_weight[self.street_of_edge[edge_id]] += weight
+
+        # clear_counts[stage][street] - how many times the street is cleared in the stage (all machines)
+        self.clear_counts = [[0] * num_streets for _ in range(self.num_stages)]
+
+        # Nothing is cleared initially - every street accumulates all the snowfall
+        uncleared_danger = self._accumulated_snow(())
+        self.street_danger = [weight * uncleared_danger for weight in self.street_weight]
+        self.total_danger = sum(self.street_danger)
+
+        self.machine_streets = []  # machine index -> list (per stage) of cleared street ids
+
+        if machines is not None:
+            self.sync(machines)
+
+    def _accumulated_snow(self, cleared_stages):
+        # Sum of the street's snow levels over all stages, given the stages in which it is cleared
+        snow_level = 0
+        total = 0
+        for stage, snowfall in enumerate(self.snowfall_forecast):
+            if stage in cleared_stages:
+                snow_level = 0
+            else:
+                snow_level += snowfall
+            total += snow_level
+        return total
+
+    def _route_streets(self, route):
+        street_of_edge = self.street_of_edge
+        return [[street_of_edge[edge.id] for edge in route[stage]] if stage < len(route) else []
+                for stage in range(self.num_stages)]
+
+    def update_machine(self, machine_index, route):
+        """
+        Replaces the route of one machine and updates the danger of affected streets.
+
+        :return: Total danger after the change.
+        """
+        return self._apply(machine_index, self._route_streets(route))
+
+    def _apply(self, machine_index, new_streets):
+        while len(self.machine_streets) <= machine_index:
+            self.machine_streets.append([[] for _ in range(self.num_stages)])
+
+        old_streets = self.machine_streets[machine_index]
+        changed = set()
+
+        for stage in range(self.num_stages):
+            if old_streets[stage] == new_streets[stage]:
+                continue
+
+            counts = self.clear_counts[stage]
+            for street in old_streets[stage]:
+                counts[street] -= 1
+                if counts[street] == 0:
+                    changed.add(street)
+            for street in new_streets[stage]:
+                if counts[street] == 0:
+                    changed.add(street)
+                counts[street] += 1
+
+        self.machine_streets[machine_index] = new_streets
+
+        for street in changed:
+            cleared_stages = {stage for stage in range(self.num_stages) if self.clear_counts[stage][street] > 0}
+            new_danger = self.street_weight[street] * self._accumulated_snow(cleared_stages)
+            self.total_danger += new_danger - self.street_danger[street]
+            self.street_danger[street] = new_danger
+
+        return self.total_danger
+
+    def sync(self, machines):
+        """
+        Brings the evaluator up to date with the current routes of all machines.
+        Only machines whose routes differ from the recorded ones are updated.
+
+        :return: Total danger of the solution.
+        """
+        for machine_index, machine in enumerate(machines):
+            new_streets = self._route_streets(machine.route)
+            if machine_index >= len(self.machine_streets) or self.machine_streets[machine_index] != new_streets:
+                self._apply(machine_index, new_streets)
+        return self.total_danger
+
+
+class VectorizedDangerEvaluator:
+    """
+    Evaluates the whole solution with NumPy array operations instead of a per-street Python loop and
+    without copying the road layout.
+
+    Cleared streets are represented as a boolean (stage x street) matrix built from the edge ids of the routes.
+    Snow levels of all edges are updated stage by stage with the same operations (and in the same order) as in
+    simulate_danger, and stage dangers are summed sequentially, so the result is bit-for-bit equal to it,
+    also for float snowfall forecasts.
+    """
+
+    def __init__(self, road_layout, snowfall_forecast):
+        self.snowfall_forecast = list(snowfall_forecast)
+        self.num_stages = len(self.snowfall_forecast)
+
+        street_of_edge, self.num_streets = get_street_ids(road_layout)
+        self.street_of_edge = np.asarray(street_of_edge, dtype=np.int64)
+
+        if isinstance(road_layout, CompactGraph):
+            priority, lanes = road_layout.edge_priority, road_layout.edge_lanes
+        else:
+            priority = [edge.priority for edge in road_layout.edges]
+            lanes = [edge.lanes for edge in road_layout.edges]
+
+        # Integer forecasts are simulated on integers (exact, like the Python ints in simulate_danger)
+        self.integer = all(isinstance(snowfall, int) for snowfall in self.snowfall_forecast)
+        self.dtype = np.int64 if self.integer else float
+        self.priority = np.asarray(priority, dtype=self.dtype)
+        self.lanes = np.asarray(lanes, dtype=self.dtype)
+
+        # Edges of a street are cleared together, so with integer forecasts the danger can be summed per street:
+        # snow level of the street * sum of priority * lanes of its edges (exact - the order of sums is irrelevant)
+        self.street_weight = np.zeros(self.num_streets, dtype=np.int64)
+        if self.integer:
+            np.add.at(self.street_weight, self.street_of_edge, self.priority * self.lanes)
+
+    def _stage_counts(self, routes):
+        # (stage x street) array - how many times each street is cleared in each stage by the given routes
+        counts = np.zeros((self.num_stages, self.num_streets), dtype=np.int64)
+        for stage in range(self.num_stages):
+            edge_ids = [edge.id for route in routes if stage < len(route) for edge in route[stage]]
+            if edge_ids:
+                counts[stage] = np.bincount(self.street_of_edge[edge_ids], minlength=self.num_streets)
+        return counts
+
+    def _street_dangers(self, counts):
+        # Danger of every street (column of 'counts', stage x streets) summed over stages - integer forecasts only
+        snow_level = np.zeros(counts.shape[1], dtype=np.int64)
+        danger = np.zeros(counts.shape[1], dtype=np.int64)
+        for stage, snowfall in enumerate(self.snowfall_forecast):
+            snow_level = np.where(counts[stage] > 0, 0, snow_level + snowfall)
+            danger += snow_level
+        return danger
+
+    def evaluate_moves(self, machines, moves):
+        """
+        Evaluates several alternative moves from the current solution in one vectorized call.
+        The machines must be in the state before the moves (every move is applied alone to that state).
+
+        With an integer forecast the current solution is simulated once (per street) and every move only on
+        the streets of its changed stages, all moves together - a batch costs one evaluation plus O(size of
+        the moves), which makes batched annealing (speculative_steps) cheaper than evaluating candidates one by one.
+        Other forecasts simulate every candidate on all edges, in the order of simulate_danger.
+
+        :param moves: list of Move objects (None -> unchanged solution)
+        :return: list of total danger levels, one per move
+        """
+        fleet_counts = self._stage_counts([machine.route for machine in machines])
+        if not self.integer:
+            return self._evaluate_moves_fully(machines, moves, fleet_counts)
+
+        street_danger = self._street_dangers(fleet_counts) * self.street_weight
+        current_danger = int(street_danger.sum())
+
+        # Edges of the changed stages of all moves: (move, stage, edge id, -1 before / +1 after the move)
+        move_indices, stages, edge_ids, signs = [], [], [], []
+        for k, move in enumerate(moves):
+            if move is None:
+                continue
+            for stage in move.changed_stages:
+                if stage >= self.num_stages:
+                    continue
+                for sign, stage_edges in ((-1, move.previous_stages.get(stage, ())),
+                                          (1, move.new_stages.get(stage, ()))):
+                    edge_ids.extend(edge.id for edge in stage_edges)
+                    added = len(edge_ids) - len(signs)
+                    move_indices.extend([k] * added)
+                    stages.extend([stage] * added)
+                    signs.extend([sign] * added)
+
+        delta_danger = np.zeros(len(moves), dtype=np.int64)
+        if edge_ids:
+            # Every (move, street) pair is simulated again with the counts changed by the move
+            keys, columns = np.unique(np.asarray(move_indices) * self.num_streets + self.street_of_edge[edge_ids],
+                                      return_inverse=True)
+            key_moves, key_streets = np.divmod(keys, self.num_streets)
+            counts = fleet_counts[:, key_streets]
+            np.add.at(counts, (stages, columns.ravel()), signs)
+            new_danger = self._street_dangers(counts) * self.street_weight[key_streets]
+            np.add.at(delta_danger, key_moves, new_danger - street_danger[key_streets])
+
+        return (current_danger + delta_danger).tolist()
+
+    def _evaluate_moves_fully(self, machines, moves, fleet_counts):
+        # Every candidate simulated on all edges (candidate x stage x edge arrays), bit-exact for float forecasts
+
+        candidate_counts = np.empty((len(moves), self.num_stages, self.num_streets), dtype=np.int64)
+        for k, move in enumerate(moves):
+            candidate_counts[k] = fleet_counts
+            if move is not None:
+                route = machines[move.machine_index].route
+                candidate_counts[k] += self._stage_counts([move.route_after(route)]) - self._stage_counts([route])
+
+        # (candidate x stage x edge)
+        cleared = (candidate_counts > 0)[:, :, self.street_of_edge]
+        snow_level = np.zeros((len(moves), len(self.street_of_edge)), dtype=self.dtype)
+
+        total_danger = np.zeros(len(moves), dtype=self.dtype)
+        for stage, snowfall in enumerate(self.snowfall_forecast):
+            snow_level = np.where(cleared[:, stage], 0, snow_level + snowfall)
+
+            danger = snow_level * self.priority * self.lanes
+            if self.integer:
+                total_danger += danger.sum(axis=1)
+            elif danger.shape[1]:
+                total_danger += np.add.accumulate(danger, axis=1)[:, -1]
+
+        return total_danger.tolist()
+
+    def cleared_matrix(self, machines):
+        """
+        :return: boolean array (stage x street) - True if the street is cleared by any machine in the stage.
+        """
+        cleared = np.zeros((self.num_stages, self.num_streets), dtype=bool)
+        for stage in range(self.num_stages):
+            edge_ids = [edge.id for machine in machines for edge in machine.route[stage]]
+            if edge_ids:
+                cleared[stage, self.street_of_edge[edge_ids]] = True
+        return cleared
+
+    def evaluate(self, machines):
+        """
+        :return: Total danger level, equal to RoadClearingProblem.simulate_danger for the same routes.
+        """
+        # Expand the street matrix to directed edges
+        cleared = self.cleared_matrix(machines)[:, self.street_of_edge]
+        snow_level = np.zeros(len(self.street_of_edge), dtype=self.dtype)
+
+        total_danger = 0
+        for stage, snowfall in enumerate(self.snowfall_forecast):
+            # Accumulate snow on uncleared streets, reset it on cleared ones
+            snow_level = np.where(cleared[stage], 0, snow_level + snowfall)
+
+            danger = snow_level * self.priority * self.lanes
+            if self.integer:
+                stage_level = int(danger.sum())
+            elif len(danger):
+                # Sequential summation (as Python's sum) keeps float results bit-identical
+                stage_level = float(np.add.accumulate(danger)[-1])
+            else:
+                stage_level = 0
+            total_danger += stage_level
+
+        return total_danger
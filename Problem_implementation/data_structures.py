@@ -1,7 +1,27 @@
+import heapq
 import math
-import matplotlib.pyplot as plt
-import networkx as nx
-from geopy.distance import geodesic
+from collections import OrderedDict
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088  # Średni promień Ziemi (IUGG)
+
+
+DETOUR_CACHE_SIZE = 4096  # Maksymalna liczba objazdów zapamiętywanych przez graf (patrz LRUCache)
+
+
+def haversine_km(x1, y1, x2, y2):
+    """
+    Odległość po ortodromie (wzór haversine) w kilometrach.
+    Działa zarówno dla liczb, jak i dla tablic NumPy (x - długość, y - szerokość geograficzna).
+    """
+    lon1, lat1, lon2, lat2 = (np.radians(c) for c in (x1, y1, x2, y2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+def euclidean_distance(x1, y1, x2, y2):
+    # Ta sama kolejność działań co w Vertex.get_distance, więc wynik jest identyczny bit w bit
+    return np.sqrt((x1 - x2) ** 2 + (y1 - y2) ** 2)
 
 
 class Vertex:  # Obrazuje poczatek/koniec ulicy lub skrzyzowanie ulic
@@ -10,6 +30,8 @@ class Vertex:  # Obrazuje poczatek/koniec ulicy lub skrzyzowanie ulic
         self.y = y 
         self.neighbors = []  # Lista sąsiednich wierzcholkow
         self.true_location = true_location
+        self.id = None  # Indeks w Graph.vertices (nadawany przez Graph.add_vertex)
+        self.osm_id = None  # Identyfikator węzła OSM (grafy z map_import, patrz Graph.set_osm_node_ids) lub None
 
     def add_neighbor(self, edge):
         if edge not in self.neighbors:  # Dodaj tylko jeśli nie ma jeszcze takiego sąsiada
@@ -32,25 +54,24 @@ class Vertex:  # Obrazuje poczatek/koniec ulicy lub skrzyzowanie ulic
     def get_distance(self, other):
 
         if self.true_location:
-            coords_self = (self.y, self.x)  # (latitude, longitude) dla bieżącego punktu
-            coords_other = (other.y, other.x)  # (latitude, longitude) dla punktu 'other'
-
-            # Oblicz odległość geodezyjną między dwoma punktami
-            return geodesic(coords_self, coords_other).meters / 1000  # Odległość w kilometrach
+            # Odległość po powierzchni Ziemi w kilometrach (x - długość, y - szerokość geograficzna)
+            return float(haversine_km(self.x, self.y, other.x, other.y))
 
         else:
             return math.sqrt((self.x - other.x) ** 2 + (self.y - other.y) ** 2)
 
 
 class Edge:  # Obrazuje ulice polaczona przez dwa wierzcholki
-    def __init__(self, start, end, priority=0, lanes=1, true_location=True):
+    def __init__(self, start, end, priority=0, lanes=1, true_location=True, length=None):
         self.start = start
         self.end = end
         self.priority = priority   # priorytet w zakresie 0-100
         self.lanes = lanes  # ilosc pasow
         self.true_location = true_location
         self.snow_level = 0
-        self.length = self.calculate_length()
+        self.id = None  # Indeks w Graph.edges (nadawany przez Graph.add_edge)
+        # Długość można podać z góry (np. policzoną wektorowo dla całego grafu)
+        self.length = self.calculate_length() if length is None else length
 
     def calculate_length(self):
         return self.start.get_distance(self.end)
@@ -72,32 +93,81 @@ class Edge:  # Obrazuje ulice polaczona przez dwa wierzcholki
 
 
 class Graph:  # Obrazuje pelny rozklad ulic/skrzyzowan
-    def __init__(self, true_location=True):
+    def __init__(self, true_location=True, coord_precision=None):
         self.vertices = []
         self.edges = []
         self.baza = None  # Punkt początkowy (baza)
         self.true_location = true_location
+        # Liczba miejsc po przecinku, do której zaokrąglamy współrzędne przy szukaniu istniejących wierzchołków
+        # (None - porównanie dokładne)
+        self.coord_precision = coord_precision
+        self.osm_node_ids = None  # Identyfikatory węzłów OSM indeksowane id wierzchołka (grafy z map_import) lub None
+
+        # Indeksy przyspieszające wyszukiwanie wierzchołków i krawędzi (aktualizowane w add_vertex/add_edge)
+        self._vertex_index = {}  # klucz współrzędnych -> Vertex
+        self._edge_index = {}  # (klucz startu, klucz końca) -> Edge
+        self._outgoing_edges = {}  # klucz współrzędnych -> lista krawędzi wychodzących z wierzchołka
+
+        # Pamięć podręczna dla obliczeń wykonywanych w pętli SA
+        self._travel_times = {}  # prędkość maszyny -> lista czasów przejazdu indeksowana Edge.id
+        self._heuristic_cache = {}  # (id wierzchołka, id wierzchołka) -> odległość
+        self._path_tree = None  # Drzewo najkrótszych ścieżek z bazy (ShortestPathTree)
+        self.detour_cache = LRUCache(DETOUR_CACHE_SIZE)  # id usuniętej krawędzi -> objazd (change_path)
+
+    @classmethod
+    def from_edge_records(cls, records, true_location=True, base=None, coord_precision=None):
+        """
+        Buduje graf w jednym przebiegu po rekordach krawędzi.
+
+        Args:
+        - records: iterowalny zbiór krotek (punkt1, punkt2, priorytet, pasy), gdzie punkty to krotki (x, y)
+        - true_location: czy współrzędne są geograficzne (długość, szerokość)
+        - base: krotka (x, y) bazy lub None
+        - coord_precision: liczba miejsc po przecinku używana do utożsamiania wierzchołków (None - bez zaokrąglania)
+
+        Returns:
+        - graph: nowy obiekt Graph
+        """
+        graph = cls(true_location=true_location, coord_precision=coord_precision)
+
+        if base is not None:
+            graph.add_base(*base)
+
+        # Długości liczymy na końcu, jednym wektorowym wywołaniem dla wszystkich krawędzi
+        for punkt1, punkt2, priorytet, pasy in records:
+            graph.add_edge(punkt1, punkt2, priorytet, pasy, length=math.nan)
+        graph.compute_edge_lengths()
+
+        return graph
+
+    def _vertex_key(self, x, y):
+        if self.coord_precision is None:
+            return x, y
+        return round(x, self.coord_precision), round(y, self.coord_precision)
+
+    def set_osm_node_ids(self, osm_node_ids):
+        # Identyfikatory węzłów OSM indeksowane id wierzchołka - zapisywane też w Vertex.osm_id
+        self.osm_node_ids = osm_node_ids
+        for vertex, osm_id in zip(self.vertices, osm_node_ids.tolist()):
+            vertex.osm_id = osm_id
 
     def add_base(self, x, y):
-        # Sprawdzenie, czy wierzchołek o podanych współrzędnych już istnieje
-        for vertex in self.vertices:
-            if vertex.x == x and vertex.y == y:
-                self.baza = vertex  # Ustaw bazę na istniejący wierzchołek
-                return
-            
-        # Jeśli wierzchołek nie istnieje, dodaj nowy jako bazę
-        self.baza = Vertex(x, y, self.true_location)
-        self.vertices.append(self.baza)
+        # Ustaw bazę na istniejący wierzchołek lub dodaj nowy
+        self.baza = self.add_vertex(x, y)
+        self._path_tree = None
 
     def add_vertex(self, x, y):
         # Sprawdzanie, czy wierzchołek o tych współrzędnych już istnieje
-        for wierzcholek in self.vertices:
-            if wierzcholek.x == x and wierzcholek.y == y:
-                return wierzcholek  # Zwróć istniejący wierzchołek
+        key = self._vertex_key(x, y)
+        wierzcholek = self._vertex_index.get(key)
+        if wierzcholek is not None:
+            return wierzcholek  # Zwróć istniejący wierzchołek
 
         # Jeśli wierzchołek nie istnieje, stwórz nowy
         nowy_wierzcholek = Vertex(x, y, self.true_location)
+        nowy_wierzcholek.id = len(self.vertices)
         self.vertices.append(nowy_wierzcholek)
+        self._vertex_index[key] = nowy_wierzcholek
         return nowy_wierzcholek
 
     def get_edge(self, point1, point2):
@@ -118,39 +188,107 @@ class Graph:  # Obrazuje pelny rozklad ulic/skrzyzowan
         if isinstance(point2, Vertex):
             point2 = (point2.x, point2.y)
 
-        for edge in self.edges:
-            # Sprawdzamy, czy punkt1 jest początkiem krawędzi, a punkt2 końcem
-            if (edge.start.x, edge.start.y) == point1 and (edge.end.x, edge.end.y) == point2:
-                return edge
-
-        return None  # Jeśli nie znaleziono krawędzi
+        # None, jeśli krawędź nie istnieje
+        return self._edge_index.get((self._vertex_key(*point1), self._vertex_key(*point2)))
     
     def get_edges_from_vertex(self, wierzcholek):
         """
         Zwraca listę krawędzi wychodzących z danego wierzchołka.
         """
-        edges = []
-        for edge in self.edges:
-            if edge.start == wierzcholek:
-                edges.append(edge)
-        return edges
+        # Zwracamy kopię, bo wywołujący często sortują/mieszają wynik w miejscu
+        return list(self._outgoing_edges.get(self._vertex_key(wierzcholek.x, wierzcholek.y), []))
+
+    def _index_edge(self, edge):
+        # Pierwsza dodana krawędź między parą punktów wygrywa - tak jak przy liniowym przeszukiwaniu self.edges
+        edge.id = len(self.edges)
+        self.edges.append(edge)
 
-    def add_edge(self, punkt1, punkt2, priorytet, pasy):
+        start = self._vertex_key(edge.start.x, edge.start.y)
+        end = self._vertex_key(edge.end.x, edge.end.y)
+        self._edge_index.setdefault((start, end), edge)
+        self._outgoing_edges.setdefault(start, []).append(edge)
+
+    def add_edge(self, punkt1, punkt2, priorytet, pasy, length=None):
         # Dodaje krawędź do grafu między punktami (x1, y1) a (x2, y2), uwzględniając kierunek.
+        # length - długość ulicy, jeśli jest już znana (None - liczona ze współrzędnych)
 
         w1 = self.add_vertex(*punkt1)
         w2 = self.add_vertex(*punkt2)
 
-        edge_1 = Edge(w1, w2, priorytet, pasy, self.true_location)
-        self.edges.append(edge_1)
+        edge_1 = Edge(w1, w2, priorytet, pasy, self.true_location, length)
+        self._index_edge(edge_1)
 
-        edge_2 = Edge(w2, w1, priorytet, pasy, self.true_location)
-        self.edges.append(edge_2)
+        edge_2 = Edge(w2, w1, priorytet, pasy, self.true_location, length)
+        self._index_edge(edge_2)
+        self._travel_times.clear()
+        self._path_tree = None
+        self.detour_cache.clear()
 
         # Powiąż krawędź z wierzchołkami
         w1.add_neighbor(w2)
         w2.add_neighbor(w1)
 
+    def compute_edge_lengths(self):
+        """
+        Liczy długości wszystkich krawędzi jednym wektorowym wywołaniem
+        (haversine dla współrzędnych geograficznych, odległość euklidesowa w przeciwnym razie).
+        """
+        if not self.edges:
+            return
+
+        coords = np.array([(e.start.x, e.start.y, e.end.x, e.end.y) for e in self.edges], dtype=float)
+        distance = haversine_km if self.true_location else euclidean_distance
+        lengths = distance(coords[:, 0], coords[:, 1], coords[:, 2], coords[:, 3])
+
+        for edge, length in zip(self.edges, lengths.tolist()):
+            edge.length = length
+        self._travel_times.clear()
+        self._path_tree = None
+        self.detour_cache.clear()
+
+    def get_travel_times(self, speed):
+        """
+        Zwraca listę czasów przejazdu (w godzinach) dla maszyny o prędkości 'speed', indeksowaną Edge.id.
+        Tabela jest liczona raz dla danej prędkości i współdzielona przez wszystkie funkcje sąsiedztwa.
+        """
+        times = self._travel_times.get(speed)
+        if times is None:
+            times = [edge.length / speed for edge in self.edges]
+            self._travel_times[speed] = times
+        return times
+
+    def heuristic_distance(self, vertex1, vertex2):
+        """
+        Zapamiętywana odległość w linii prostej między dwoma wierzchołkami (heurystyka A*).
+        """
+        key = (vertex1.id, vertex2.id)
+        distance = self._heuristic_cache.get(key)
+        if distance is None:
+            distance = vertex1.get_distance(vertex2)
+            if vertex1.id is not None and vertex2.id is not None:
+                if len(self._heuristic_cache) >= 1_000_000:
+                    self._heuristic_cache.clear()  # Ograniczamy zużycie pamięci
+                self._heuristic_cache[key] = distance
+        return distance
+
+    def shortest_path_tree(self):
+        """
+        Zwraca drzewo najkrótszych ścieżek z bazy (ShortestPathTree).
+        Liczone raz i przechowywane do czasu zmiany grafu lub bazy.
+        """
+        if self._path_tree is None or self._path_tree.root != self.baza.id:
+            self._path_tree = ShortestPathTree(self, self.baza)
+        return self._path_tree
+
+    def __getstate__(self):
+        # Pamięci podręcznej nie kopiujemy ani nie serializujemy - zostanie odbudowana przy pierwszym użyciu
+        state = self.__dict__.copy()
+        state['_travel_times'] = {}
+        state['_heuristic_cache'] = {}
+        state['_path_tree'] = None
+        state['detour_cache'] = LRUCache(self.detour_cache.maxsize)
+        return state
+
     def __repr__(self):
         result = "Graf:\n"
         for edge in self.edges:
@@ -176,6 +314,10 @@ class Graph:  # Obrazuje pelny rozklad ulic/skrzyzowan
         - show_edge_labels: czy wyświetlać tekst (etykiety) na krawędziach.
         """
 
+        # Importy rysowania są leniwe - obliczenia (np. road_clearing_cli) nie wymagają matplotlib ani networkx
+        import matplotlib.pyplot as plt
+        import networkx as nx
+
         G = nx.Graph()
 
         # Dodaj wierzchołki do NetworkX
@@ -276,6 +418,9 @@ class Graph:  # Obrazuje pelny rozklad ulic/skrzyzowan
         - show_edge_labels: czy wyświetlać etykiety na krawędziach.
         """
 
+        import matplotlib.pyplot as plt
+        import networkx as nx
+
         # Ustawienia kolorów dla etapów
         kolory_etapow = ['black', 'brown', 'green', 'blue', 'purple', 'red', 'pink', 'orange']
         stage_number = len(rozwiazanie)
@@ -370,3 +515,613 @@ class Graph:  # Obrazuje pelny rozklad ulic/skrzyzowan
 
         ax.legend()
 
+
+class ShortestPathTree:
+    """
+    Drzewo najkrótszych ścieżek (Dijkstra) z jednego wierzchołka - zwykle bazy - do wszystkich pozostałych.
+
+    Dla każdego wierzchołka przechowuje długość najkrótszej ścieżki (distance, w jednostkach długości krawędzi)
+    oraz krawędź, którą do niego dochodzimy (parent_edge), więc odtworzenie ścieżki kosztuje O(długość ścieżki),
+    a odczyt czasu dojazdu O(1). Graf i baza nie zmieniają się w trakcie SA, więc drzewo liczymy raz
+    (patrz Graph.shortest_path_tree).
+    """
+
+    def __init__(self, graph, root):
+        self.graph = graph
+        self.root = root.id
+
+        num_vertices = len(graph.vertices)
+        distance = [math.inf] * num_vertices
+        parent_edge = [-1] * num_vertices
+        distance[root.id] = 0
+
+        # Krawędzie wybieramy jak A* w find_path_to_edge: sąsiedzi wierzchołka i graph.get_edge
+        vertices = graph.vertices
+        open_set = [(0, root.id)]
+        visited = [False] * num_vertices
+
+        while open_set:
+            current_distance, current = heapq.heappop(open_set)
+            if visited[current]:
+                continue
+            visited[current] = True
+
+            vertex = vertices[current]
+            for neighbor in vertex.neighbors:
+                if visited[neighbor.id]:
+                    continue
+                edge = graph.get_edge(vertex, neighbor)
+                new_distance = current_distance + edge.length
+                if new_distance < distance[neighbor.id]:
+                    distance[neighbor.id] = new_distance
+                    parent_edge[neighbor.id] = edge.id
+                    heapq.heappush(open_set, (new_distance, neighbor.id))
+
+        self.distance = np.array(distance, dtype=float)
+        self.parent_edge = parent_edge
+
+        # Dla każdej krawędzi: odległość do jej początku oraz jej długość (do wektorowego filtrowania)
+        if isinstance(graph, CompactGraph):
+            edge_start, edge_length = graph.sources, graph.edge_length
+        else:
+            edge_start = [edge.start.id for edge in graph.edges]
+            edge_length = [edge.length for edge in graph.edges]
+        self.edge_start = np.asarray(edge_start, dtype=np.int64)
+        self.edge_length = np.asarray(edge_length, dtype=float)
+        # Czasy przejazdu krawędzi dla każdej prędkości (edge_arrival_times) - znikają razem z drzewem,
+        # gdy graf ustawia _path_tree = None
+        self._arrival_times = {}
+
+    def is_reachable(self, vertex):
+        return self.parent_edge[vertex.id] != -1 or vertex.id == self.root
+
+    def path_to(self, vertex):
+        """
+        :return: lista krawędzi najkrótszej ścieżki z korzenia do wierzchołka (None, jeśli nieosiągalny)
+        """
+        if not self.is_reachable(vertex):
+            return None
+        edges = self.graph.edges
+        path = []
+        current = vertex.id
+        while current != self.root:
+            edge = edges[self.parent_edge[current]]
+            path.append(edge)
+            current = edge.start.id
+        path.reverse()
+        return path
+
+    def time_to(self, vertex, speed):
+        # Czas dojazdu z korzenia do wierzchołka maszyną o prędkości 'speed' (inf, jeśli nieosiągalny)
+        return float(self.distance[vertex.id]) / speed
+
+    def edge_arrival_times(self, speed):
+        """
+        :return: tablica (indeksowana id krawędzi) czasów przejazdu z korzenia do końca każdej krawędzi,
+                 prowadząc przez jej początek (inf dla krawędzi nieosiągalnych); liczona raz dla danej prędkości,
+                 tylko do odczytu
+        """
+        arrival_times = self._arrival_times.get(speed)
+        if arrival_times is None:
+            arrival_times = self.distance[self.edge_start] / speed + self.edge_length / speed
+            arrival_times.setflags(write=False)
+            self._arrival_times[speed] = arrival_times
+        return arrival_times
+
+
+class LRUCache:
+    """
+    Pamięć podręczna o ograniczonym rozmiarze - po przekroczeniu maxsize usuwany jest najdawniej używany wpis.
+    Liczniki hits/misses pozwalają ocenić jej skuteczność.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key, default=None):
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+        self.misses += 1
+        return default
+
+    def put(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries), 'maxsize': self.maxsize}
+
+    def __repr__(self):
+        return f"LRUCache(hits={self.hits}, misses={self.misses}, size={len(self._entries)}/{self.maxsize})"
+
+
+class Move:
+    """
+    Opis zmiany rozwiązania wykonanej przez funkcję sąsiedztwa: która maszyna i które etapy
+    jej trasy się zmieniły, wraz z poprzednimi i nowymi listami krawędzi tych etapów.
+    Pozwala cofnąć (undo) lub ponownie zastosować (apply) ruch w czasie proporcjonalnym do jego rozmiaru,
+    bez kopiowania całego rozwiązania.
+    """
+    __slots__ = ('machine_index', 'operator', 'changed_stages', 'previous_stages', 'new_stages',
+                 'previous_length', 'new_length')
+
+    def __init__(self, machine_index, previous_route, new_route, operator=None):
+        self.machine_index = machine_index
+        self.operator = operator  # Numer funkcji sąsiedztwa (uzupełniany przez generate_neighbor)
+        self.previous_length = len(previous_route)
+        self.new_length = len(new_route)
+
+        self.changed_stages = [stage for stage in range(max(self.previous_length, self.new_length))
+                               if stage >= self.previous_length or stage >= self.new_length
+                               or not _same_stage(previous_route[stage], new_route[stage])]
+        self.previous_stages = {stage: previous_route[stage] for stage in self.changed_stages
+                                if stage < self.previous_length}
+        self.new_stages = {stage: new_route[stage] for stage in self.changed_stages if stage < self.new_length}
+
+    def is_empty(self):
+        return not self.changed_stages
+
+    def route_before(self, route):
+        # Trasa maszyny sprzed ruchu, odtworzona z trasy po ruchu
+        return [self.previous_stages.get(stage, route[stage] if stage < len(route) else [])
+                for stage in range(self.previous_length)]
+
+    def route_after(self, route):
+        # Trasa maszyny po ruchu, odtworzona z trasy sprzed ruchu
+        return [self.new_stages.get(stage, route[stage] if stage < len(route) else [])
+                for stage in range(self.new_length)]
+
+    def undo(self, machines):
+        # Przywraca poprzednie etapy trasy maszyny
+        machine = machines[self.machine_index]
+        machine.route = self.route_before(machine.route)
+
+    def apply(self, machines):
+        # Ponownie wprowadza zmienione etapy trasy maszyny
+        machine = machines[self.machine_index]
+        machine.route = self.route_after(machine.route)
+
+    def __repr__(self):
+        return f"Move(machine={self.machine_index}, operator={self.operator}, stages={self.changed_stages})"
+
+
+def _same_stage(stage1, stage2):
+    if stage1 is stage2:
+        return True
+    return len(stage1) == len(stage2) and all(e1.id == e2.id for e1, e2 in zip(stage1, stage2))
+
+
+def route_snapshot(machines):
+    """
+    Lekka kopia rozwiązania - dla każdej maszyny lista etapów zawierających tylko numery (id) krawędzi.
+    """
+    return [[[edge.id for edge in stage] for stage in machine.route] for machine in machines]
+
+
+def restore_routes(machines, snapshot, graph):
+    # Odtwarza trasy maszyn z kopii utworzonej przez route_snapshot
+    for machine, route in zip(machines, snapshot):
+        machine.route = [[graph.edges[edge_id] for edge_id in stage] for stage in route]
+
+
+#-----------------------------------------------------------------------------------------------------------------------------------------------------------------#
+#-----------------------------------------------------ZWARTA REPREZENTACJA GRAFU (CSR)------------------------------------------------------------------------------#
+#-----------------------------------------------------------------------------------------------------------------------------------------------------------------#
+
+class CompactVertex:
+    """
+    Lekki widok wierzchołka CompactGraph - przechowuje tylko referencję do grafu i indeks wierzchołka.
+    Udostępnia ten sam interfejs co Vertex, więc funkcje sąsiedztwa działają bez zmian.
+    """
+    __slots__ = ('graph', 'id')
+
+    def __init__(self, graph, vertex_id):
+        self.graph = graph
+        self.id = vertex_id
+
+    @property
+    def x(self):
+        return float(self.graph.vertex_x[self.id])
+
+    @property
+    def y(self):
+        return float(self.graph.vertex_y[self.id])
+
+    @property
+    def true_location(self):
+        return self.graph.true_location
+
+    @property
+    def osm_id(self):
+        osm_node_ids = self.graph.osm_node_ids
+        return int(osm_node_ids[self.id]) if osm_node_ids is not None else None
+
+    @property
+    def neighbors(self):
+        # Sąsiedzi w kolejności krawędzi wychodzących, bez powtórzeń (jak w Vertex.add_neighbor)
+        graph = self.graph
+        targets = graph.targets[graph.offsets[self.id]:graph.offsets[self.id + 1]].tolist()
+        return [CompactVertex(graph, target) for target in dict.fromkeys(targets)]
+
+    def get_distance(self, other):
+        return self.graph.vertex_distance(self.id, other.id)
+
+    def __repr__(self):
+        return f"({self.x}, {self.y})"
+
+    def __eq__(self, other):
+        if isinstance(other, CompactVertex):
+            return self.id == other.id
+        return False
+
+    def __lt__(self, other):
+        return self.x + self.y < other.x + other.y
+
+    def __hash__(self):
+        return hash(self.id)
+
+    def __deepcopy__(self, memo):
+        # Widok jest niezmienny - kopiowanie go nie może kopiować całego grafu
+        return self
+
+
+class CompactEdge:
+    """
+    Lekki widok krawędzi CompactGraph. Atrybuty są czytane z tablic grafu,
+    a poziom śniegu zapisywany jest w tablicy CompactGraph.snow_level.
+    """
+    __slots__ = ('graph', 'id')
+
+    def __init__(self, graph, edge_id):
+        self.graph = graph
+        self.id = edge_id
+
+    @property
+    def start(self):
+        return CompactVertex(self.graph, int(self.graph.sources[self.id]))
+
+    @property
+    def end(self):
+        return CompactVertex(self.graph, int(self.graph.targets[self.id]))
+
+    @property
+    def priority(self):
+        return int(self.graph.edge_priority[self.id])
+
+    @property
+    def lanes(self):
+        return int(self.graph.edge_lanes[self.id])
+
+    @property
+    def length(self):
+        return float(self.graph.edge_length[self.id])
+
+    @property
+    def true_location(self):
+        return self.graph.true_location
+
+    @property
+    def snow_level(self):
+        return self.graph.snow_level[self.id].item()
+
+    @snow_level.setter
+    def snow_level(self, value):
+        self.graph.snow_level[self.id] = value
+
+    def calculate_length(self):
+        return self.length
+
+    def get_danger_level(self):
+        return self.snow_level * self.priority * self.lanes
+
+    def _endpoints(self):
+        return int(self.graph.sources[self.id]), int(self.graph.targets[self.id])
+
+    def __repr__(self):
+        return f"{self.start} -> {self.end}"
+
+    def __eq__(self, other):
+        # Tak jak w Edge - krawędzie są równe, jeśli łączą te same wierzchołki, niezależnie od kierunku
+        if not isinstance(other, CompactEdge):
+            return False
+        start, end = self._endpoints()
+        other_start, other_end = other._endpoints()
+        return (start == other_start and end == other_end) or (start == other_end and end == other_start)
+
+    def __hash__(self):
+        start, end = self._endpoints()
+        return hash((min(start, end), max(start, end)))
+
+    def __deepcopy__(self, memo):
+        return self
+
+
+class _ViewSequence:
+    # Sekwencja widoków tworzonych na żądanie - nie trzyma w pamięci obiektu na każdy element
+    __slots__ = ('graph', 'view', 'size')
+
+    def __init__(self, graph, view, size):
+        self.graph = graph
+        self.view = view
+        self.size = size
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.view(self.graph, i) for i in range(*index.indices(self.size))]
+        if index < 0:
+            index += self.size
+        if not 0 <= index < self.size:
+            raise IndexError(index)
+        return self.view(self.graph, index)
+
+    def __iter__(self):
+        graph, view = self.graph, self.view
+        return (view(graph, i) for i in range(self.size))
+
+
+class CompactGraph:
+    """
+    Zwarta reprezentacja sieci drogowej oparta na tablicach NumPy (format CSR).
+
+    Krawędzie skierowane są posortowane według wierzchołka początkowego, więc krawędzie wychodzące
+    z wierzchołka v mają indeksy offsets[v]:offsets[v + 1]. Każda ulica występuje jako dwie krawędzie
+    skierowane - indeks krawędzi przeciwnej przechowuje tablica 'reverse'.
+
+    Udostępnia interfejs zgodny z Graph (baza, vertices, edges, get_edge, get_edges_from_vertex,
+    get_travel_times, heuristic_distance), więc RoadClearingProblem i funkcje sąsiedztwa mogą na nim działać.
+    """
+
+    def __init__(self, vertex_x, vertex_y, offsets, sources, targets, edge_length, edge_priority, edge_lanes,
+                 reverse, base=None, true_location=True):
+        self.vertex_x = vertex_x
+        self.vertex_y = vertex_y
+        self.offsets = offsets
+        self.sources = sources
+        self.targets = targets
+        self.edge_length = edge_length
+        self.edge_priority = edge_priority
+        self.edge_lanes = edge_lanes
+        self.reverse = reverse
+        self.base = base  # Indeks wierzchołka bazy
+        self.true_location = true_location
+        self.snow_level = np.zeros(len(targets), dtype=float)
+
+        self._travel_times = {}  # prędkość maszyny -> lista czasów przejazdu indeksowana id krawędzi
+        self._heuristic_cache = {}  # (id wierzchołka, id wierzchołka) -> odległość
+        self._path_tree = None  # Drzewo najkrótszych ścieżek z bazy (ShortestPathTree)
+        self._vertex_of_point = None  # (x, y) -> indeks wierzchołka, budowany przy pierwszym użyciu (_find_vertex)
+        self.detour_cache = LRUCache(DETOUR_CACHE_SIZE)  # id usuniętej krawędzi -> objazd (change_path)
+        self.mapped_file = None  # Plik .rcg, z którego zmapowano tablice (binary_graph.open_binary_graph)
+        self.osm_node_ids = None  # Identyfikatory węzłów OSM indeksowane id wierzchołka (grafy z map_import) lub None
+
+    @classmethod
+    def from_arrays(cls, vertex_x, vertex_y, sources, targets, edge_priority, edge_lanes, reverse, base=None,
+                    true_location=True, edge_length=None):
+        """
+        Tworzy graf z tablic krawędzi w dowolnej kolejności - sortuje je do postaci CSR
+        (stabilnie, więc kolejność krawędzi wychodzących z wierzchołka jest zachowana).
+        """
+        vertex_x = np.asarray(vertex_x, dtype=float)
+        vertex_y = np.asarray(vertex_y, dtype=float)
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        reverse = np.asarray(reverse, dtype=np.int64)
+
+        order = np.argsort(sources, kind='stable')
+        new_id = np.empty_like(order)
+        new_id[order] = np.arange(len(order))
+
+        sources = sources[order]
+        offsets = np.zeros(len(vertex_x) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=len(vertex_x)), out=offsets[1:])
+
+        if edge_length is None:
+            distance = haversine_km if true_location else euclidean_distance
+            edge_length = distance(vertex_x[sources], vertex_y[sources],
+                                   vertex_x[targets[order]], vertex_y[targets[order]])
+        else:
+            edge_length = np.asarray(edge_length, dtype=float)[order]
+
+        return cls(vertex_x, vertex_y, offsets,
+                   sources.astype(np.int32), targets[order].astype(np.int32),
+                   edge_length,
+                   np.asarray(edge_priority, dtype=np.int16)[order],
+                   np.asarray(edge_lanes, dtype=np.int16)[order],
+                   new_id[reverse[order]].astype(np.int32),
+                   base, true_location)
+
+    @classmethod
+    def from_graph(cls, graph):
+        """
+        Tworzy CompactGraph z obiektu Graph. Indeksy wierzchołków są zgodne z Vertex.id.
+        """
+        sources = [edge.start.id for edge in graph.edges]
+        targets = [edge.end.id for edge in graph.edges]
+        # Graph.add_edge dodaje krawędzie parami (tam i z powrotem)
+        reverse = [edge_id ^ 1 for edge_id in range(len(graph.edges))]
+
+        compact = cls.from_arrays(
+            [v.x for v in graph.vertices], [v.y for v in graph.vertices],
+            sources, targets,
+            [edge.priority for edge in graph.edges], [edge.lanes for edge in graph.edges],
+            reverse,
+            base=graph.baza.id if graph.baza is not None else None,
+            true_location=graph.true_location,
+            edge_length=[edge.length for edge in graph.edges]
+        )
+        compact.osm_node_ids = graph.osm_node_ids
+        return compact
+
+    @classmethod
+    def from_edge_records(cls, records, true_location=True, base=None, coord_precision=None):
+        """
+        Buduje CompactGraph bezpośrednio z rekordów (punkt1, punkt2, priorytet, pasy),
+        bez tworzenia obiektów Vertex/Edge. Parametry jak w Graph.from_edge_records.
+        """
+        vertex_index = {}
+        vertex_x, vertex_y = [], []
+        sources, targets, priorities, lanes = [], [], [], []
+
+        def vertex_id(x, y):
+            key = (x, y) if coord_precision is None else (round(x, coord_precision), round(y, coord_precision))
+            index = vertex_index.get(key)
+            if index is None:
+                index = len(vertex_x)
+                vertex_index[key] = index
+                vertex_x.append(x)
+                vertex_y.append(y)
+            return index
+
+        base_id = vertex_id(*base) if base is not None else None
+
+        for punkt1, punkt2, priorytet, pasy in records:
+            w1 = vertex_id(*punkt1)
+            w2 = vertex_id(*punkt2)
+            sources += [w1, w2]
+            targets += [w2, w1]
+            priorities += [priorytet, priorytet]
+            lanes += [pasy, pasy]
+
+        reverse = np.arange(len(sources)) ^ 1
+        return cls.from_arrays(vertex_x, vertex_y, sources, targets, priorities, lanes, reverse,
+                               base=base_id, true_location=true_location)
+
+    def edge_records(self):
+        """
+        Zwraca rekordy (punkt1, punkt2, priorytet, pasy) wszystkich ulic (po jednym na parę krawędzi przeciwnych),
+        np. do zbudowania obiektu Graph metodą Graph.from_edge_records.
+        """
+        x = self.vertex_x.tolist()
+        y = self.vertex_y.tolist()
+        reverse = self.reverse.tolist()
+        for edge_id, (start, end, priority, lanes) in enumerate(zip(self.sources.tolist(), self.targets.tolist(),
+                                                                    self.edge_priority.tolist(),
+                                                                    self.edge_lanes.tolist())):
+            if edge_id < reverse[edge_id]:
+                yield (x[start], y[start]), (x[end], y[end]), priority, lanes
+
+    # --- Interfejs zgodny z Graph ---
+
+    @property
+    def baza(self):
+        return CompactVertex(self, self.base) if self.base is not None else None
+
+    @property
+    def vertices(self):
+        return _ViewSequence(self, CompactVertex, len(self.vertex_x))
+
+    @property
+    def edges(self):
+        return _ViewSequence(self, CompactEdge, len(self.targets))
+
+    def _find_vertex(self, point):
+        if isinstance(point, CompactVertex):
+            return point.id
+        if self._vertex_of_point is None:
+            # Raz dla grafu - przy powtórzonych współrzędnych pierwszy wierzchołek
+            self._vertex_of_point = {}
+            for vertex_id, key in enumerate(zip(self.vertex_x.tolist(), self.vertex_y.tolist())):
+                self._vertex_of_point.setdefault(key, vertex_id)
+        return self._vertex_of_point.get((point[0], point[1]))
+
+    def get_edge(self, point1, point2):
+        """
+        Znajduje krawędź pomiędzy dwoma wierzchołkami (widoki lub krotki (x, y)).
+        Zwraca krawędź, jeśli istnieje, w przeciwnym przypadku zwraca None.
+        """
+        start = self._find_vertex(point1)
+        end = self._find_vertex(point2)
+        if start is None or end is None:
+            return None
+
+        first = self.offsets[start]
+        matches = np.flatnonzero(self.targets[first:self.offsets[start + 1]] == end)
+        return CompactEdge(self, int(first + matches[0])) if len(matches) else None
+
+    def get_edges_from_vertex(self, wierzcholek):
+        """
+        Zwraca listę krawędzi wychodzących z danego wierzchołka.
+        """
+        return [CompactEdge(self, edge_id)
+                for edge_id in range(self.offsets[wierzcholek.id], self.offsets[wierzcholek.id + 1])]
+
+    def vertex_distance(self, vertex1, vertex2):
+        # Odległość w linii prostej między wierzchołkami o podanych indeksach
+        distance = haversine_km if self.true_location else euclidean_distance
+        return float(distance(self.vertex_x[vertex1], self.vertex_y[vertex1],
+                              self.vertex_x[vertex2], self.vertex_y[vertex2]))
+
+    def get_travel_times(self, speed):
+        """
+        Zwraca listę czasów przejazdu (w godzinach) dla maszyny o prędkości 'speed', indeksowaną id krawędzi.
+        """
+        times = self._travel_times.get(speed)
+        if times is None:
+            times = (self.edge_length / speed).tolist()
+            self._travel_times[speed] = times
+        return times
+
+    def heuristic_distance(self, vertex1, vertex2):
+        """
+        Zapamiętywana odległość w linii prostej między dwoma wierzchołkami (heurystyka A*).
+        """
+        key = (vertex1.id, vertex2.id)
+        distance = self._heuristic_cache.get(key)
+        if distance is None:
+            if len(self._heuristic_cache) >= 1_000_000:
+                self._heuristic_cache.clear()  # Ograniczamy zużycie pamięci
+            distance = self.vertex_distance(vertex1.id, vertex2.id)
+            self._heuristic_cache[key] = distance
+        return distance
+
+    def set_osm_node_ids(self, osm_node_ids):
+        # Identyfikatory węzłów OSM indeksowane id wierzchołka (czytane przez CompactVertex.osm_id)
+        self.osm_node_ids = osm_node_ids
+
+    def shortest_path_tree(self):
+        """
+        Zwraca drzewo najkrótszych ścieżek z bazy (ShortestPathTree), liczone raz dla danej bazy.
+        """
+        if self._path_tree is None or self._path_tree.root != self.base:
+            self._path_tree = ShortestPathTree(self, self.baza)
+        return self._path_tree
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_travel_times'] = {}
+        state['_heuristic_cache'] = {}
+        state['_path_tree'] = None
+        state['_vertex_of_point'] = None
+        state['detour_cache'] = LRUCache(self.detour_cache.maxsize)
+        return state
+
+    def __reduce_ex__(self, protocol):
+        # Graf zmapowany z pliku .rcg jest serializowany jako odwołanie do pliku - procesy robocze mapują
+        # ten sam plik zamiast otrzymywać kopię tablic
+        if self.mapped_file is None:
+            return super().__reduce_ex__(protocol)
+        from binary_graph import open_binary_graph
+        state = {'snow_level': self.snow_level} if self.snow_level.any() else {}  # Zerowy poziom śniegu jest domyślny
+        return open_binary_graph, (self.mapped_file, self.base), state
+
+    def __repr__(self):
+        return f"CompactGraph({len(self.vertex_x)} wierzchołków, {len(self.targets)} krawędzi)"
@@ -1,4 +1,5 @@
 import matplotlib.pyplot as plt
+import numpy as np
 from matplotlib.widgets import Button
 
 # List of plot data (global variable for updating in the function)
@@ -10,14 +11,76 @@ def update_plot(ax, index):
     """Updates the plot based on the index."""
     plot = plots[index]
     ax.clear()
-    ax.plot(plot["x"], plot["y"])
+    if plot.get("kind") == "bar":
+        draw_bars(ax, plot)
+    else:
+        ax.plot(plot["x"], plot["y"], label=plot.get("label"))
+        for x, y, label in plot.get("extra_lines", []):
+            ax.plot(x, y, label=label)
+        for x in plot.get("marks", []):
+            ax.axvline(x, color="red", linestyle="--", linewidth=0.8)
+        if plot.get("extra_lines"):
+            ax.legend()
+        ax.set_xlabel("Iteration")
     ax.set_title(plot["title"])
     ax.set_ylabel(plot["ylabel"])
-    ax.set_xlabel("Iteration")
     ax.grid(True)
     fig.canvas.draw()
 
 
+def draw_bars(ax, plot):
+    """Draws a grouped (or stacked) bar chart - one group of bars per neighborhood function."""
+    labels = plot["labels"]
+    series = plot["series"]
+    positions = np.arange(len(labels))
+    width = 0.8 if plot.get("stacked") else 0.8 / len(series)
+    bottom = np.zeros(len(labels))
+
+    for index, (name, values) in enumerate(series):
+        if plot.get("stacked"):
+            ax.bar(positions, values, width, bottom=bottom, label=name)
+            bottom += values
+        else:
+            ax.bar(positions - 0.4 + width * (index + 0.5), values, width, label=name)
+
+    ax.set_xticks(positions)
+    ax.set_xticklabels(labels, fontsize=8)
+    if len(series) > 1:
+        ax.legend()
+
+
+def operator_plots(operator_stats):
+    """Bar charts of per-operator statistics returned by RoadClearingProblem.simulated_annealing."""
+    operators = sorted(operator_stats)
+    labels = [f"{operator}\n{operator_stats[operator]['name']}" for operator in operators]
+
+    def values(key):
+        return np.array([operator_stats[operator][key] for operator in operators], dtype=float)
+
+    return [
+        {"kind": "bar", "title": "Time spent per neighborhood function", "labels": labels, "ylabel": "Time [s]",
+         "stacked": True, "series": [("Generation", values("time")), ("Evaluation", values("eval_time"))]},
+        {"kind": "bar", "title": "Calls and accepted moves per neighborhood function", "labels": labels,
+         "ylabel": "Count", "series": [("Calls", values("calls")), ("Accepted", values("accepted")),
+                                       ("Improving", values("improving"))]},
+        {"kind": "bar", "title": "Total danger improvement per neighborhood function", "labels": labels,
+         "ylabel": "Danger decrease", "series": [("Improvement", values("improvement"))]},
+    ]
+
+
+def schedule_plots(schedule_decisions):
+    """Acceptance rate chart of the adaptive cooling schedule (see cooling.py) - empty for other schedules."""
+    adaptations = [decision for decision in schedule_decisions if decision["decision"] == "adapt"]
+    if not adaptations:
+        return []
+    iterations = [decision["iteration"] for decision in adaptations]
+    return [
+        {"title": "Acceptance rate (adaptive cooling schedule)", "x": iterations, "label": "Measured",
+         "y": [decision["acceptance_rate"] for decision in adaptations], "ylabel": "Acceptance rate",
+         "extra_lines": [(iterations, [decision["target"] for decision in adaptations], "Target")]},
+    ]
+
+
 def next_plot(event):
     """Switches to the next plot."""
     if current_plot[0] < len(plots) - 1:
@@ -32,8 +95,11 @@ def prev_plot(event):
         update_plot(ax, current_plot[0])
 
 
-def plot_diagnostic_charts(danger, best_danger, temperature):
-    """Draws interactive diagnostic charts."""
+def plot_diagnostic_charts(danger, best_danger, temperature, operator_stats=None, schedule_decisions=None):
+    """
+    Draws interactive diagnostic charts (operator_stats - optional per-operator statistics of the run,
+    schedule_decisions - optional decisions of the cooling schedule; reheats are marked on the temperature chart).
+    """
     global plots, fig, ax  # Reference to global variables
 
     # Update plot data
@@ -42,8 +108,14 @@ def plot_diagnostic_charts(danger, best_danger, temperature):
          "ylabel": "Danger"},
         {"title": "Accepted danger level", "x": range(len(best_danger)), "y": best_danger,
          "ylabel": "Danger"},
-        {"title": "Temperature", "x": range(len(temperature)), "y": temperature, "ylabel": ""},
+        {"title": "Temperature", "x": range(len(temperature)), "y": temperature, "ylabel": "",
+         "marks": [decision["iteration"] + 1 for decision in schedule_decisions or []
+                   if decision["decision"] == "reheat"]},
     ]
+    if schedule_decisions:
+        plots += schedule_plots(schedule_decisions)
+    if operator_stats:
+        plots += operator_plots(operator_stats)
     current_plot[0] = 0  # Reset plot index
 
     # Create figure and axis
@@ -0,0 +1,178 @@
+"""
+Index of street usage by the machines' routes, used by the least-frequent-street neighborhood function.
+"""
+
+from danger_evaluation import get_street_ids
+
+
+class EdgeUsageIndex:
+    """
+    Counts how many times every (undirected) street appears in the routes of every machine.
+
+    The index is updated only for machines whose routes changed since the last update. Routes are never
+    modified in place (neighborhood functions and Move objects always assign new route lists), so a route
+    that is the same object as the recorded one is unchanged, and for a changed route only the stages that
+    are different list objects are re-counted.
+
+    Streets are also kept in a bucket queue (bucket c - streets used c times by the whole fleet), so the least
+    used streets can be listed in increasing order of usage without scanning all streets. Buckets are insertion
+    ordered dicts: a street whose usage changes goes to the end of its new bucket, and the changes of one update
+    are applied in increasing street id, so the order depends only on the sequence of updates. state/restore
+    carry the order and the recorded routes through checkpoints - a resumed chain makes exactly the same choices.
+
+    Subsets of streets (e.g. the streets a machine can reach, see add_subset) have queues of their own, kept in
+    the order of the main queue restricted to the subset, so they need not be saved.
+    """
+
+    def __init__(self, road_layout, machines=None):
+        self.street_of_edge, self.num_streets = get_street_ids(road_layout)
+
+        # Directed edges of every street in the order of Edge.id
+        self.street_edges = [[] for _ in range(self.num_streets)]
+        for edge_id, street in enumerate(self.street_of_edge):
+            self.street_edges[street].append(edge_id)
+
+        self.usage = [0] * self.num_streets  # street -> number of appearances in all routes
+        self.buckets = [dict.fromkeys(range(self.num_streets))]  # usage -> streets (dict keys, in queue order)
+
+        self.machine_usage = []  # machine index -> {street: number of appearances in its route}
+        self._routes = []  # machine index -> recorded route (list of stages)
+        self.subsets = {}  # key -> (set of streets, buckets of these streets)
+
+        if machines is not None:
+            self.sync(machines)
+
+    @staticmethod
+    def _move(buckets, street, usage, new_usage):
+        del buckets[usage][street]
+        while new_usage >= len(buckets):
+            buckets.append({})
+        buckets[new_usage][street] = None
+
+    def _add(self, machine_usage, street, delta):
+        usage = self.usage[street]
+        self._move(self.buckets, street, usage, usage + delta)
+        for members, buckets in self.subsets.values():
+            if street in members:
+                self._move(buckets, street, usage, usage + delta)
+        self.usage[street] = usage + delta
+
+        count = machine_usage.get(street, 0) + delta
+        if count:
+            machine_usage[street] = count
+        else:
+            del machine_usage[street]
+
+    def update_machine(self, machine_index, route):
+        """
+        Records the new route of one machine and updates the usage of streets in its changed stages.
+        """
+        while len(self._routes) <= machine_index:
+            self._routes.append([])
+            self.machine_usage.append({})
+
+        old_route = self._routes[machine_index]
+        if route is old_route:
+            return
+
+        street_of_edge = self.street_of_edge
+        deltas = {}
+        for stage in range(max(len(old_route), len(route))):
+            old_stage = old_route[stage] if stage < len(old_route) else []
+            new_stage = route[stage] if stage < len(route) else []
+            if old_stage is new_stage:
+                continue
+            for edge in old_stage:
+                street = street_of_edge[edge.id]
+                deltas[street] = deltas.get(street, 0) - 1
+            for edge in new_stage:
+                street = street_of_edge[edge.id]
+                deltas[street] = deltas.get(street, 0) + 1
+
+        machine_usage = self.machine_usage[machine_index]
+        for street in sorted(deltas):
+            if deltas[street]:
+                self._add(machine_usage, street, deltas[street])
+
+        self._routes[machine_index] = route
+
+    def sync(self, machines):
+        # Brings the index up to date with the current routes of all machines
+        for machine_index, machine in enumerate(machines):
+            if machine_index >= len(self._routes) or machine.route is not self._routes[machine_index]:
+                self.update_machine(machine_index, machine.route)
+
+    def count(self, street, exclude_machine=None):
+        """
+        :return: number of appearances of the street in the routes of all machines except 'exclude_machine'
+        """
+        usage = self.usage[street]
+        if exclude_machine is not None:
+            usage -= self.machine_usage[exclude_machine].get(street, 0)
+        return usage
+
+    def add_subset(self, key, streets):
+        """
+        Registers a subset of streets with a queue of its own (see least_used). Costs O(number of streets) once;
+        afterwards every usage change of a street updates the queues of the subsets containing it in O(1).
+        """
+        members = set(streets)
+        buckets = [{} for _ in self.buckets]
+        for usage, bucket in enumerate(self.buckets):
+            for street in bucket:
+                if street in members:
+                    buckets[usage][street] = None
+        self.subsets[key] = (members, buckets)
+
+    def least_used(self, exclude_machine=None, subset=None):
+        """
+        Iterates over streets in increasing order of usage by all machines except 'exclude_machine'.
+        Streets with equal usage are listed in queue order, then the lowered streets of 'exclude_machine'
+        in increasing street id.
+
+        :param subset: key of a subset registered with add_subset - only its streets are listed (None - all)
+        :return: generator of (usage, street)
+        """
+        own_usage = self.machine_usage[exclude_machine] if exclude_machine is not None else {}
+        if subset is None:
+            members, buckets = None, self.buckets
+        else:
+            members, buckets = self.subsets[subset]
+
+        # Streets of the excluded machine fall into lower buckets once its appearances are not counted
+        lowered = {}
+        for street, count in own_usage.items():
+            if members is None or street in members:
+                lowered.setdefault(self.usage[street] - count, []).append(street)
+
+        for usage, bucket in enumerate(buckets):
+            for street in bucket:
+                if street not in own_usage:
+                    yield usage, street
+            for street in sorted(lowered.get(usage, ())):
+                yield usage, street
+
+    def state(self):
+        """
+        :return: (recorded routes - lists of stages of Edge objects, queue order - list of all street ids)
+        """
+        return list(self._routes), [street for bucket in self.buckets for street in bucket]
+
+    def restore(self, routes, order):
+        """
+        Rebuilds the index from the recorded routes and the queue order returned by state.
+        """
+        if sorted(order) != list(range(self.num_streets)):
+            raise ValueError("the queue order does not list every street exactly once")
+        self.usage = [0] * self.num_streets
+        self.buckets = [dict.fromkeys(range(self.num_streets))]
+        self.machine_usage = []
+        self._routes = []
+        self.subsets = {}  # Registered again by their users, from the restored order
+        for machine_index, route in enumerate(routes):
+            self.update_machine(machine_index, route)
+
+        buckets = [{} for _ in self.buckets]
+        for street in order:
+            buckets[self.usage[street]][street] = None
+        self.buckets = buckets
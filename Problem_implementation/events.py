@@ -0,0 +1,119 @@
+"""
+Event sinks receiving structured events from RoadClearingProblem (iterations of simulated annealing,
+termination, initial solution).
+
+Available sinks:
+- NullEventSink - events are dropped (default); the annealing loop checks 'enabled' once per iteration,
+  so a disabled sink does not even build the events
+- LoggingEventSink - events are passed to the stdlib logging module
+- JsonLinesEventSink - every event is written as one JSON object per line (the file can be followed with tail -f)
+- QueueEventSink - events are put into a queue (e.g. read by the GUI thread while annealing runs in a worker thread)
+"""
+
+import json
+import logging
+import math
+import time
+
+
+class NullEventSink:
+    enabled = False
+
+    def emit(self, event, **fields):
+        pass
+
+    def close(self):
+        pass
+
+
+class LoggingEventSink:
+    """
+    Passes events to a stdlib logger as "<event> key=value ..." messages; the fields are also attached
+    to the log record as the 'fields' attribute.
+    """
+    enabled = True
+
+    def __init__(self, logger=None, level=logging.INFO):
+        self.logger = logger if logger is not None else logging.getLogger("road_clearing.events")
+        self.level = level
+
+    def emit(self, event, **fields):
+        if self.logger.isEnabledFor(self.level):
+            message = " ".join(f"{key}={value}" for key, value in fields.items())
+            self.logger.log(self.level, "%s %s", event, message, extra={'fields': fields})
+
+    def close(self):
+        pass
+
+
+class JsonLinesEventSink:
+    """
+    Appends events to a JSON-lines file: {"event": ..., "time": <unix time>, <fields>...}.
+    The file is line buffered, so every event is visible to readers as soon as it is emitted.
+    """
+    enabled = True
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "a", buffering=1, encoding="utf-8")
+
+    def emit(self, event, **fields):
+        record = {'event': event, 'time': time.time()}
+        record.update(fields)
+        self.file.write(json.dumps(record, default=str) + "\n")
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+
+
+class QueueEventSink:
+    """
+    Puts (event, fields) tuples into a queue.Queue - the consumer (e.g. RoadClearingApp polling with root.after)
+    runs in another thread. Only the events listed in 'events' are queued (None - all events).
+
+    'throttle' maps event names to intervals in seconds: such an event is queued at most once per interval and
+    the ones in between are dropped, so a consumer showing only the latest progress is not sent one event
+    per iteration (which would make the queue grow faster than it is read).
+    """
+    enabled = True
+
+    def __init__(self, queue, events=None, throttle=None):
+        self.queue = queue
+        self.events = None if events is None else set(events)
+        self.throttle = dict(throttle or {})
+        self.last_queued = {}  # event -> time.monotonic() when it was last queued
+
+    def emit(self, event, **fields):
+        if self.events is not None and event not in self.events:
+            return
+        interval = self.throttle.get(event)
+        if interval is not None:
+            now = time.monotonic()
+            if now - self.last_queued.get(event, -math.inf) < interval:
+                return
+            self.last_queued[event] = now
+        self.queue.put((event, fields))
+
+    def close(self):
+        pass
+
+
+def get_event_sink(sink=None, path=None):
+    """
+    Creates an event sink from its name.
+
+    :param sink: None or "none", "logging", "jsonl" (requires 'path'), or an existing sink object
+    :param path: output file of the "jsonl" sink
+    """
+    if sink is None or sink == "none":
+        return NullEventSink()
+    if sink == "logging":
+        return LoggingEventSink()
+    if sink == "jsonl":
+        if path is None:
+            raise ValueError("The 'jsonl' event sink requires a file path")
+        return JsonLinesEventSink(path)
+    if isinstance(sink, str):
+        raise ValueError(f"Unknown event sink: {sink}")
+    return sink
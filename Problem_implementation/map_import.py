@@ -1,6 +1,34 @@
-from data_structures import Graph
-import osmnx as ox
+from data_structures import Graph, CompactGraph
+from binary_graph import EXTENSION, is_binary_graph, open_binary_graph, write_binary_graph
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
+import hashlib
+import json
+import logging
 import math
+import os
+import re
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Base priority depending on road type
+HIGHWAY_PRIORITY = {
+    "motorway": 80,  # -> Highway, multi-lane, grade-separated
+    "trunk": 75,  # -> Expressway or other major arterial (lower rank than motorway)
+    "primary": 70,  # -> Main road (e.g., national road)
+    "secondary": 60,  # -> Medium-rank road (e.g., state road)
+    "tertiary": 50,  # -> County road or local connecting road
+    "residential": 40,  # -> Road in residential area
+    "service": 30,  # -> Service road, e.g., access to parking lots, gas stations
+}
+DEFAULT_PRIORITY = 20
+
+# Distance-dependent priority coefficient: MAX_COEFF at the center, MIN_COEFF at max_distance and further
+MAX_COEFF = 1.5
+MIN_COEFF = 0.5
 
 
 def calculate_euclidean_distance(x1, y1, x2, y2):
@@ -24,16 +52,7 @@ def calculate_priority(edge_data, x_u, y_u, x_v, y_v, center_x, center_y, max_di
     if isinstance(highway_type, list):
         highway_type = highway_type[0]
 
-    mapping = {
-        "motorway": 80,  # -> Highway, multi-lane, grade-separated
-        "trunk": 75,  # -> Expressway or other major arterial (lower rank than motorway)
-        "primary": 70,  # -> Main road (e.g., national road)
-        "secondary": 60,  # -> Medium-rank road (e.g., state road)
-        "tertiary": 50,  # -> County road or local connecting road
-        "residential": 40,  # -> Road in residential area
-        "service": 30,  # -> Service road, e.g., access to parking lots, gas stations
-    }
-    base_priority = mapping.get(highway_type, 20)
+    base_priority = HIGHWAY_PRIORITY.get(highway_type, DEFAULT_PRIORITY)
 
     # 2. Calculate edge midpoint and distance to center
     mid_x = (x_u + x_v) / 2.0
@@ -41,8 +60,8 @@ def calculate_priority(edge_data, x_u, y_u, x_v, y_v, center_x, center_y, max_di
     distance_mid = calculate_euclidean_distance(mid_x, mid_y, center_x, center_y)
 
     # 3. Interpolate distance-dependent coefficient
-    max_coeff = 1.5
-    min_coeff = 0.5
+    max_coeff = MAX_COEFF
+    min_coeff = MIN_COEFF
     # If distance greater than or equal to max_distance, set minimum coefficient
     if distance_mid >= max_distance:
         factor = min_coeff
@@ -75,8 +94,150 @@ def calculate_lanes(edge_data):
         return 1
 
 
+def calculate_priorities(highway, x_u, y_u, x_v, y_v, center_x, center_y, max_distance):
+    """
+    Vectorized calculate_priority for all edges at once.
+
+    Parameters:
+    - highway: pandas Series with the road type of every edge (a single value, not a list)
+    - x_u, y_u, x_v, y_v: NumPy arrays with the coordinates of the edge nodes
+    - the rest as in calculate_priority
+
+    Returns: NumPy array of priorities in range 1-100
+    """
+    base_priority = highway.map(HIGHWAY_PRIORITY).fillna(DEFAULT_PRIORITY).to_numpy(dtype=float)
+
+    mid_x = (x_u + x_v) / 2.0
+    mid_y = (y_u + y_v) / 2.0
+    distance_mid = np.sqrt((mid_x - center_x) ** 2 + (mid_y - center_y) ** 2)
+
+    with np.errstate(divide="ignore", invalid="ignore"):  # max_distance == 0 - only the first branch is used
+        factor = np.where(distance_mid >= max_distance, MIN_COEFF,
+                          MAX_COEFF - ((MAX_COEFF - MIN_COEFF) * (distance_mid / max_distance)))
+
+    return np.clip(base_priority * factor, 1, 100).astype(np.int64)
+
+
+def calculate_lanes_column(lanes):
+    """
+    Vectorized calculate_lanes: pandas Series of 'lanes' values (a single value, not a list) -> NumPy array.
+    Values that are not integers give 1.
+    """
+    import pandas as pd  # Installed with OSMnx - needed only for OSM data
+
+    text = lanes.astype(str).str.strip()
+    valid = text.str.fullmatch(r"[-+]?[0-9]+").to_numpy(dtype=bool)
+    return np.where(valid, pd.to_numeric(text.where(valid, "1")).to_numpy(), 1).astype(np.int64)
+
+
+MAIN_ROADS = ["motorway", "trunk", "primary", "secondary", "trunk", "tertiary"]
+
+
+def _road_types(main_roads=False, custom_roads=None):
+    # Highway types of the road filter:
+    #    - if custom_roads is provided, that list
+    #    - if main_roads=True, predetermined set of major roads
+    #    - otherwise None (roads according to 'network_type')
+    if custom_roads and isinstance(custom_roads, list) and len(custom_roads) > 0:
+        return custom_roads
+    elif main_roads:
+        return MAIN_ROADS
+    else:
+        return None
+
+
+def _road_filter(main_roads=False, custom_roads=None):
+    # Overpass custom_filter of OSMnx, e.g.: '["highway"~"motorway|primary|secondary"]' (None - no filter)
+    road_types = _road_types(main_roads, custom_roads)
+    if road_types is None:
+        return None
+    return f'["highway"~"{"|".join(road_types)}"]'
+
+
+def _first_values(column):
+    # Simplified OSMnx edges keep lists of the values of the merged ways - take the first one (as calculate_priority)
+    values = column.reset_index(drop=True).explode()
+    return values[~values.index.duplicated()]
+
+
+def _convert_osm_graph(G_osm, center_point, max_distance, coord_precision, graph_cls):
+    """
+    Converts an OSMnx graph to a 'Graph' (or 'CompactGraph'); center_point (lat, lon) is used by the priorities.
+
+    Priorities, lanes and vertices are computed with column operations on the node and edge frames of
+    ox.graph_to_gdfs (without building geometries), then the graph is built in one pass. Vertices are OSM nodes
+    (nodes with the same coordinates rounded to coord_precision are merged) and keep the OSM node id as osm_id
+    (see Graph.set_osm_node_ids). Vertex and edge ids are the same as if every edge was added in turn with
+    from_edge_records: the base (first node) first, then in the order of G_osm.edges.
+    """
+    import networkx as nx
+    import osmnx as ox
+
+    # add base
+    if len(G_osm.nodes) == 0 or nx.is_empty(G_osm):  # graph_to_gdfs needs nodes and edges
+        base = None
+        if len(G_osm.nodes) > 0:
+            first_node_id = list(G_osm.nodes)[0]
+            base = (G_osm.nodes[first_node_id]["x"], G_osm.nodes[first_node_id]["y"])
+        return graph_cls.from_edge_records([], base=base, coord_precision=coord_precision)
+
+    # Rows in the order of G_osm.nodes and G_osm.edges; edges without some attribute have NaN in its column
+    nodes, edges = ox.graph_to_gdfs(G_osm, node_geometry=False, fill_edge_geometry=False)
+    edges = edges.reindex(columns=["highway", "lanes"])
+    edges = edges.where(edges.notna(), None)
+    node_x = nodes["x"].to_numpy(dtype=float)
+    node_y = nodes["y"].to_numpy(dtype=float)
+    u = nodes.index.get_indexer(edges.index.get_level_values("u"))
+    v = nodes.index.get_indexer(edges.index.get_level_values("v"))
+
+    # Nodes in the order in which vertices are created: the base, then the ends of every edge
+    sequence = np.empty(1 + 2 * len(u), dtype=np.int64)
+    sequence[0] = 0
+    sequence[1::2] = u
+    sequence[2::2] = v
+
+    # Vertex of every node - nodes with the same (rounded) coordinates share one
+    keys = np.column_stack([node_x, node_y])
+    if coord_precision is not None:
+        keys = np.round(keys, coord_precision)
+    _, node_key = np.unique(keys, axis=0, return_inverse=True)
+    sequence_keys = node_key.ravel()[sequence]
+    _, first = np.unique(sequence_keys, return_index=True)
+    first.sort()
+    vertex_of_key = np.empty(len(keys), dtype=np.int64)
+    vertex_of_key[sequence_keys[first]] = np.arange(len(first))
+    vertex_nodes = sequence[first]  # Node of every vertex (its first occurrence)
+    start = vertex_of_key[sequence_keys[1::2]]
+    end = vertex_of_key[sequence_keys[2::2]]
+
+    center_lat, center_lon = center_point
+    priorities = calculate_priorities(_first_values(edges["highway"]), node_x[u], node_y[u], node_x[v], node_y[v],
+                                      center_lon, center_lat, max_distance)
+    lanes = calculate_lanes_column(_first_values(edges["lanes"]))
+
+    vertex_x = node_x[vertex_nodes]
+    vertex_y = node_y[vertex_nodes]
+    if issubclass(graph_cls, CompactGraph):
+        # Every OSM edge becomes a pair of opposite edges, as in from_edge_records
+        sources = np.column_stack([start, end]).ravel()
+        targets = np.column_stack([end, start]).ravel()
+        graph = graph_cls.from_arrays(vertex_x, vertex_y, sources, targets, np.repeat(priorities, 2),
+                                      np.repeat(lanes, 2), np.arange(len(sources)) ^ 1, base=0)
+    else:
+        x = vertex_x.tolist()
+        y = vertex_y.tolist()
+        records = (((x[w1], y[w1]), (x[w2], y[w2]), priority, lane_count)
+                   for w1, w2, priority, lane_count in zip(start.tolist(), end.tolist(), priorities.tolist(),
+                                                           lanes.tolist()))
+        # Vertices already have distinct coordinates - exact comparison
+        graph = graph_cls.from_edge_records(records, base=(x[0], y[0]))
+
+    graph.set_osm_node_ids(nodes.index.to_numpy(dtype=np.int64)[vertex_nodes])
+    return graph
+
+
 def get_osm_graph_from_point(center_point, dist=800, dist_type="bbox", network_type="drive", main_roads=False,
-                             custom_roads=None):
+                             custom_roads=None, coord_precision=7, graph_cls=Graph):
     """
     Retrieves map section from OSM around given point (center_point)
     within radius dist (in meters) and creates a 'Graph' object.
@@ -84,60 +245,191 @@ def get_osm_graph_from_point(center_point, dist=800, dist_type="bbox", network_t
     Parameters:
     - center_point: (lat, lon) - center point
     - dist: radius in meters (or half side if dist_type='bbox')
-    - dist_type: 'bbox', 'circle' or 'network' (buffer type)
+    - dist_type: 'bbox' or 'network' (buffer type)
     - network_type: 'drive', 'walk', 'bike' etc.
     - main_roads: bool, if True -> retrieve only main road categories
     - custom_roads: list of strings, e.g., ["motorway", "primary", "secondary"], for custom filter
+    - coord_precision: decimal places used to merge OSM nodes with (almost) identical coordinates
+    - graph_cls: Graph or CompactGraph - representation of the built road network
 
-    Returns: 'Graph' object
+    Returns: 'Graph' (or 'CompactGraph') object
     """
 
-    # Determine if we build custom_filter
-    #    - if main_roads=True, use predetermined set of major roads
-    #    - if custom_roads is provided, build filter from that list
-    #    - otherwise None (OSMnx will fetch according to default 'network_type')
-
-    if custom_roads and isinstance(custom_roads, list) and len(custom_roads) > 0:
-        # Build expression e.g.: '["highway"~"motorway|primary|secondary"]'
-        filter_str = "|".join(custom_roads)
-        custom_filter = f'["highway"~"{filter_str}"]'
-    elif main_roads:
-        # Example: motorway, primary, secondary, trunk, tertiary
-        custom_filter = '["highway"~"motorway|trunk|primary|secondary|trunk|tertiary"]'
-    else:
-        # No filter
-        custom_filter = None
+    import osmnx as ox  # Imported only when needed - loading layouts from files does not require OSMnx
 
     G_osm = ox.graph_from_point(
         center_point,
         dist=dist,
         dist_type=dist_type,
         network_type=network_type,
-        custom_filter=custom_filter
+        custom_filter=_road_filter(main_roads, custom_roads)
     )
 
-    graph = Graph()
+    return _convert_osm_graph(G_osm, center_point, dist, coord_precision, graph_cls)
+
+
+# --- Offline OSM extracts ---
+# Local .osm (XML) and .graphml files are loaded with the OSMnx file loaders, so no network access is needed.
+# Converted graphs are cached on disk - repeated loads skip both parsing and conversion.
+
+OSM_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "road_clearing", "osm")
+OSM_CACHE_VERSION = 3  # Increase when the conversion changes - old cache entries are then ignored
+
+# Road filters of local files - the OSMnx network types (see ox.graph_from_point) restricted to the way attributes
+# kept by ox.graph_from_xml (ox.settings.useful_tags_way): a way with a 'highway' value is dropped if a value of
+# one of the attributes below matches its regex (searched, as in Overpass). Conditions of OSMnx on other tags
+# (motor_vehicle, motorcar, foot, bicycle, sidewalk) cannot apply to files - graph_from_xml drops these tags.
+_EXCLUDED_HIGHWAYS = "abandoned|construction|no|planned|platform|proposed|raceway|razed|rest_area|services"
+NETWORK_EXCLUSIONS = {
+    "drive": {"area": "yes", "access": "private",
+              "highway": _EXCLUDED_HIGHWAYS + "|bridleway|bus_guideway|corridor|cycleway|elevator|escalator|footway"
+                                              "|path|pedestrian|service|steps|track",
+              "service": "alley|driveway|emergency_access|parking|parking_aisle|private"},
+    "drive_service": {"area": "yes", "access": "private",
+                      "highway": _EXCLUDED_HIGHWAYS + "|bridleway|bus_guideway|corridor|cycleway|elevator|escalator"
+                                                      "|footway|path|pedestrian|steps|track",
+                      "service": "emergency_access|parking|parking_aisle|private"},
+    "walk": {"area": "yes", "access": "private", "highway": _EXCLUDED_HIGHWAYS + "|bus_guideway|cycleway|motor",
+             "service": "private"},
+    "bike": {"area": "yes", "access": "private",
+             "highway": _EXCLUDED_HIGHWAYS + "|bus_guideway|corridor|elevator|escalator|footway|motor|steps",
+             "service": "private"},
+    "all": {"area": "yes", "highway": _EXCLUDED_HIGHWAYS},
+    "all_public": {"area": "yes", "access": "private", "highway": _EXCLUDED_HIGHWAYS, "service": "private"},
+}
+
+
+def file_hash(path, block_size=1 << 20):
+    # SHA-256 of the file contents (hex)
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _way_filter(network_type="drive", road_types=None):
+    """
+    Road filter of local files: function (edge data) -> bool. Like ox.graph_from_point, it keeps the ways with
+    a 'highway' value among road_types (a list, see _road_types) or - if road_types is None - the roads of
+    network_type (NETWORK_EXCLUSIONS).
+    """
+    if road_types is not None:
+        included = re.compile("|".join(road_types))
+        exclusions = {}
+    else:
+        if network_type not in NETWORK_EXCLUSIONS:
+            raise ValueError(f"Unknown network_type: {network_type} (use {', '.join(NETWORK_EXCLUSIONS)})")
+        included = None
+        exclusions = {key: re.compile(regex) for key, regex in NETWORK_EXCLUSIONS[network_type].items()}
+
+    def values(value):
+        # Simplified OSMnx edges keep lists of the values of the merged ways
+        return value if isinstance(value, list) else [value]
+
+    def matches(data):
+        highway = data.get("highway")
+        if highway is None:
+            return False
+        if included is not None and not any(included.search(str(value)) for value in values(highway)):
+            return False
+        for key, pattern in exclusions.items():
+            value = data.get(key)
+            if value is not None and any(pattern.search(str(value)) for value in values(value)):
+                return False
+        return True
+
+    return matches
+
+
+def _load_osm_file(path, center_point, dist, dist_type, network_type, road_types):
+    # Local counterpart of ox.graph_from_point: the same road filters (see NETWORK_EXCLUSIONS) and truncation,
+    # applied to a file
+    import osmnx as ox
+    import networkx as nx
+
+    if os.path.splitext(path)[1].lower() == ".graphml":
+        G_osm = ox.load_graphml(path)
+    else:
+        G_osm = ox.graph_from_xml(path, simplify=False, retain_all=True)
 
-    # add base
-    if len(G_osm.nodes) > 0:
-        first_node_id = list(G_osm.nodes)[0]
-        x_base = G_osm.nodes[first_node_id]["x"]
-        y_base = G_osm.nodes[first_node_id]["y"]
-        graph.add_base(x_base, y_base)
+    matches = _way_filter(network_type, road_types)
+    G_osm.remove_edges_from([(u, v, key) for u, v, key, data in G_osm.edges(keys=True, data=True)
+                             if not matches(data)])
+    G_osm.remove_nodes_from(list(nx.isolates(G_osm)))
+    if len(G_osm) == 0:
+        raise ValueError(f"{path}: no roads match the road filter")
+
+    if center_point is not None:
+        # Raises ValueError if the map section lies outside the file
+        G_osm = ox.truncate.truncate_graph_bbox(G_osm, ox.utils_geo.bbox_from_point(center_point, dist))
+    G_osm = ox.truncate.largest_component(G_osm, strongly=False)
+    if not G_osm.graph.get("simplified", False):
+        G_osm = ox.simplify_graph(G_osm)
+
+    if center_point is not None and dist_type == "network":
+        node = ox.distance.nearest_nodes(G_osm, X=center_point[1], Y=center_point[0])
+        G_osm = ox.truncate.truncate_graph_dist(G_osm, node, dist)
+    return G_osm
+
+
+def _osm_cache_file(cache_dir, key):
+    digest = hashlib.sha256(json.dumps(key, sort_keys=True).encode("utf-8")).hexdigest()[:32]
+    return os.path.join(cache_dir, f"osm_{digest}{EXTENSION}")
 
-    center_lat, center_lon = center_point
-    max_distance = dist
-    for u, v, key, data in G_osm.edges(keys=True, data=True):
-        x_u = G_osm.nodes[u]["x"]
-        y_u = G_osm.nodes[u]["y"]
-        x_v = G_osm.nodes[v]["x"]
-        y_v = G_osm.nodes[v]["y"]
 
-        priority = calculate_priority(data, x_u, y_u, x_v, y_v, center_lon, center_lat, max_distance)
-        lanes = calculate_lanes(data)
+def get_osm_graph_from_file(path, center_point=None, dist=800, dist_type="bbox", network_type="drive",
+                            main_roads=False, custom_roads=None, coord_precision=7, graph_cls=Graph,
+                            cache_dir=OSM_CACHE_DIR):
+    """
+    Creates a 'Graph' object from a local OSM extract (.osm XML or .graphml file) - without network access.
+
+    Parameters as in get_osm_graph_from_point, and:
+    - path: .osm (XML) or .graphml file (e.g. saved with ox.save_graphml; used as saved - not simplified again)
+    - center_point: (lat, lon) of the map section to take, None - the whole file (then its center is used
+      for the priorities)
+    - cache_dir: directory of converted graphs, None - no cache. Entries are keyed by the file contents (SHA-256)
+      and all parameters, so a changed file or different parameters never reuse a stale graph. Entries are .rcg
+      files (binary_graph): a CompactGraph is memory-mapped, a Graph is built again from the mapped arrays
+      (from_edge_records), which skips OSM parsing and conversion but still creates every vertex and edge object.
 
-        graph.add_edge((x_u, y_u), (x_v, y_v), priority, lanes)
+    Roads are selected as by get_osm_graph_from_point, see NETWORK_EXCLUSIONS for the differences.
 
+    Returns: 'Graph' (or 'CompactGraph') object
+    """
+    road_types = _road_types(main_roads, custom_roads)
+
+    cache_file = None
+    if cache_dir is not None:
+        key = {"version": OSM_CACHE_VERSION, "source": file_hash(path), "center_point": center_point, "dist": dist,
+               "dist_type": dist_type, "network_type": network_type, "filter": road_types,
+               "coord_precision": coord_precision}
+        cache_file = _osm_cache_file(cache_dir, key)
+        if os.path.exists(cache_file):
+            try:
+                graph = _open_binary_as(cache_file, graph_cls)
+                logger.info("Loaded %s from cache %s", path, cache_file)
+                return graph
+            except Exception as e:  # A damaged cache entry is rebuilt
+                logger.warning("Ignoring damaged cache entry %s: %s", cache_file, e)
+
+    G_osm = _load_osm_file(path, center_point, dist, dist_type, network_type, road_types)
+    if center_point is None:
+        xs = [x for _, x in G_osm.nodes(data="x")]
+        ys = [y for _, y in G_osm.nodes(data="y")]
+        center_point = ((min(ys) + max(ys)) / 2, (min(xs) + max(xs)) / 2)
+    graph = _convert_osm_graph(G_osm, center_point, dist, coord_precision, graph_cls)
+
+    if cache_file is not None:
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            write_binary_graph(graph, cache_file)  # Atomic - concurrent loads never see a partial entry
+        except OSError as e:  # The cache is an optimization - a read-only or full disk must not fail the load
+            logger.warning("Failed to write cache entry %s: %s", cache_file, e)
+        else:
+            # The .rcg file keeps edges in CSR order - return the graph read back from it, so that the first
+            # and the later (cached) loads give the same vertex and edge ids
+            return _open_binary_as(cache_file, graph_cls)
     return graph
 
 
@@ -145,44 +437,163 @@ def get_osm_graph_from_point(center_point, dist=800, dist_type="bbox", network_t
 # where the data is represented in the following format:
 # (vertex_1) (vertex_2) priority lanes
 
-def load_graph_from_file(filename):
-    graph = Graph(true_location=False)  # Create an empty graph
+LAYOUT_CHUNK_SIZE = 1 << 20  # Approximate number of characters read (and sent to a parsing worker) at once
+PARSE_AHEAD = 4  # Number of chunks per worker process parsed ahead of the graph construction
+
 
+def _coordinate(text):
+    # Integer coordinates stay ints (as eval of "(0,0)" used to return), the rest are floats
+    return float(text) if "." in text or "e" in text or "E" in text else int(text)
+
+
+def _parse_point(token):
+    # "(x,y)" -> (x, y)
+    coordinates = token[1:-1].split(",")
+    if token[:1] != "(" or token[-1:] != ")" or len(coordinates) != 2:
+        raise ValueError(f"invalid point '{token}'")
+    return _coordinate(coordinates[0]), _coordinate(coordinates[1])
+
+
+def _parse_layout_chunk(lines, first_line_number):
+    """
+    Parses a chunk of lines of a layout file (blank lines are skipped).
+    Module-level function, so that it can run in a worker process.
+
+    :return: (records, errors) - records (point1, point2, priority, lanes) and errors (line number, line, reason)
+    """
+    records = []
+    errors = []
+    for line_number, line in enumerate(lines, first_line_number):
+        fields = line.split()
+        if not fields:
+            continue
+        try:
+            if len(fields) != 4:
+                raise ValueError(f"expected '(x,y) (x,y) priority lanes', got {len(fields)} fields")
+            records.append((_parse_point(fields[0]), _parse_point(fields[1]), int(fields[2]), int(fields[3])))
+        except ValueError as e:
+            errors.append((line_number, line.strip(), str(e)))
+    return records, errors
+
+
+def _read_layout_chunks(file, chunk_size):
+    # Yields (lines, number of the first line) - about chunk_size characters at a time
+    line_number = 1
+    while True:
+        lines = file.readlines(chunk_size)
+        if not lines:
+            return
+        yield lines, line_number
+        line_number += len(lines)
+
+
+def _parse_chunks_in_workers(chunks, workers):
+    # Parses chunks in worker processes, keeping at most PARSE_AHEAD chunks per worker in flight;
+    # results are yielded in the order of the file
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(_parse_layout_chunk, *chunk))
+            if len(pending) >= PARSE_AHEAD * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+class LayoutReport:
+    """
+    Summary of parsing a layout file: number of streets and invalid lines (with the first MAX_EXAMPLES of them).
+    """
+    MAX_EXAMPLES = 10
+
+    def __init__(self, filename=None):
+        self.filename = filename
+        self.streets = 0
+        self.invalid_lines = 0
+        self.examples = []  # (line number, line, reason)
+
+    def add(self, records, errors):
+        self.streets += len(records)
+        self.invalid_lines += len(errors)
+        self.examples += errors[:self.MAX_EXAMPLES - len(self.examples)]
+
+    def __str__(self):
+        lines = [f"{self.filename}: {self.streets} streets, {self.invalid_lines} invalid lines skipped"]
+        lines += [f"  line {line_number}: '{line}' ({reason})" for line_number, line, reason in self.examples]
+        if self.invalid_lines > len(self.examples):
+            lines.append(f"  ... and {self.invalid_lines - len(self.examples)} more")
+        return "\n".join(lines)
+
+
+def parse_layout_file(filename, report=None, workers=0, chunk_size=LAYOUT_CHUNK_SIZE):
+    """
+    Streams the records (point1, point2, priority, lanes) of a .txt layout file, reading it in chunks.
+    Invalid lines are skipped and counted in 'report' (LayoutReport).
+
+    :param workers: number of worker processes parsing the chunks while the records are consumed
+                    (0 - parse in this process)
+    """
     with open(filename, 'r') as file:
-        lines = file.readlines()  # Read all lines from the file
+        chunks = _read_layout_chunks(file, chunk_size)
+        if workers > 0:
+            results = _parse_chunks_in_workers(chunks, workers)
+        else:
+            results = (_parse_layout_chunk(*chunk) for chunk in chunks)
+        for records, errors in results:
+            if report is not None:
+                report.add(records, errors)
+            yield from records
+
+
+def _open_binary_as(filename, graph_cls):
+    graph = open_binary_graph(filename)
+    if graph_cls is CompactGraph:
+        return graph
+    base = (float(graph.vertex_x[graph.base]), float(graph.vertex_y[graph.base])) if graph.base is not None else None
+    result = graph_cls.from_edge_records(graph.edge_records(), true_location=graph.true_location, base=base)
+    if graph.osm_node_ids is not None:
+        # from_edge_records numbers the vertices anew - match them with the file's vertices by coordinates
+        vertex_of_point = {point: vertex for vertex, point in enumerate(zip(graph.vertex_x.tolist(),
+                                                                            graph.vertex_y.tolist()))}
+        result.set_osm_node_ids(np.asarray(graph.osm_node_ids)[[vertex_of_point[(vertex.x, vertex.y)]
+                                                                for vertex in result.vertices]])
+    return result
+
+
+def load_graph_from_file(filename, graph_cls=Graph, report=None, parse_workers=0):
+    """
+    Loads a road network from a .txt layout file or a binary .rcg file (see binary_graph).
 
-        # Check if the line is not empty
-        lines = [line.strip() for line in lines if line.strip()]
+    :param graph_cls: Graph or CompactGraph - representation of the built road network
+    :param report: LayoutReport filled in while parsing a .txt file
+                   (None - a summary of invalid lines is logged as a warning)
+    :param parse_workers: number of worker processes parsing a .txt file while the graph is built (0 - none)
+    """
+    # Binary .rcg files (see binary_graph) are memory-mapped as a CompactGraph instead of parsed
+    if is_binary_graph(filename):
+        return _open_binary_as(filename, graph_cls)
 
-        # Treat the first point as the base
-        first_line = lines[0]
-        start_point, end_point, priority, lanes = first_line.split(" ")
-        start_point = eval(start_point)  # Convert e.g., "(0, 0)" to a tuple (0, 0)
-        end_point = eval(end_point)
-        priority = int(priority)
-        lanes = int(lanes)
+    log_report = report is None
+    if log_report:
+        report = LayoutReport(filename)
 
-        graph.add_edge(start_point, end_point, priority, lanes)
-        graph.add_base(*start_point)  # Add the base
+    records = parse_layout_file(filename, report, parse_workers)
 
-        # Process the remaining lines - load the rest of the streets
-        for line in lines[1:]:
-            try:
-                start_point, end_point, priority, lanes = line.split(" ")
-                start_point = eval(start_point)
-                end_point = eval(end_point)
-                priority = int(priority)
-                lanes = int(lanes)
+    # Treat the start of the first street as the base
+    first_record = next(records, None)
+    if first_record is None:
+        raise ValueError(f"No valid streets - {report}")
 
-                graph.add_edge(start_point, end_point, priority, lanes)
-            except ValueError as e:
-                print(f"Invalid format in line: '{line}'. Error: {e}")
-                continue  # Ignore the invalid line
+    # Build the graph in a single pass over the streamed records
+    graph = graph_cls.from_edge_records(chain([first_record], records), true_location=False, base=first_record[0])
 
-    return graph  # Return the completed graph
+    if log_report and report.invalid_lines:
+        logger.warning("%s", report)
+    return graph
 
 
-def get_graph_of_city(city_name: str, **kwargs):
+def get_graph_of_city(city_name: str, osm_file=None, **kwargs):
+    # osm_file - local .osm/.graphml extract to take the city section from (get_osm_graph_from_file) instead of OSM
     city_loc_dict = {
         "Krakow": (50.062756, 19.938077),
         "Kety": (49.88335218571101, 19.22146813090962),
@@ -193,4 +604,6 @@ def get_graph_of_city(city_name: str, **kwargs):
         "Sandomierz": (50.687756998444975, 21.732591122191614)
     }
 
+    if osm_file is not None:
+        return get_osm_graph_from_file(osm_file, center_point=city_loc_dict[city_name], **kwargs)
     return get_osm_graph_from_point(city_loc_dict[city_name], **kwargs)
\ No newline at end of file
@@ -2,10 +2,15 @@
 Definition of two neighborhood functions ->
 
 - The 'current_solution' parameter is in the form [Machine_object, Machine_object...]
-- The returned solution is in the form [[path_1, path_2...], [] ...] - a route for one randomly selected machine
+- The route of one randomly selected machine is replaced, and a Move describing the change is returned
+  (None if the route was not changed), so the caller can undo it
 """
 
+import logging
 import random
+from data_structures import Move
+
+logger = logging.getLogger(__name__)
 
 def neighbor_function_1(current_solution, search_depth, graph, T_max):
     """
@@ -27,8 +32,6 @@ def neighbor_function_1(current_solution, search_depth, graph, T_max):
     machine_id = random.randint(0, len(current_solution) - 1)
     machine = current_solution[machine_id]
     machine_speed = machine.speed
-    machine_routes = [m.route for m in current_solution]
-    initial_machine_routes = machine_routes
     route = machine.route
 
     # Solution in the form of [[]], where sublists are for different stages (for one machine)
@@ -115,9 +118,10 @@ def neighbor_function_1(current_solution, search_depth, graph, T_max):
         solution_list = [[] for _ in range(num_stages)]
         stage = 0
         time_cost = 0
+        travel_times = graph.get_travel_times(machine_speed)
 
         for edge in new_solution:
-            edge_cost = edge.calculate_length() / machine_speed
+            edge_cost = travel_times[edge.id]
 
             if time_cost + edge_cost > T_max:
                 stage += 1
@@ -143,13 +147,12 @@ def neighbor_function_1(current_solution, search_depth, graph, T_max):
             stage += 1
 
         machine.route = solution_list
-        machine_routes[machine_id] = solution_list
 
-        return machine_routes
+        return Move(machine_id, route, solution_list)
 
     else:
-        print("No change!")
-        return initial_machine_routes
+        logger.debug("No change!")
+        return None
 
 
 def neighbor_function_2(current_solution, graph, T_max, param2=2):
@@ -170,23 +173,23 @@ def neighbor_function_2(current_solution, graph, T_max, param2=2):
     machine_id = random.randint(0, len(current_solution) - 1)
     machine = current_solution[machine_id]
     machine_speed = machine.speed
-    machine_routes = [m.route for m in current_solution]
     route = machine.route
 
     # Solution in the form of [[]], where sublists are for different stages (for one machine)
     num_stages = len(route)  # Remember the number of stages
     if num_stages <= 1:
-        return route
+        return None
     stage = random.randint(1, num_stages - 1)  # Randomly select a stage (excluding the initial one)
 
     stages_to_modify = [idx for idx in range(1, num_stages) if len(route[idx]) > 0]
     if not stages_to_modify:
-        print("No non-empty stage (except the first one) - no change!")
-        return route
+        logger.debug("No non-empty stage (except the first one) - no change!")
+        return None
 
     stage = random.choice(stages_to_modify)
 
     new_solution = route[:stage]  # Preserve stages up to the selected one in unchanged form
+    travel_times = graph.get_travel_times(machine_speed)
     start = route[stage][0].start
 
     # Set of edges from the previous stage
@@ -223,20 +226,20 @@ def neighbor_function_2(current_solution, graph, T_max, param2=2):
                     break
 
             # Check if we exceed the maximum time
-            if time_cost + chosen_edge.calculate_length() / machine_speed >= T_max:
+            if time_cost + travel_times[chosen_edge.id] >= T_max:
                 break
 
             else:
                 # Add the chosen edge to the route and update the time
                 new_route.append(chosen_edge)
-                time_cost += chosen_edge.calculate_length() / machine_speed
+                time_cost += travel_times[chosen_edge.id]
                 start = chosen_edge.end  # Update the current vertex
 
         if len(new_route) == 0:
             # If nothing was added in the entire while loop,
             # revert the modifications or try another method
-            print("Stage turned out to be empty even with fallback - abandoning modification.")
-            return route
+            logger.debug("Stage turned out to be empty even with fallback - abandoning modification.")
+            return None
 
         # Add the new route to the stage
         new_solution.append(new_route)
@@ -257,9 +260,8 @@ def neighbor_function_2(current_solution, graph, T_max, param2=2):
             stage_id += 1
 
     machine.route = new_solution
-    machine_routes[machine_id] = new_solution
 
-    return machine_routes
+    return Move(machine_id, route, new_solution)
 
 
 def complete_stage(solution_list, stage_index, graph, T_max, speed, param2=2):
@@ -287,9 +289,10 @@ def complete_stage(solution_list, stage_index, graph, T_max, speed, param2=2):
         start_vertex = solution_list[stage_index][-1].end
 
     # Calculate the current time in the stage
+    travel_times = graph.get_travel_times(speed)
     current_time = 0
     for edge in solution_list[stage_index]:
-        current_time += edge.calculate_length() / speed
+        current_time += travel_times[edge.id]
 
     # While there is time, try to add edges
     while True:
@@ -312,7 +315,7 @@ def complete_stage(solution_list, stage_index, graph, T_max, speed, param2=2):
                 if edge.end in recent_vertices:
                     continue
 
-            cost = edge.calculate_length() / speed
+            cost = travel_times[edge.id]
             if current_time + cost <= T_max:
                 chosen_edge = edge
                 break
@@ -323,5 +326,5 @@ def complete_stage(solution_list, stage_index, graph, T_max, speed, param2=2):
 
         # Add the edge
         solution_list[stage_index].append(chosen_edge)
-        current_time += chosen_edge.calculate_length() / speed
+        current_time += travel_times[chosen_edge.id]
         start_vertex = chosen_edge.end
\ No newline at end of file
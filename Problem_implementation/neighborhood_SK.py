@@ -1,6 +1,13 @@
 import heapq
+import logging
+import math
 import random
-import copy
+from data_structures import Move
+from edge_usage import EdgeUsageIndex
+
+logger = logging.getLogger(__name__)
+
+_NOT_CACHED = object()  # Znacznik braku wpisu w pamięci podręcznej (None to poprawny wynik - brak objazdu)
 
 
 def find_path_to_edge(road_layout, target_edge, machine_speed):
@@ -8,16 +15,17 @@ def find_path_to_edge(road_layout, target_edge, machine_speed):
     Find path from base to the start of target edge using A* algorithm.
     Returns path and total time cost.
     """
-    open_set = [(0, road_layout.baza, [])]
+    open_set = [(0, road_layout.baza, [], 0)]  # (f_score, vertex, path, g_score)
     closed_set = set()
+    travel_times = road_layout.get_travel_times(machine_speed)
 
     # Target nodes are both start and end of the target edge
 
     while open_set:
-        f_score, current, path = heapq.heappop(open_set)
+        f_score, current, path, path_length = heapq.heappop(open_set)
 
         if current == target_edge.start:
-            total_time = sum(edge.calculate_length() for edge in path) / machine_speed
+            total_time = sum(travel_times[edge.id] for edge in path)
             return path, total_time, current
 
         if current in closed_set:
@@ -32,12 +40,12 @@ def find_path_to_edge(road_layout, target_edge, machine_speed):
             edge = road_layout.get_edge(current, neighbor)
 
             new_path = path + [edge]
-            g_score = sum(e.calculate_length() for e in new_path)
+            g_score = path_length + edge.length
             # Use minimum distance to either end of target edge as heuristic
-            h_score = neighbor.get_distance(target_edge.start) # road_layout.get_edge(neighbor, target_edge.start).dlugosc
+            h_score = road_layout.heuristic_distance(neighbor, target_edge.start)
             f_score = g_score + h_score
 
-            heapq.heappush(open_set, (f_score, neighbor, new_path))
+            heapq.heappush(open_set, (f_score, neighbor, new_path, g_score))
 
     return None, 0, None
 
@@ -50,7 +58,7 @@ def fill_remaining_time(road_layout, start_node, remaining_time, machine_speed):
     last_node = None
     current_node = start_node
     time_used = 0
-    # print(remaining_time)
+    travel_times = road_layout.get_travel_times(machine_speed)
 
     while True:
         # Get valid neighbors (excluding those that would create a dead end)
@@ -67,7 +75,7 @@ def fill_remaining_time(road_layout, start_node, remaining_time, machine_speed):
         edge = road_layout.get_edge(current_node, next_node)
 
         # Check if adding this edge would exceed remaining time
-        time_cost = edge.calculate_length() / machine_speed
+        time_cost = travel_times[edge.id]
         if time_used + time_cost > remaining_time:
             break
 
@@ -81,82 +89,93 @@ def fill_remaining_time(road_layout, start_node, remaining_time, machine_speed):
     return additional_route, time_used
 
 
-def generate_route_from_least_frequent(machines, road_layout, Tmax, consider_priority=False):
+def generate_route_from_least_frequent(machines, road_layout, Tmax, consider_priority=False, usage_index=None):
     """
     Generuje trasęz bazy do najmniej uczęszczanej ulicy i
     ewentualnie dokłada ulice na koniec trasy, aby wypełnić czas.
+    Zwraca obiekt Move opisujący zmianę (None, jeśli nie znaleziono trasy).
+
+    usage_index - aktualny EdgeUsageIndex dla tych maszyn (None - budowany na potrzeby jednego wywołania)
     """
 
     current_machine = random.choice(machines)
+    machine_index = machines.index(current_machine)
     num_of_stages = len(current_machine.route)
 
-    def calculate_street_frequency(edge):
-        frequency = 0
-        for machine in machines:
-            if machine != current_machine:  # Don't count current machine
-                for stage_index in range(num_of_stages):
-                    frequency += sum(1 for route_edge in machine.route[stage_index]
-                                     if route_edge == edge)
-
-        # If considering priority, adjust frequency score by priority
-        if consider_priority:
-            # Normalize frequency to 0-1 range and combine with priority
-            # Lower frequency and higher priority will give lower score
+    if usage_index is None:
+        usage_index = EdgeUsageIndex(road_layout, machines)
+
+    # Paths from the base come from the cached shortest-path tree (computed once per graph)
+    path_tree = road_layout.shortest_path_tree()
+    arrival_times = path_tree.edge_arrival_times(current_machine.speed)
+    time_budget = Tmax * num_of_stages
+
+    edges = road_layout.edges
+    target_edge = None
+
+    if consider_priority:
+        # Normalize frequency to 0-1 range and combine with priority
+        # Lower frequency and higher priority will give lower score
+        max_priority = max(edge.priority for edge in edges)
+        street_of_edge = usage_index.street_of_edge
+
+        def street_score(edge):
+            frequency = usage_index.count(street_of_edge[edge.id], machine_index)
             freq_score = frequency / (len(machines) - 1) if len(machines) > 1 else 1
-            priority_score = 1 - (edge.priority / max(e.priority for e in road_layout.edges))
+            priority_score = 1 - (edge.priority / max_priority)
             return (freq_score + priority_score) / 2
-        return frequency
 
-    # Calculate frequencies for all edges
-    edge_scores = [(calculate_street_frequency(edge), edge) for edge in road_layout.edges]
-    edge_scores.sort(key=lambda x: x[0])  # Sort by frequency/score
+        # Filter target edges reachable within the whole time budget in one vectorized pass
+        reachable = (arrival_times <= time_budget).nonzero()[0].tolist()
+        if reachable:
+            target_edge = min((edges[edge_id] for edge_id in reachable), key=street_score)
+
+    else:
+        # Streets reachable within the time budget depend only on the speed - they get a queue of their own
+        subset = ("reachable", current_machine.speed, time_budget)
+        if subset not in usage_index.subsets:
+            street_of_edge = usage_index.street_of_edge
+            usage_index.add_subset(subset, (street_of_edge[edge_id]
+                                            for edge_id in (arrival_times <= time_budget).nonzero()[0].tolist()))
+
+        # Least used reachable street (by the other machines)
+        for _, street in usage_index.least_used(machine_index, subset):
+            target_edge = next(edges[edge_id] for edge_id in usage_index.street_edges[street]
+                               if arrival_times[edge_id] <= time_budget)
+            break
+
+    if target_edge is None:
+        return None
 
-    # Try edges starting from least frequent
-    for _, target_edge in edge_scores:
-        # Find path from base to target edge
-        path_to_edge, time_to_edge, reached_node = find_path_to_edge(
+    # Shortest path from base to target edge
+    route = path_tree.path_to(target_edge.start) + [target_edge]
+    time_cost = float(arrival_times[target_edge.id])
+
+    # Try to fill remaining time
+    remaining_time = Tmax * num_of_stages - time_cost
+    if remaining_time > 0:
+        additional_edges, additional_time = fill_remaining_time(
             road_layout,
-            target_edge,
+            route[-1].end,
+            remaining_time,
             current_machine.speed
         )
 
-        # print(current_machine.route)
-        if path_to_edge is not None:
-            # Add the target edge to the path
-            route = path_to_edge + [target_edge]
-
-            # Calculate time cost of path for all stages including initial edge
-            time_cost = (sum(edge.calculate_length() for edge in route) / current_machine.speed)
-
-            if time_cost <= Tmax * num_of_stages:
-                # Try to fill remaining time
-                remaining_time = Tmax * num_of_stages - time_cost
-                if remaining_time > 0:
-                    additional_edges, additional_time = fill_remaining_time(
-                        road_layout,
-                        route[-1].end,
-                        remaining_time,
-                        current_machine.speed
-                    )
-
-                    route.extend(additional_edges)
-
-                # print(route)
-                route = [route] + [[] for _ in range(num_of_stages - 1)]
-                route = adjust_route_to_tmax(route, current_machine, Tmax)
-                # print(route)
-                current_machine.route = route
-                return route
+        route.extend(additional_edges)
 
-    # If no valid route found, return empty route
-    return []
+    route = [route] + [[] for _ in range(num_of_stages - 1)]
+    route = adjust_route_to_tmax(road_layout, route, current_machine, Tmax)
+    previous_route = current_machine.route
+    current_machine.route = route
+    return Move(machine_index, previous_route, route)
 
 
-def adjust_route_to_tmax(new_route, machine, Tmax):
+def adjust_route_to_tmax(road_layout, new_route, machine, Tmax):
     """
     Dostosowuje trasę do maksymalnego czasu Tmax, przesuwając nadmiarowe krawędzie
     do następnego segmentu lub usuwając je, jeśli to ostatni segment.
     """
+    travel_times = road_layout.get_travel_times(machine.speed)
 
     for segment_idx in range(len(new_route)):
         while True:
@@ -165,7 +184,7 @@ def adjust_route_to_tmax(new_route, machine, Tmax):
 
             # Oblicz całkowity czas dla bieżącego segmentu
             for edge_idx, edge in enumerate(new_route[segment_idx]):
-                time += edge.length / machine.speed
+                time += travel_times[edge.id]
 
                 # Jeśli czas przekracza Tmax, przygotuj się do przesunięcia krawędzi
                 if time > Tmax:
@@ -194,6 +213,76 @@ def adjust_route_to_tmax(new_route, machine, Tmax):
     return new_route
 
 
+def repair_path_A_star(removed_edge, graph):
+    """
+    Szuka algorytmem A* najkrótszego objazdu z początku do końca usuniętej krawędzi, bez użycia tej ulicy.
+    Koszty dotarcia przechowujemy w słownikach uzupełnianych leniwie, więc koszt wyszukiwania
+    zależy od przeszukanego obszaru, a nie od liczby wierzchołków grafu.
+
+    Returns:
+        List[Edge] | None: Krawędzie objazdu (None, jeśli objazd nie istnieje).
+    """
+    open_set = [(0, removed_edge.start)]  # Kolejka priorytetowa
+    closed_set = set()  # Id odwiedzonych węzłów
+    came_from = {}  # Id wierzchołka -> wierzchołek, z którego do niego dotarliśmy
+    g_score = {removed_edge.start.id: 0}  # Koszt dotarcia (brak wpisu - nieskończoność)
+    target = removed_edge.end
+
+    while open_set:
+        _, current = heapq.heappop(open_set)
+
+        # Jeśli dotarliśmy do celu, rekonstruujemy ścieżkę
+        if current == target:
+            path = []
+            while current.id in came_from:
+                prev_node = came_from[current.id]
+                path.append(graph.get_edge(prev_node, current))
+                current = prev_node
+            return path[::-1]  # Odwróć kolejność, by zaczynać od startu
+
+        # Dodaj węzeł do zbioru odwiedzonych
+        closed_set.add(current.id)
+        current_g_score = g_score[current.id]
+
+        # Iterujemy po sąsiadach wierzchołka
+        for neighbor in current.neighbors:
+            # Ignorujemy węzły już odwiedzone
+            if neighbor.id in closed_set:
+                continue
+
+            edge = graph.get_edge(current, neighbor)
+
+            # Ignorujemy krawędź usuniętą (w obu kierunkach)
+            if edge == removed_edge:
+                continue
+
+            # Oblicz koszt przejścia
+            tentative_g_score = current_g_score + edge.length
+
+            if tentative_g_score < g_score.get(neighbor.id, math.inf):
+                came_from[neighbor.id] = current  # Zaktualizuj ścieżkę
+                g_score[neighbor.id] = tentative_g_score
+                # Heurystyka (odległość do celu)
+                f_score = tentative_g_score + graph.heuristic_distance(neighbor, target)
+                heapq.heappush(open_set, (f_score, neighbor))
+
+    return None  # Jeśli nie znaleziono ścieżki
+
+
+def find_detour(removed_edge, graph):
+    """
+    Objazd usuniętej krawędzi (repair_path_A_star) zapamiętywany w graph.detour_cache.
+    Wynik zależy tylko od usuniętej krawędzi, a te same ulice są usuwane wielokrotnie w trakcie SA.
+    Zwracana lista jest współdzielona z pamięcią podręczną - nie należy jej modyfikować.
+    """
+    cache = graph.detour_cache
+    path = cache.get(removed_edge.id, _NOT_CACHED)
+    if path is _NOT_CACHED:
+        path = repair_path_A_star(removed_edge, graph)
+        cache.put(removed_edge.id, path)
+    return path
+
+
 def change_path(machines, road_layout, Tmax):
     """
         Modyfikuje trasę maszyny, usuwając jedną krawędź i zastępując ją nową trasą naprawioną algorytmem A*.
@@ -205,62 +294,13 @@ def change_path(machines, road_layout, Tmax):
             Tmax (float): Maksymalny czas na segment trasy.
 
         Returns:
-            list: Zaktualizowane trasy dla maszyn.
+            Move: Opis zmiany trasy maszyny (pozwala ją cofnąć).
         """
 
-    def repair_path_A_star(removed_edge, graph):
-        open_set = []
-        heapq.heappush(open_set, (0, removed_edge.start))  # Kolejka priorytetowa
-        closed_set = set()  # Zbiór odwiedzonych węzłów
-        came_from = {}  # Przechowuje ścieżkę (z wierzchołka na wierzchołek)
-        g_score = {node: float('inf') for node in graph.vertices}  # Koszt dotarcia
-        g_score[removed_edge.start] = 0
-
-        while open_set:
-            _, current = heapq.heappop(open_set)
-
-            # Jeśli dotarliśmy do celu, rekonstruujemy ścieżkę
-            if current == removed_edge.end:
-                path = []
-                while current in came_from:
-                    prev_node = came_from[current]
-                    edge = graph.get_edge(prev_node, current)
-                    path.append(edge)
-                    current = prev_node
-                return path[::-1]  # Odwróć kolejność, by zaczynać od startu
-
-            # Dodaj węzeł do zbioru odwiedzonych
-            closed_set.add(current)
-
-            # Iterujemy po sąsiadach wierzchołka
-            for neighbor in current.neighbors:
-                edge = graph.get_edge(current, neighbor)
-
-                # Ignorujemy krawędź usuniętą
-                if edge == removed_edge:
-                    continue
-
-                # Ignorujemy węzły już odwiedzone
-                if neighbor in closed_set:
-                    continue
-
-                # Oblicz koszt przejścia
-                tentative_g_score = g_score[current] + current.get_distance(neighbor)
-                # graph.get_edge(current, neighbor).dlugosc
-
-                if tentative_g_score < g_score[neighbor]:
-                    came_from[neighbor] = current  # Zaktualizuj ścieżkę
-                    g_score[neighbor] = tentative_g_score
-                    f_score = tentative_g_score + neighbor.get_distance(removed_edge.end)
-                    # graph.get_edge(neighbor, removed_edge.koniec).dlugosc # Heurystyka (odległość do celu)
-                    heapq.heappush(open_set, (f_score, neighbor))
-
-            # print('dasdas')
-        return None  # Jeśli nie znaleziono ścieżki
-
     machine = random.choice(machines)
-    machine_copy = copy.deepcopy(machine)
-    new_route = machine_copy.route
+    previous_route = machine.route
+    # Kopiujemy tylko listy etapów - krawędzie są współdzielone z grafem
+    new_route = [list(stage) for stage in previous_route]
 
     segment_idx = random.choice(range(len(new_route)))
 
@@ -271,22 +311,20 @@ def change_path(machines, road_layout, Tmax):
         edge_for_deletion_idx = random.choice(range(len(new_route[segment_idx])))
 
     except IndexError:
-        print(new_route[segment_idx])
+        logger.debug("Empty stage selected for change_path: %s", new_route[segment_idx])
 
     edge_for_deletion = new_route[segment_idx][edge_for_deletion_idx]
 
-    repaired_path = repair_path_A_star(edge_for_deletion, road_layout)
-    # print(repaired_path)
+    repaired_path = find_detour(edge_for_deletion, road_layout)
 
     if repaired_path is not None:
         # Replace the deleted edge with the repaired path
         new_route[segment_idx][edge_for_deletion_idx:edge_for_deletion_idx + 1] = repaired_path
-        new_route = adjust_route_to_tmax(new_route, machine, Tmax)
-        # print(new_route)
+        new_route = adjust_route_to_tmax(road_layout, new_route, machine, Tmax)
 
     machine.route = new_route
 
-    return [machine.route for machine in machines]
+    return Move(machines.index(machine), previous_route, new_route)
 
 
 # ---------- JESZCZE NIE DZIAŁA -------------- #
@@ -304,22 +342,23 @@ def squish_routes(machines, road_layout, Tmax):
 
     for machine in machines:
         route = machine.route
+        travel_times = road_layout.get_travel_times(machine.speed)
         for stage_idx in range(1, len(machine.route) - 1):
             stage_time = 0
             for edge in route[stage_idx]:
-                stage_time += edge.length / machine.speed
+                stage_time += travel_times[edge.id]
 
             next_stage_first_edge = route[stage_idx + 1][0]
 
-            if stage_time + next_stage_first_edge.length / machine.speed < Tmax:
+            if stage_time + travel_times[next_stage_first_edge.id] < Tmax:
                 route[stage_idx].append(route[stage_idx + 1].pop(0))
-                print('lista ściśnięta')
+                logger.debug('lista ściśnięta')
 
         # Próbujemy dodać dodatkowe krawędzie do ostatniego etapu
         last_stage_time = 0
         last_node = [edge for stage in route for edge in stage][-1].end
         for edge in route[-1]:
-            last_stage_time += edge.length / machine.speed
+            last_stage_time += travel_times[edge.id]
 
         possible_edges = []
         for neighbor in last_node.neighbors:
@@ -330,12 +369,12 @@ def squish_routes(machines, road_layout, Tmax):
 
         while possible_edges:
             shortest_edge = possible_edges.pop(0)
-            last_stage_time += shortest_edge.length / machine.speed
+            last_stage_time += travel_times[shortest_edge.id]
 
             if last_stage_time > Tmax:
                 break
 
             machine.route[-1].append(shortest_edge)
-            print('dodano element')
+            logger.debug('dodano element')
 
     return [machine.route for machine in machines]
@@ -1,11 +1,18 @@
+import os
+import queue
+import threading
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-from map_import import load_graph_from_file
+from map_import import load_graph_from_file, get_osm_graph_from_file, LayoutReport
 from solution import RoadClearingProblem, Machine
+from cooling import SCHEDULES
 from diagnostics import plot_diagnostic_charts
 from map_import import get_graph_of_city
+from events import QueueEventSink
+
+PROGRESS_POLL_MS = 100  # How often the GUI reads progress events of a running optimization
 
 class RoadClearingApp:
     def __init__(self, root):
@@ -150,6 +157,21 @@ class RoadClearingApp:
         self.cooling_rate_entry.grid(row=current_row, column=0, sticky="ew", pady=2)
         current_row += 1
 
+        self.schedule_label = ttk.Label(params_frame, text="Cooling schedule:")
+        self.schedule_label.grid(row=current_row, column=0, sticky="w", pady=2)
+        current_row += 1
+        self.schedule_combobox = ttk.Combobox(params_frame, values=list(SCHEDULES), state="readonly")
+        self.schedule_combobox.set("geometric")
+        self.schedule_combobox.grid(row=current_row, column=0, sticky="ew", pady=2)
+        current_row += 1
+
+        self.reheat_label = ttk.Label(params_frame, text="Reheat after N iterations without improvement:")
+        self.reheat_label.grid(row=current_row, column=0, sticky="w", pady=2)
+        current_row += 1
+        self.reheat_entry = ttk.Entry(params_frame)
+        self.reheat_entry.grid(row=current_row, column=0, sticky="ew", pady=2)
+        current_row += 1
+
         self.max_iterations_label = ttk.Label(params_frame, text="Maximum iterations:")
         self.max_iterations_label.grid(row=current_row, column=0, sticky="w", pady=2)
         current_row += 1
@@ -207,6 +229,28 @@ class RoadClearingApp:
         self.start_button = ttk.Button(left_frame, text="Start", command=self.run_optimization, style="Start.TButton")
         self.start_button.grid(row=6, column=0, sticky="ew", pady=15)
 
+        # Progress of a running optimization and Cancel button
+        self.progress_frame = ttk.LabelFrame(left_frame, text='Progress', padding=10)
+        self.progress_frame.grid(row=7, column=0, sticky="ew", pady=5)
+        self.progress_frame.grid_columnconfigure(0, weight=1)
+
+        self.progress_bar = ttk.Progressbar(self.progress_frame, mode="determinate")
+        self.progress_bar.grid(row=0, column=0, sticky="ew", pady=2)
+
+        self.progress_label = ttk.Label(self.progress_frame, text="Not running", justify="left")
+        self.progress_label.grid(row=1, column=0, sticky="w", pady=2)
+
+        self.cancel_button = ttk.Button(self.progress_frame, text="Cancel", command=self.cancel_optimization,
+                                        state="disabled")
+        self.cancel_button.grid(row=2, column=0, sticky="ew", pady=5)
+
+        # Optimization runs in a worker thread and reports progress through progress_queue (see poll_optimization)
+        self.optimization_thread = None
+        self.progress_queue = queue.Queue()
+        self.stop_event = threading.Event()
+        self.last_decision = None  # Last decision of the cooling schedule ("schedule" event)
+        self.termination_reason = None
+
         # Graph frame
         self.graph_frame = ttk.Frame(right_frame)
         self.graph_frame.grid(row=0, column=0, sticky="nsew")
@@ -279,13 +323,27 @@ class RoadClearingApp:
         ttk.Button(city_window, text="OK", command=set_city).pack(pady=10)
 
     def load_file(self):
-        file_path = filedialog.askopenfilename(filetypes=[("Text files", "*.txt")])
-        if file_path:
+        file_path = filedialog.askopenfilename(filetypes=[("Road layouts", "*.txt *.rcg *.osm *.graphml"),
+                                                           ("Text files", "*.txt"), ("Binary road networks", "*.rcg"),
+                                                           ("OSM extracts", "*.osm *.graphml")])
+        if file_path and os.path.splitext(file_path)[1].lower() in (".osm", ".graphml"):
+            try:
+                # Local OSM extract - the same roads as for the cities, converted once and cached on disk
+                self.road_graph = get_osm_graph_from_file(file_path, custom_roads=["tertiary", "residential"])
+                print("Graph loaded")
+                self.draw_graph()
+            except Exception as e:
+                messagebox.showerror("Error", f"Failed to load graph: {e}")
+        elif file_path:
             try:
-                self.road_graph = load_graph_from_file(file_path)
+                report = LayoutReport(file_path)
+                self.road_graph = load_graph_from_file(file_path, report=report)
                 print("Graph loaded")
                 self.draw_graph()
-                messagebox.showinfo("Success", "File loaded successfully!")
+                if report.invalid_lines:
+                    messagebox.showwarning("Invalid lines", f"File loaded, invalid lines were skipped:\n{report}")
+                else:
+                    messagebox.showinfo("Success", "File loaded successfully!")
             except Exception as e:
                 messagebox.showerror("Error", f"Failed to load graph: {e}")
 
@@ -321,6 +379,9 @@ class RoadClearingApp:
         self.machine_canvas.configure(scrollregion=self.machine_canvas.bbox("all"))
 
     def run_optimization(self):
+        if self.optimization_thread is not None:
+            return
+
         if not hasattr(self, 'road_graph') or self.road_graph is None:
             messagebox.showerror("Error", "First load a file with the street layout.")
             return
@@ -331,38 +392,127 @@ class RoadClearingApp:
             snowfall_forecast = list(map(int, self.snowfall_entry.get().strip('[]').split(',')))
             temperature = float(self.temperature_entry.get())
             cooling_rate = float(self.cooling_rate_entry.get())
+            reheat_after = int(self.reheat_entry.get()) if self.reheat_entry.get().strip() else None
+        except ValueError as e:
+            messagebox.showerror("Error", f"Invalid parameters: {e}")
+            return
 
-            machines = []
-            for frame, label, entry, remove_button in self.machine_list:
-                try:
-                    speed = float(entry.get())
-                    machines.append(Machine(speed=speed))
-                except ValueError:
-                    messagebox.showerror("Error", "Enter valid speed values for all machines.")
-                    return
-
-            selected_methods = [key for key, var in self.neighborhood_choices.items() if var.get()]
-            if not selected_methods:
-                messagebox.showerror("Error", "Select at least one neighborhood method.")
+        machines = []
+        for frame, label, entry, remove_button in self.machine_list:
+            try:
+                speed = float(entry.get())
+                machines.append(Machine(speed=speed))
+            except ValueError:
+                messagebox.showerror("Error", "Enter valid speed values for all machines.")
                 return
 
-            # Load neighborhood functions
-            neighborhood_functions = [self.neighborhood_methods[method] for method in selected_methods]
-
-            problem = RoadClearingProblem(snowfall_forecast, self.road_graph, machines, Tmax)
-            best_solution, best_danger, diagnostics = problem.simulated_annealing(
-                initial_temperature=temperature,
-                cooling_rate=cooling_rate,
-                max_iterations=max_iterations,
-                choose_neighbour_function=neighborhood_functions
-            )
+        selected_methods = [key for key, var in self.neighborhood_choices.items() if var.get()]
+        if not selected_methods:
+            messagebox.showerror("Error", "Select at least one neighborhood method.")
+            return
 
-            messagebox.showinfo("Optimization complete", f"Best danger level: {best_danger}")
+        # Load neighborhood functions
+        neighborhood_functions = [self.neighborhood_methods[method] for method in selected_methods]
 
-            self.visualize_solution(diagnostics, best_solution)
+        sa_parameters = {
+            "initial_temperature": temperature,
+            "cooling_rate": cooling_rate,
+            "max_iterations": max_iterations,
+            "choose_neighbour_function": neighborhood_functions,
+            "schedule": self.schedule_combobox.get(),
+            "schedule_options": {"reheat_after": reheat_after} if reheat_after is not None else {},
+        }
 
+        # The annealing runs in a worker thread so the window stays responsive; the thread never touches
+        # the widgets - it only puts events into progress_queue, which poll_optimization reads with root.after
+        self.progress_queue = queue.Queue()
+        self.stop_event = threading.Event()
+        self.last_decision = None  # Last decision of the cooling schedule ("schedule" event)
+        self.termination_reason = None
+        self.progress_bar.config(maximum=max_iterations, value=0)
+        self.progress_label.config(text="Generating initial routes...")
+        self.start_button.config(state="disabled")
+        self.cancel_button.config(state="normal")
+
+        self.optimization_thread = threading.Thread(
+            target=self.optimization_worker, args=(snowfall_forecast, machines, Tmax, sa_parameters), daemon=True)
+        self.optimization_thread.start()
+        self.root.after(PROGRESS_POLL_MS, self.poll_optimization)
+
+    def optimization_worker(self, snowfall_forecast, machines, Tmax, sa_parameters):
+        # Runs in the worker thread - reports progress, the result or the error through progress_queue
+        try:
+            # Progress is shown once per poll - more frequent iteration events would only fill the queue
+            event_sink = QueueEventSink(self.progress_queue, events=["iteration", "schedule", "termination"],
+                                        throttle={"iteration": PROGRESS_POLL_MS / 1000})
+            problem = RoadClearingProblem(snowfall_forecast, self.road_graph, machines, Tmax, event_sink=event_sink)
+            result = problem.simulated_annealing(**sa_parameters, stop_event=self.stop_event)
+            self.progress_queue.put(("finished", {'result': result}))
         except Exception as e:
-            messagebox.showerror("Error", f"Failed to run optimization: {e}")
+            self.progress_queue.put(("error", {'error': e}))
+
+    def cancel_optimization(self):
+        # The worker stops before its next iteration and returns the best solution found so far
+        self.stop_event.set()
+        self.cancel_button.config(state="disabled")
+        self.progress_label.config(text="Cancelling...")
+
+    def poll_optimization(self):
+        last_iteration = None
+        outcome = None
+        while True:
+            try:
+                event, fields = self.progress_queue.get_nowait()
+            except queue.Empty:
+                break
+            if event == "iteration":
+                last_iteration = fields
+            elif event == "schedule":
+                self.last_decision = fields
+            elif event == "termination":
+                self.termination_reason = fields['reason']
+            else:
+                outcome = (event, fields)
+
+        if last_iteration is not None and not self.stop_event.is_set():
+            iterations = last_iteration['iteration'] + 1
+            speed = iterations / last_iteration['elapsed'] if last_iteration['elapsed'] > 0 else 0
+            self.progress_bar.config(value=iterations)
+            decision = ""
+            if self.last_decision is not None:
+                decision = (f"\nSchedule: {self.last_decision['decision']} at iteration "
+                            f"{self.last_decision['iteration'] + 1} (T = {self.last_decision['temperature']:.3g})")
+            self.progress_label.config(
+                text=f"Iteration: {iterations}\n"
+                     f"Current danger: {last_iteration['current_danger']}\n"
+                     f"Best danger: {last_iteration['best_danger']}\n"
+                     f"Iterations/sec: {speed:.1f}{decision}")
+
+        if outcome is None:
+            self.root.after(PROGRESS_POLL_MS, self.poll_optimization)
+            return
+
+        self.optimization_thread = None
+        self.start_button.config(state="normal")
+        self.cancel_button.config(state="disabled")
+
+        event, fields = outcome
+        if event == "error":
+            self.progress_label.config(text="Failed")
+            messagebox.showerror("Error", f"Failed to run optimization: {fields['error']}")
+            return
+
+        best_solution, best_danger, diagnostics = fields['result']
+        status = "Optimization cancelled" if self.stop_event.is_set() else "Optimization complete"
+        reason = ""
+        if self.termination_reason and not self.stop_event.is_set():
+            reason = f" ({self.termination_reason.replace('_', ' ')})"
+        self.progress_label.config(
+            text=f"{status}{reason}\nIterations: {len(diagnostics[0]) - 1}\nBest danger: {best_danger}")
+
+        messagebox.showinfo(status, f"Best danger level: {best_danger}")
+
+        self.visualize_solution(diagnostics, best_solution)
 
     def show_previous_solution(self):
         if self.solutions and self.current_solution_index > 0:
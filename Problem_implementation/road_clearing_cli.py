@@ -0,0 +1,374 @@
+"""
+Headless runner of the road clearing optimization - no tkinter and no matplotlib, results go to files.
+
+A single run configured with flags:
+
+    python road_clearing_cli.py --layout ../Road_layouts/example1.txt --snowfall 3 4 5 6 --speeds 30 40 50 \\
+        --tmax 2 --temperature 100 --cooling-rate 0.99 --iterations 1000 --neighborhoods MK1 SK2 --output results
+
+Several runs from JSON/TOML config files, executed concurrently in worker processes:
+
+    python road_clearing_cli.py --config nightly.toml --workers 4 --output results
+
+Top-level keys of a config file are the settings of one run (see DEFAULTS). A file may also contain a "runs"
+list - then every element is a separate run and the top-level keys are shared defaults. Relative file paths
+are resolved against the directory of the config file. Flags given on the command line override config values.
+
+For every run the output directory receives <name>.json (best danger, routes, settings) and
+<name>_diagnostics.json (danger and temperature history, operator statistics, cooling schedule decisions); with
+"events" enabled also <name>_events.jsonl (see events.JsonLinesEventSink) and with checkpoints enabled
+<name>_checkpoint.npz, which can be continued with the "resume" setting. A summary of all runs is written to
+summary.json.
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cooling
+import data_structures
+from map_import import load_graph_from_file, get_graph_of_city, get_osm_graph_from_file, OSM_CACHE_DIR
+from solution import RoadClearingProblem, Machine
+from events import JsonLinesEventSink
+from binary_graph import is_binary_graph
+
+# Same names as the checkboxes of RoadClearingApp
+NEIGHBORHOODS = {"MK1": 0, "MK2": 1, "SK1": 2, "SK2": 3}
+
+GRAPH_CLASSES = {"graph": data_structures.Graph, "compact": data_structures.CompactGraph}
+
+DEFAULTS = {
+    "name": None,  # Name of the output files (default: derived from the config file / layout)
+    "layout": None,  # .txt street layout or binary .rcg network (binary_graph) ...
+    "city": None,  # ... or a city from map_import.get_graph_of_city (downloaded from OSM)
+    "dist": 800,  # Radius in meters of the OSM map section (only with "city")
+    "osm_file": None,  # Local .osm/.graphml extract used instead of downloading: with "city" - its section, alone - all
+    "osm_cache": None,  # Directory of converted OSM extracts (None - map_import.OSM_CACHE_DIR)
+    "graph": None,  # "graph" or "compact" (CompactGraph); None - "compact" for .rcg files, "graph" otherwise
+    "snowfall_forecast": [3, 4, 5, 6],
+    "machine_speeds": [30, 40, 50],
+    "Tmax": 2,  # In hours
+    "initial_temperature": 100,
+    "cooling_rate": 0.99,
+    "schedule": "geometric",  # Cooling schedule (see cooling.SCHEDULES) ...
+    "schedule_options": {},  # ... and its options, e.g. {"reheat_after": 500}
+    "max_iterations": 1000,
+    "neighborhoods": ["MK1", "MK2", "SK1", "SK2"],
+    "evaluation": "incremental",
+    "time_limit": None,  # In seconds
+    "batch_size": 1,
+    "seed": None,  # None -> random seed (recorded in the results)
+    "events": False,  # Write SA events to <name>_events.jsonl
+    "checkpoint_every": None,  # Write <name>_checkpoint.npz every N iterations ...
+    "checkpoint_interval": None,  # ... and/or every N seconds (see checkpoint.py)
+    "resume": None,  # Checkpoint file to continue from (the SA parameters are taken from the checkpoint)
+}
+
+
+# --- Configuration ---
+
+def read_config_file(path):
+    # Returns the list of run settings defined by a JSON or TOML config file
+    if path.endswith(".toml"):
+        try:
+            import tomllib
+        except ImportError:  # Python < 3.11
+            raise ValueError(f"{path}: TOML config files require Python 3.11 or newer")
+        with open(path, "rb") as file:
+            config = tomllib.load(file)
+    else:
+        with open(path, encoding="utf-8") as file:
+            config = json.load(file)
+
+    if not isinstance(config, dict):
+        raise ValueError(f"{path}: the config must be an object/table")
+
+    shared = {key: value for key, value in config.items() if key != "runs"}
+    if not all(isinstance(run, dict) for run in config.get("runs", [])):
+        raise ValueError(f"{path}: every element of 'runs' must be an object/table")
+    runs = [dict(shared, **run) for run in config["runs"]] if "runs" in config else [shared]
+
+    directory = os.path.dirname(os.path.abspath(path))
+    stem = os.path.splitext(os.path.basename(path))[0]
+    for index, run in enumerate(runs):
+        for key in ("layout", "resume", "osm_file", "osm_cache"):
+            if run.get(key) is not None:
+                run[key] = os.path.join(directory, run[key])
+        if run.get("name") is None:
+            run["name"] = stem if len(runs) == 1 else f"{stem}_{index}"
+    return runs
+
+
+def validate_settings(settings):
+    """
+    Completes the settings of one run with DEFAULTS and checks them.
+    Raises ValueError with a readable message for unknown keys and invalid values.
+    """
+    unknown = set(settings) - set(DEFAULTS)
+    if unknown:
+        raise ValueError(f"unknown settings: {', '.join(sorted(unknown))}")
+
+    settings = dict(DEFAULTS, **settings)
+    if (settings["layout"] is None) == (settings["city"] is None and settings["osm_file"] is None):
+        raise ValueError("exactly one of 'layout' and 'city'/'osm_file' must be given")
+    if settings["graph"] is not None and settings["graph"] not in GRAPH_CLASSES:
+        raise ValueError(f"'graph' must be one of: {', '.join(GRAPH_CLASSES)}")
+    if not settings["snowfall_forecast"] or not settings["machine_speeds"]:
+        raise ValueError("'snowfall_forecast' and 'machine_speeds' must not be empty")
+
+    neighborhoods = []
+    for neighborhood in settings["neighborhoods"]:
+        if neighborhood in NEIGHBORHOODS:
+            neighborhood = NEIGHBORHOODS[neighborhood]
+        if neighborhood not in NEIGHBORHOODS.values():
+            raise ValueError(f"unknown neighborhood {neighborhood!r} (use {', '.join(NEIGHBORHOODS)})")
+        neighborhoods.append(neighborhood)
+    if not neighborhoods:
+        raise ValueError("select at least one neighborhood method")
+    settings["neighborhoods"] = neighborhoods
+
+    if not isinstance(settings["schedule_options"], dict):
+        raise ValueError("'schedule_options' must be an object/table")
+    cooling.get_schedule(settings["schedule"], settings["initial_temperature"], settings["cooling_rate"],
+                         settings["max_iterations"], settings["schedule_options"])
+
+    if settings["name"] is None:
+        source = next(settings[key] for key in ("layout", "city", "osm_file") if settings[key] is not None)
+        settings["name"] = os.path.splitext(os.path.basename(source))[0]
+    if settings["seed"] is None:
+        # Drawn here, not in the worker - forked workers would share the state of the random generator
+        settings["seed"] = random.randrange(2 ** 32)
+    return settings
+
+
+def unique_names(runs):
+    # Runs with the same name would overwrite each other's files - number the repeated names
+    seen = {}
+    for run in runs:
+        name = run["name"]
+        if name in seen:
+            seen[name] += 1
+            run["name"] = f"{name}_{seen[name]}"
+        else:
+            seen[name] = 0
+    return runs
+
+
+# --- Running ---
+
+def load_road_layout(settings):
+    graph = settings["graph"]
+    if settings["layout"] is not None:
+        if graph is None:
+            # A memory-mapped .rcg file is shared by all worker processes - keep it as a CompactGraph
+            graph = "compact" if is_binary_graph(settings["layout"]) else "graph"
+        return load_graph_from_file(settings["layout"], graph_cls=GRAPH_CLASSES[graph])
+    graph_cls = GRAPH_CLASSES[graph or "graph"]
+    if settings["osm_file"] is None:
+        return get_graph_of_city(settings["city"], dist=settings["dist"], graph_cls=graph_cls)
+
+    cache_dir = settings["osm_cache"] or OSM_CACHE_DIR
+    if settings["city"] is None:
+        return get_osm_graph_from_file(settings["osm_file"], dist=settings["dist"], graph_cls=graph_cls,
+                                       cache_dir=cache_dir)
+    return get_graph_of_city(settings["city"], osm_file=settings["osm_file"], dist=settings["dist"],
+                             graph_cls=graph_cls, cache_dir=cache_dir)
+
+
+def run_optimization(settings, output_dir):
+    """
+    Runs simulated annealing for one validated configuration and writes its result files to 'output_dir'.
+    Executed in a worker process - returns a small summary dict.
+    """
+    start = time.perf_counter()
+    seed = settings["seed"]
+    name = settings["name"]
+
+    road_layout = load_road_layout(settings)
+    load_time = time.perf_counter() - start
+
+    event_sink = JsonLinesEventSink(os.path.join(output_dir, f"{name}_events.jsonl")) if settings["events"] else None
+
+    # The initial routes are random - seed before creating the problem
+    random.seed(seed)
+    machines = [Machine(speed) for speed in settings["machine_speeds"]]
+    checkpoint_path = None
+    if settings["checkpoint_every"] is not None or settings["checkpoint_interval"] is not None:
+        checkpoint_path = os.path.join(output_dir, f"{name}_checkpoint.npz")
+    try:
+        problem = RoadClearingProblem(settings["snowfall_forecast"], road_layout, machines, settings["Tmax"],
+                                      event_sink=event_sink)
+        if settings["resume"] is not None:
+            best_solution, best_danger, diagnostics = problem.resume_from(
+                settings["resume"], time_limit=settings["time_limit"], checkpoint_path=checkpoint_path,
+                checkpoint_every=settings["checkpoint_every"], checkpoint_interval=settings["checkpoint_interval"])
+        else:
+            best_solution, best_danger, diagnostics = problem.simulated_annealing(
+                settings["initial_temperature"], settings["cooling_rate"], settings["max_iterations"],
+                choose_neighbour_function=settings["neighborhoods"], evaluation=settings["evaluation"],
+                time_limit=settings["time_limit"], batch_size=settings["batch_size"], checkpoint_path=checkpoint_path,
+                checkpoint_every=settings["checkpoint_every"], checkpoint_interval=settings["checkpoint_interval"],
+                schedule=settings["schedule"], schedule_options=settings["schedule_options"])
+    finally:
+        if event_sink is not None:
+            event_sink.close()
+
+    elapsed = time.perf_counter() - start
+    summary = {
+        "name": name,
+        "best_danger": best_danger,
+        "iterations": len(diagnostics[0]) - 1,
+        "seed": seed,
+        "load_time": load_time,
+        "time": elapsed,
+    }
+
+    result = dict(summary, settings=settings,
+                  edges=len(road_layout.edges), vertices=len(road_layout.vertices),
+                  routes=data_structures.route_snapshot(best_solution),
+                  route_coordinates=[[[[(edge.start.x, edge.start.y), (edge.end.x, edge.end.y)] for edge in stage]
+                                      for stage in machine.route] for machine in best_solution])
+    with open(os.path.join(output_dir, f"{name}.json"), "w", encoding="utf-8") as file:
+        json.dump(result, file, indent=2)
+
+    danger, current_danger, temperature, operator_stats, schedule_decisions = diagnostics
+    with open(os.path.join(output_dir, f"{name}_diagnostics.json"), "w", encoding="utf-8") as file:
+        json.dump({"danger": danger, "current_danger": current_danger, "temperature": temperature,
+                   "operator_stats": operator_stats, "schedule_decisions": schedule_decisions}, file)
+
+    return summary
+
+
+def run_all(runs, output_dir, workers=None, log=None):
+    """
+    Runs all configurations, concurrently in 'workers' processes (None -> one per CPU core, 1 -> in this process).
+    A failing run does not stop the others - its summary contains 'error' instead of the results.
+
+    :return: list of summaries in the order of 'runs'
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(runs)))
+
+    def report(index, summary):
+        summaries[index] = summary
+        if log is not None:
+            log(format_summary(summary))
+
+    summaries = [None] * len(runs)
+    if workers == 1:
+        for index, settings in enumerate(runs):
+            try:
+                summary = run_optimization(settings, output_dir)
+            except Exception as e:  # Report the failure and continue with the next run
+                summary = {"name": settings["name"], "error": f"{type(e).__name__}: {e}"}
+            report(index, summary)
+        return summaries
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(run_optimization, settings, output_dir): index
+                   for index, settings in enumerate(runs)}
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                summary = future.result()
+            except Exception as e:
+                summary = {"name": runs[index]["name"], "error": f"{type(e).__name__}: {e}"}
+            report(index, summary)
+    return summaries
+
+
+def format_summary(summary):
+    if "error" in summary:
+        return f"{summary['name']:<24} ERROR {summary['error']}"
+    return (f"{summary['name']:<24} best danger {summary['best_danger']:<14} "
+            f"{summary['iterations']:>7} iterations {summary['time']:>9.2f} s  seed {summary['seed']}")
+
+
+# --- Command line ---
+
+def snowfall_value(text):
+    # Whole numbers stay int, as in the GUI (the incremental danger evaluation needs a whole-number forecast)
+    value = float(text)
+    return int(value) if value.is_integer() else value
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Road clearing optimization without the graphical interface")
+    parser.add_argument("--config", nargs="+", default=[], help="JSON or TOML config files (each may define many runs)")
+    parser.add_argument("--output", default="results", help="directory for the result files (default: results)")
+    parser.add_argument("--workers", type=int, help="number of worker processes (default: number of CPU cores)")
+
+    # Settings of a run - override the values from the config files
+    group = parser.add_argument_group("run settings (override config files)")
+    group.add_argument("--name", help="name of the output files")
+    group.add_argument("--layout", help=".txt street layout or binary .rcg network file")
+    group.add_argument("--city", help="city name for map_import.get_graph_of_city (downloaded from OSM unless --osm-file is given)")
+    group.add_argument("--dist", type=float, help="radius in meters of the OSM map section")
+    group.add_argument("--osm-file", dest="osm_file",
+                       help="local .osm/.graphml extract (no network access); with --city only the city section")
+    group.add_argument("--osm-cache", dest="osm_cache", help="directory of converted OSM extracts")
+    group.add_argument("--graph", choices=list(GRAPH_CLASSES), help="graph representation")
+    group.add_argument("--snowfall", dest="snowfall_forecast", type=snowfall_value, nargs="+",
+                       help="snowfall forecast")
+    group.add_argument("--speeds", dest="machine_speeds", type=float, nargs="+", help="machine speeds in km/h")
+    group.add_argument("--tmax", dest="Tmax", type=float, help="time between snowfalls in hours")
+    group.add_argument("--temperature", dest="initial_temperature", type=float)
+    group.add_argument("--cooling-rate", dest="cooling_rate", type=float)
+    group.add_argument("--schedule", choices=list(cooling.SCHEDULES), help="cooling schedule")
+    group.add_argument("--schedule-options", dest="schedule_options", type=json.loads,
+                       help='options of the cooling schedule as a JSON object, e.g. \'{"reheat_after": 500}\'')
+    group.add_argument("--iterations", dest="max_iterations", type=int)
+    group.add_argument("--neighborhoods", nargs="+", choices=list(NEIGHBORHOODS))
+    group.add_argument("--evaluation", choices=["incremental", "vectorized", "simulate"])
+    group.add_argument("--time-limit", dest="time_limit", type=float, help="wall-clock limit of a run in seconds")
+    group.add_argument("--batch-size", dest="batch_size", type=int,
+                       help="candidates evaluated together per step (with --evaluation vectorized); does not speed up "
+                            "runs dominated by generating neighbors")
+    group.add_argument("--seed", type=int)
+    group.add_argument("--events", action="store_const", const=True, help="write SA events to <name>_events.jsonl")
+    group.add_argument("--checkpoint-every", dest="checkpoint_every", type=int,
+                       help="write <name>_checkpoint.npz every N iterations")
+    group.add_argument("--checkpoint-interval", dest="checkpoint_interval", type=float,
+                       help="write <name>_checkpoint.npz every N seconds")
+    group.add_argument("--resume", help="continue the chain saved in a checkpoint file")
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    overrides = {key: value for key, value in vars(args).items()
+                 if key in DEFAULTS and value is not None}
+
+    try:
+        runs = []
+        for path in args.config:
+            runs += read_config_file(path)
+        if not runs:
+            runs = [{}]
+        if len(runs) > 1 and "name" in overrides:
+            raise ValueError("--name cannot be used with several runs")
+        runs = unique_names([validate_settings(dict(run, **overrides)) for run in runs])
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+
+    def log(line):
+        print(line, file=sys.stderr)
+
+    summaries = run_all(runs, args.output, args.workers, log)
+
+    with open(os.path.join(args.output, "summary.json"), "w", encoding="utf-8") as file:
+        json.dump(summaries, file, indent=2)
+
+    return 1 if any("error" in summary for summary in summaries) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,22 @@
+import copy
+import logging
 import math
+import time
+import multiprocessing
+import traceback
+from concurrent.futures import ProcessPoolExecutor
 import data_structures
+import checkpoint
+import cooling
+from danger_evaluation import IncrementalDangerEvaluator, VectorizedDangerEvaluator, is_integer_forecast
+from edge_usage import EdgeUsageIndex
+from events import get_event_sink
 from typing import List, Union
 from neighborhood_SK import *
 from neighborhood_MK import *
 
+logger = logging.getLogger(__name__)
+
 
 class Machine:
     def __init__(self, speed=30):
@@ -21,6 +34,7 @@ class Machine:
             consider_priority: Whether to consider road priorities in route selection
         """
         self.route = []
+        travel_times = road_layout.get_travel_times(self.speed)
 
         current_location = road_layout.baza
         previous_location = None
@@ -58,7 +72,7 @@ class Machine:
                     selected_edge = road_layout.get_edge(current_location, next_location)
 
                 # Calculate new time cost
-                new_time_cost = time_cost + selected_edge.calculate_length() / self.speed
+                new_time_cost = time_cost + travel_times[selected_edge.id]
 
                 # Check if adding this edge would exceed time limit
                 if new_time_cost >= Tmax:
@@ -77,102 +91,779 @@ class Machine:
             self.route.append(stage_route)
 
 
+# Neighborhood functions selected in generate_neighbor by their numbers
+OPERATOR_NAMES = {
+    0: "neighbor_function_1",
+    1: "neighbor_function_2",
+    2: "generate_route_from_least_frequent",
+    3: "change_path",
+}
+ALL_OPERATORS = 4  # choose_neighbour_function=[4] -> generate_neighbor chooses the function by the temperature
+NO_NEIGHBORHOOD_FUNCTION = ("No neighborhood function provided: {}. Available: 0, 1, 2, 3 -> specific neighborhood "
+                            "functions, 4 -> all of them simultaneously (e.g. [2] or [0, 2])")
+
+
+def neighbour_functions(choose_neighbour_function):
+    '''
+    Checks the neighborhood functions selected for the annealing once, before it starts.
+
+    :param choose_neighbour_function: None or list of numbers from OPERATOR_NAMES, or [4] - all functions
+    :return: list of the selected numbers ([4] if all functions are selected)
+    Raises ValueError for an empty list or unknown numbers.
+    '''
+    if choose_neighbour_function is None or set(choose_neighbour_function) == set(OPERATOR_NAMES):
+        return [ALL_OPERATORS]
+    functions = list(choose_neighbour_function)
+    if functions != [ALL_OPERATORS] and not (functions and all(f in OPERATOR_NAMES for f in functions)):
+        raise ValueError(NO_NEIGHBORHOOD_FUNCTION.format(functions))
+    return functions
+
+
+def new_operator_stats():
+    '''
+    Empty per-operator statistics: operator number -> dict with
+    calls, time (generation wall time [s]), eval_time (danger evaluation time [s]),
+    accepted, improving (accepted with lower danger) and improvement (total danger decrease of improving moves).
+    '''
+    return {operator: {'name': name, 'calls': 0, 'time': 0.0, 'eval_time': 0.0, 'accepted': 0, 'improving': 0,
+                       'improvement': 0}
+            for operator, name in OPERATOR_NAMES.items()}
+
+
+def merge_operator_stats(stats_list):
+    # Sums per-operator statistics of several runs (e.g. parallel chains or replicas)
+    merged = new_operator_stats()
+    for stats in stats_list:
+        for operator, operator_stats in stats.items():
+            for key, value in operator_stats.items():
+                if key != 'name':
+                    merged[operator][key] += value
+    return merged
+
+
+# How often (seconds) parallel_tempering checks whether a replica worker waited for is still alive
+REPLICA_POLL_INTERVAL = 0.5
+
+# State of a worker process used by RoadClearingProblem.parallel_simulated_annealing
+_chain_worker = {}
+
+
+def _init_chain_worker(road_layout, snowfall_forecast, speeds, Tmax):
+    _chain_worker.update(road_layout=road_layout, snowfall_forecast=snowfall_forecast, speeds=speeds, Tmax=Tmax)
+
+
+def _run_chain(seed, sa_parameters, deadline):
+    # Runs one simulated annealing chain in a worker process and returns its best routes as edge ids
+    start = time.time()
+    random.seed(seed)
+
+    problem = RoadClearingProblem(_chain_worker['snowfall_forecast'], _chain_worker['road_layout'],
+                                  [Machine(speed) for speed in _chain_worker['speeds']], _chain_worker['Tmax'])
+
+    time_limit = max(deadline - time.time(), 0) if deadline is not None else None
+    best_solution, best_danger, diagnostics = problem.simulated_annealing(**sa_parameters, time_limit=time_limit)
+
+    return {
+        'seed': seed,
+        'best_danger': best_danger,
+        'iterations': len(diagnostics[0]) - 1,
+        'time': time.time() - start,
+        'diagnostics': diagnostics,
+        'routes': data_structures.route_snapshot(best_solution),
+    }
+
+
+def _replica_worker(connection, road_layout, snowfall_forecast, speeds, Tmax, seed, choose_neighbour_function,
+                    evaluation):
+    '''
+    Worker process holding one replica of RoadClearingProblem.parallel_tempering.
+    Commands received through 'connection':
+    ('run', temperature, steps, deadline) -> runs Metropolis steps, replies (current_danger, accepted, steps)
+    ('best',) -> replies (best_danger, best routes as edge ids, operator statistics) and finishes
+    An exception is reported as ('error', traceback text) instead of the reply; the worker finishes when
+    the parent closes its end of the connection.
+    '''
+    try:
+        _replica_loop(connection, road_layout, snowfall_forecast, speeds, Tmax, seed, choose_neighbour_function,
+                      evaluation)
+    except EOFError:  # The parent closed the connection
+        pass
+    except Exception:
+        try:
+            connection.send(('error', traceback.format_exc()))
+        except OSError:
+            pass
+    finally:
+        connection.close()
+
+
+def _replica_loop(connection, road_layout, snowfall_forecast, speeds, Tmax, seed, choose_neighbour_function,
+                  evaluation):
+    random.seed(seed)
+    problem = RoadClearingProblem(snowfall_forecast, road_layout, [Machine(speed) for speed in speeds], Tmax)
+    choose_neighbour_function = neighbour_functions(choose_neighbour_function)
+
+    evaluate_danger = problem.get_danger_evaluator(evaluation)
+    current_danger = evaluate_danger()
+    best_danger = current_danger
+    best_solution = data_structures.route_snapshot(problem.machines)
+    changed_machines = set()
+
+    while True:
+        command = connection.recv()
+
+        if command[0] == 'run':
+            _, temperature, steps, deadline = command
+            accepted_steps = 0
+            steps_done = 0
+            while steps_done < steps and (deadline is None or time.time() < deadline):
+                new_danger, accepted, _ = problem.metropolis_step(temperature, choose_neighbour_function,
+                                                                  evaluate_danger, current_danger, changed_machines)
+                steps_done += 1
+                if accepted:
+                    accepted_steps += 1
+                    current_danger = new_danger
+                    if new_danger < best_danger:
+                        best_danger = new_danger
+                        best_solution = data_structures.route_snapshot(problem.machines)
+
+            connection.send((current_danger, accepted_steps, steps_done))
+
+        elif command[0] == 'best':
+            connection.send((best_danger, best_solution, problem.operator_stats))
+            return
+
+
+def _send_to_replica(connection, process, command):
+    try:
+        connection.send(command)
+    except OSError:  # The worker has already finished - report its error (if it sent one)
+        _receive_from_replica(connection, process)
+        raise RuntimeError(f"Replica process {process.pid} closed its connection")
+
+
+def _receive_from_replica(connection, process):
+    # Waits for the reply of a replica worker - raises RuntimeError if the worker failed or died
+    while not connection.poll(REPLICA_POLL_INTERVAL):
+        if not process.is_alive():
+            raise RuntimeError(f"Replica process {process.pid} exited with code {process.exitcode}")
+    try:
+        reply = connection.recv()
+    except (EOFError, OSError):
+        raise RuntimeError(f"Replica process {process.pid} closed its connection")
+    if reply[0] == 'error':
+        raise RuntimeError(f"Replica process {process.pid} failed:\n{reply[1]}")
+    return reply
+
+
 class RoadClearingProblem:
     def __init__(self,
                  snowfall_forecast: List[int],
-                 road_layout: data_structures.Graph,
+                 road_layout: Union[data_structures.Graph, data_structures.CompactGraph],
                  machines: List[Machine],
-                 Tmax: Union[int, float]):
+                 Tmax: Union[int, float],
+                 event_sink=None):
+        '''
+        :param event_sink: receiver of structured events (initial solution, SA iterations, termination) -
+                           None/"none", "logging" or a sink object from events.py (e.g. JsonLinesEventSink)
+        '''
 
         self.snowfall_forecast = snowfall_forecast
         self.road_layout = road_layout
         self.machines = machines
         self.danger = float("inf")
         self.Tmax = Tmax  # In hours
+        self.events = get_event_sink(event_sink)
+        self.operator_stats = new_operator_stats()
+        self.last_operator = None  # Number of the neighborhood function used by the last generate_neighbor call
 
         self.get_initial_path()
 
-        solutions = [machine.route for machine in self.machines]
+        # Street usage by the machines' routes (synchronised lazily, only for changed routes)
+        self.edge_usage = EdgeUsageIndex(road_layout, machines)
 
-        for route in solutions:
-            print(route, '\n')
+        if self.events.enabled:
+            self.events.emit("initial_solution", routes=data_structures.route_snapshot(self.machines))
 
     def get_initial_path(self):
         for machine in self.machines:
             machine.generate_initial_route(self.road_layout, self.Tmax, len(self.snowfall_forecast))
 
-    def simulated_annealing(self, initial_temperature, cooling_rate, max_iterations, choose_neighbour_function=None):
+    def get_danger_evaluator(self, evaluation="incremental"):
+        '''
+        Returns a function computing the danger of the current solution (self.machines).
+        The function takes an optional collection of indices of machines whose routes changed since the last call
+        (None -> unknown, everything is checked).
+        :param evaluation: 'simulate' -> full simulation with simulate_danger,
+                           'incremental' -> IncrementalDangerEvaluator (re-simulates only streets affected by a move)
+                           'vectorized' -> VectorizedDangerEvaluator (NumPy simulation of the whole solution)
+                           All methods return exactly the value of simulate_danger - for forecasts that are not
+                           whole numbers 'incremental' uses the vectorized evaluator, whose float sums match it
+                           (a warning is logged).
+        '''
+        exact_evaluation = self.exact_evaluation(evaluation)
+        if exact_evaluation != evaluation:
+            logger.warning("The snowfall forecast %s is not in whole numbers: the %s evaluation is replaced by "
+                           "the %s one, which is exact for it", self.snowfall_forecast, evaluation, exact_evaluation)
+        evaluation = exact_evaluation
+        if evaluation == "simulate":
+            return lambda changed_machines=None: self.simulate_danger()
+
+        if evaluation == "incremental":
+            evaluator = IncrementalDangerEvaluator(self.road_layout, self.snowfall_forecast)
+
+            def evaluate(changed_machines=None):
+                if changed_machines is None:
+                    return evaluator.sync(self.machines)
+                for machine_index in changed_machines:
+                    evaluator.update_machine(machine_index, self.machines[machine_index].route)
+                return evaluator.total_danger
+
+            return evaluate
+
+        if evaluation == "vectorized":
+            evaluator = VectorizedDangerEvaluator(self.road_layout, self.snowfall_forecast)
+            return lambda changed_machines=None: evaluator.evaluate(self.machines)
+
+        raise ValueError(f"Unknown evaluation method: {evaluation}")
+
+    def exact_evaluation(self, evaluation):
+        # The incremental running total is exact only for forecasts of whole numbers
+        if evaluation == "incremental" and not is_integer_forecast(self.snowfall_forecast):
+            return "vectorized"
+        return evaluation
+
+    def simulated_annealing(self, initial_temperature, cooling_rate, max_iterations, choose_neighbour_function=None,
+                            evaluation="incremental", time_limit=None, batch_size=1, stop_event=None,
+                            checkpoint_path=None, checkpoint_every=None, checkpoint_interval=None,
+                            schedule="geometric", schedule_options=None):
         # Calculate initial danger based on the current - initial solution
         '''
         :param initial_temperature:
         :param cooling_rate:
         :param max_iterations:
-        :return: best_solution, best_danger, diagnostics -> list containing 4 lists:
+        :param evaluation: danger evaluation method, see get_danger_evaluator
+        :param time_limit: optional wall-clock limit in seconds
+        :param batch_size: number of candidate neighbors generated from the current solution and evaluated together
+                           in each step (see speculative_steps); 1 -> classic sequential annealing. Batches are
+                           shortened where the schedule could reheat or adapt (see CoolingSchedule.preview).
+                           Only the evaluation is batched - with evaluation="vectorized" a batch costs about as much
+                           as one candidate. Candidates are still generated one by one, so batching does not speed up
+                           generation-bound runs (expensive neighborhood functions) and other evaluation methods
+                           only waste the candidates after an accepted one
+        :param stop_event: optional threading.Event - when set (e.g. by the GUI's Cancel button) the annealing
+                           stops before the next iteration and the best solution found so far is returned
+        :param checkpoint_path: optional file for checkpoints of the chain (see checkpoint.py), written in
+                                a background thread every 'checkpoint_every' iterations and/or
+                                'checkpoint_interval' seconds, and when the chain stops; see resume_from
+        :param schedule: name of the cooling schedule - "geometric" (temperature *= cooling_rate), "lundy_mees",
+                         "logarithmic" or "adaptive" (see cooling.py)
+        :param schedule_options: optional dict of schedule options, e.g. {'reheat_after': 500} - reheat when
+                                 the best danger has not improved for 500 iterations (see cooling.py)
+        :return: best_solution, best_danger, diagnostics -> list containing 5 elements:
                  first list -> history of generated dangers
                  second list -> history of best dangers
                  third list -> temperature history
+                 fourth element -> per-operator statistics of this run (see new_operator_stats)
+                 fifth list -> decisions of the cooling schedule (reheats, adaptive adjustments)
         '''
+        choose_neighbour_function = neighbour_functions(choose_neighbour_function)  # [4] - all functions
+
+        parameters = {
+            'initial_temperature': initial_temperature,
+            'cooling_rate': cooling_rate,
+            'max_iterations': max_iterations,
+            'choose_neighbour_function': list(choose_neighbour_function),
+            'evaluation': evaluation,
+            'batch_size': batch_size,
+            'schedule': schedule,
+            'schedule_options': dict(schedule_options or {}),
+        }
+        # Fails early for an unknown schedule or option
+        cooling.get_schedule(schedule, initial_temperature, cooling_rate, max_iterations, schedule_options)
+        self.operator_stats = new_operator_stats()
+        return self._anneal(parameters, None, time_limit, stop_event,
+                            checkpoint_path, checkpoint_every, checkpoint_interval)
+
+    def resume_from(self, path, time_limit=None, stop_event=None, checkpoint_path=None, checkpoint_every=None,
+                    checkpoint_interval=None):
+        '''
+        Continues a chain from a checkpoint written by simulated_annealing (with the same SA parameters).
+        The problem must have the same road layout, snowfall forecast, machine speeds and Tmax as the checkpointed
+        one; its current routes are replaced by the checkpointed ones. The random generator state is restored,
+        so the resumed chain makes exactly the same moves and decisions as the original chain would have made.
+
+        :param time_limit: optional wall-clock limit in seconds for the resumed part
+        :param checkpoint_path: file for further checkpoints (None -> 'path'); the intervals default to the
+                                checkpointed ones
+        :return: best_solution, best_danger, diagnostics - as simulated_annealing, for the whole chain
+        '''
+        state = checkpoint.load_checkpoint(path)
+        meta = state['meta']
+
+        problem = meta['problem']
+        if (problem['snowfall_forecast'] != list(self.snowfall_forecast)
+                or problem['machine_speeds'] != [machine.speed for machine in self.machines]
+                or problem['Tmax'] != self.Tmax
+                or problem['edges'] != len(self.road_layout.edges)
+                or problem['vertices'] != len(self.road_layout.vertices)):
+            raise ValueError(f"{path}: the checkpoint belongs to a different problem ({problem})")
+
+        self.operator_stats = {int(operator): stats for operator, stats in meta['operator_stats'].items()}
+        data_structures.restore_routes(self.machines, state['current_routes'], self.road_layout)
+        if state['usage'] is not None:
+            usage_routes, usage_order = state['usage']
+            edges = self.road_layout.edges
+            self.edge_usage.restore([[[edges[edge_id] for edge_id in stage] for stage in route]
+                                     for route in usage_routes], usage_order)
+
+        if meta['termination'] in ("low_temperature", "zero_danger", "max_iterations"):
+            # The chain has already finished - only its result is restored
+            data_structures.restore_routes(self.machines, state['best_routes'], self.road_layout)
+            decisions = meta.get('schedule_state', {}).get('decisions', [])
+            return self.machines, meta['best_danger'], state['history'] + [self.operator_stats, decisions]
+
+        random.setstate(state['random_state'])
+        return self._anneal(meta['parameters'], state, time_limit, stop_event,
+                            checkpoint_path if checkpoint_path is not None else path,
+                            checkpoint_every if checkpoint_every is not None else meta['checkpoint_every'],
+                            checkpoint_interval if checkpoint_interval is not None else meta['checkpoint_interval'])
+
+    def _anneal(self, parameters, state, time_limit, stop_event, checkpoint_path, checkpoint_every,
+                checkpoint_interval):
+        # Runs the chain (from the beginning if 'state' is None, otherwise from a loaded checkpoint)
+        checkpoints = None
+        if checkpoint_path is not None:
+            checkpoints = checkpoint.CheckpointWriter(checkpoint_path, checkpoint_every, checkpoint_interval,
+                                                      start_iteration=state['meta']['iteration'] if state else 0)
+        try:
+            return self._annealing_loop(parameters, state, time_limit, stop_event, checkpoints)
+        finally:
+            if checkpoints is not None:
+                checkpoints.close()  # Waits for the last checkpoint
+
+    def _checkpoint_state(self, parameters, checkpoints, iteration, schedule, current_danger, best_danger,
+                          best_solution, diagnostics, pending_steps, elapsed, termination=None):
+        meta = {
+            'iteration': iteration,  # Number of completed iterations
+            'temperature': schedule.temperature,
+            'schedule_state': schedule.state(),
+            'current_danger': current_danger,
+            'best_danger': best_danger,
+            'termination': termination,
+            'elapsed': elapsed,
+            # Speculative steps evaluated for the next iterations (an accepted one is already applied to the routes)
+            'pending_steps': [[new_danger, accepted, move.operator if move is not None else None]
+                              for new_danger, accepted, move in pending_steps],
+            'parameters': parameters,
+            'checkpoint_every': checkpoints.every,
+            'checkpoint_interval': checkpoints.interval,
+            'problem': {
+                'snowfall_forecast': list(self.snowfall_forecast),
+                'machine_speeds': [machine.speed for machine in self.machines],
+                'Tmax': self.Tmax,
+                'edges': len(self.road_layout.edges),
+                'vertices': len(self.road_layout.vertices),
+            },
+            'operator_stats': {operator: dict(stats) for operator, stats in self.operator_stats.items()},
+        }
+        return checkpoint.capture_state(meta, self.machines, best_solution, diagnostics[:3], self.edge_usage)
+
+    def _annealing_loop(self, parameters, state, time_limit, stop_event, checkpoints):
+        max_iterations = parameters['max_iterations']
+        choose_neighbour_function = parameters['choose_neighbour_function']
+        evaluation = parameters['evaluation']
+        batch_size = parameters['batch_size']
+
+        start_time = time.perf_counter()
+        deadline = time.time() + time_limit if time_limit is not None else None
+        events = self.events
+        telemetry = events.enabled  # Checked once per iteration - a disabled sink costs nothing more
+        evaluate_danger = self.get_danger_evaluator(evaluation)
+        if batch_size > 1:
+            if self.exact_evaluation(evaluation) != "vectorized":
+                logger.warning("batch_size=%d with the %s evaluation evaluates the candidates one by one and is "
+                               "slower than batch_size=1; use the vectorized evaluation", batch_size, evaluation)
+            evaluate_moves = self.get_moves_evaluator(evaluation, evaluate_danger)
+        # Checkpoints written before cooling schedules existed have no schedule - they used the geometric one
+        schedule = cooling.get_schedule(parameters.get('schedule', "geometric"), parameters['initial_temperature'],
+                                        parameters['cooling_rate'], max_iterations,
+                                        parameters.get('schedule_options'))
+
+        if state is None:
+            current_danger = evaluate_danger()
+            best_danger = current_danger
+
+            temperature = schedule.temperature
+
+            diagnostics = [[best_danger], [best_danger], [temperature], self.operator_stats, schedule.decisions]
+
+            # Best solution is stored as a lightweight snapshot of edge ids
+            best_solution = data_structures.route_snapshot(self.machines)
+            start_iteration = 0
+            previous_elapsed = 0.0
+        else:
+            meta = state['meta']
+            evaluate_danger()  # Brings the evaluator up to date with the restored routes
+            current_danger = meta['current_danger']
+            best_danger = meta['best_danger']
+            if 'schedule_state' in meta:
+                schedule.restore(meta['schedule_state'])
+            schedule.temperature = temperature = meta['temperature']
+            diagnostics = state['history'] + [self.operator_stats, schedule.decisions]
+            best_solution = state['best_routes']
+            start_iteration = meta['iteration']
+            previous_elapsed = meta['elapsed']
+
+        changed_machines = set()  # Machines whose routes changed (by a move or a rollback) since the last evaluation
+        pending_steps = []  # Already evaluated speculative steps for the next iterations
+        if state is not None:
+            # Only the operator of a restored step is used (telemetry) - the move itself is not needed any more
+            pending_steps = [(new_danger, accepted, data_structures.Move(None, [], [], operator))
+                             for new_danger, accepted, operator in state['meta']['pending_steps']]
+
+        termination = "max_iterations"
+        for iteration in range(start_iteration, max_iterations):
+            if stop_event is not None and stop_event.is_set():
+                termination = "cancelled"
+                break
 
-        current_danger = self.simulate_danger()
-        best_danger = current_danger
-
-        temperature = initial_temperature
-
-        diagnostics = [[best_danger], [best_danger], [temperature]]
-
-        actual_solution = copy.deepcopy(self.machines)  # current solution
-        best_solution = copy.deepcopy(self.machines)
-
-        if choose_neighbour_function is None or set(choose_neighbour_function) == {0, 1, 2, 3}:  # use all neighborhood functions simultaneously
-            choose_neighbour_function = [4]
-
-        for iteration in range(max_iterations):
-            print("\n")
-            print("-----ITERATION ", iteration, "-------")
-
-            # Generate neighboring solution
-            self.generate_neighbor(temperature, choose_neighbour_function)
-
-            # Simulate new solution and calculate danger
-            new_danger = self.simulate_danger()
-            print("NEW DANGER -> ", new_danger)
+            if telemetry:
+                step_start = time.perf_counter()
 
-            # Calculate danger difference
+            # Generate neighboring solution, evaluate it and accept or revert it
+            if not pending_steps:
+                if batch_size > 1:
+                    temperatures = schedule.preview(iteration, min(batch_size, max_iterations - iteration))
+                    pending_steps = self.speculative_steps(temperatures, choose_neighbour_function, evaluate_moves,
+                                                           current_danger, changed_machines)
+                else:
+                    pending_steps = [self.metropolis_step(temperature, choose_neighbour_function,
+                                                          evaluate_danger, current_danger, changed_machines)]
+            new_danger, accepted, move = pending_steps.pop(0)
             delta_danger = new_danger - current_danger
-            print("Danger difference: ", delta_danger)
+            improved = accepted and new_danger < best_danger
 
-            # Accept solution based on Boltzmann function
-            if delta_danger < 0 or random.random() < math.exp(-delta_danger / temperature):
-                actual_solution = copy.deepcopy(self.machines)
+            if accepted:
                 current_danger = new_danger
 
                 # Update best solution
-                if new_danger < best_danger:
-                    best_solution = copy.deepcopy(actual_solution)
+                if improved:
+                    best_solution = data_structures.route_snapshot(self.machines)
                     best_danger = new_danger
 
-            else:
-                # Otherwise, revert to the current solution
-                self.machines = actual_solution
+            if telemetry:
+                now = time.perf_counter()
+                events.emit("iteration", iteration=iteration, danger=new_danger, delta=delta_danger,
+                            accepted=accepted, operator=move.operator if move is not None else None,
+                            temperature=temperature, current_danger=current_danger, best_danger=best_danger,
+                            step_time=now - step_start, elapsed=now - start_time)
 
-                # Cool down temperature
-            temperature *= cooling_rate
+            # Cool down (or reheat) temperature
+            decisions = len(schedule.decisions)
+            temperature = schedule.update(iteration, accepted, improved)
+            if telemetry and len(schedule.decisions) > decisions:
+                for decision in schedule.decisions[decisions:]:
+                    events.emit("schedule", **decision)
 
             diagnostics[0].append(new_danger)
             diagnostics[1].append(current_danger)
             diagnostics[2].append(temperature)
 
             # Termination condition
-            if temperature < 1e-3:
-                print("Termination due to low temperature!")
+            if schedule.frozen():
+                termination = "low_temperature"
                 break
 
             if best_danger == 0:
-                print("Termination by zeroing the objective function")
+                termination = "zero_danger"
+                break
+
+            if deadline is not None and time.time() >= deadline:
+                termination = "time_limit"
                 break
 
-        self.machines = best_solution
-        return best_solution, best_danger, diagnostics
+            if checkpoints is not None and checkpoints.due(iteration + 1):
+                checkpoints.submit(self._checkpoint_state(
+                    parameters, checkpoints, iteration + 1, schedule, current_danger, best_danger, best_solution,
+                    diagnostics, pending_steps, previous_elapsed + time.perf_counter() - start_time))
+
+        if checkpoints is not None:
+            checkpoints.submit(self._checkpoint_state(
+                parameters, checkpoints, len(diagnostics[0]) - 1, schedule, current_danger, best_danger,
+                best_solution, diagnostics, pending_steps, previous_elapsed + time.perf_counter() - start_time,
+                termination))
+
+        if telemetry:
+            events.emit("termination", reason=termination, iterations=len(diagnostics[0]) - 1,
+                        best_danger=best_danger, temperature=temperature, elapsed=time.perf_counter() - start_time)
+
+        data_structures.restore_routes(self.machines, best_solution, self.road_layout)
+        return self.machines, best_danger, diagnostics
+
+    def metropolis_step(self, temperature, choose_neighbour_function, evaluate_danger, current_danger,
+                        changed_machines):
+        '''
+        Performs one step of the chain at the given temperature: generates a neighbor, evaluates it and accepts it
+        based on the Boltzmann function, or reverts it.
+
+        :param evaluate_danger: function returned by get_danger_evaluator
+        :param current_danger: danger of the current solution
+        :param changed_machines: set of machines changed since the last evaluation - updated in place
+                                 (a reverted move leaves its machine there for the next evaluation)
+        :return: new_danger, accepted, move
+        '''
+        move = self.generate_neighbor(temperature, choose_neighbour_function)
+        stats = self.operator_stats[self.last_operator]
+
+        # Simulate new solution and calculate danger
+        if move is not None:
+            changed_machines.add(move.machine_index)
+        eval_start = time.perf_counter()
+        new_danger = evaluate_danger(changed_machines)
+        stats['eval_time'] += time.perf_counter() - eval_start
+        changed_machines.clear()
+
+        # Accept solution based on Boltzmann function
+        delta_danger = new_danger - current_danger
+        if delta_danger < 0 or random.random() < math.exp(-delta_danger / temperature):
+            self.record_acceptance(stats, delta_danger)
+            return new_danger, True, move
+
+        # Otherwise, revert to the current solution
+        if move is not None:
+            move.undo(self.machines)
+            changed_machines.add(move.machine_index)
+        return new_danger, False, move
+
+    @staticmethod
+    def record_acceptance(stats, delta_danger):
+        # Updates operator statistics after accepting a move changing the danger by 'delta_danger'
+        stats['accepted'] += 1
+        if delta_danger < 0:
+            stats['improving'] += 1
+            stats['improvement'] -= delta_danger
+
+    def get_moves_evaluator(self, evaluation, evaluate_danger):
+        '''
+        Returns a function evaluating a list of alternative moves from the current solution:
+        function(moves, changed_machines) -> list of dangers (one per move).
+        The 'vectorized' method evaluates all moves in one NumPy call (with an integer forecast only the streets
+        changed by each move are simulated again), other methods apply, evaluate and undo the moves one by one.
+        '''
+        if self.exact_evaluation(evaluation) == "vectorized":
+            evaluator = VectorizedDangerEvaluator(self.road_layout, self.snowfall_forecast)
+            return lambda moves, changed_machines: evaluator.evaluate_moves(self.machines, moves)
+
+        def evaluate_moves(moves, changed_machines):
+            dangers = []
+            for move in moves:
+                if move is not None:
+                    move.apply(self.machines)
+                    changed_machines.add(move.machine_index)
+                dangers.append(evaluate_danger(changed_machines))
+                changed_machines.clear()
+                if move is not None:
+                    move.undo(self.machines)
+                    changed_machines.add(move.machine_index)
+            return dangers
+
+        return evaluate_moves
+
+    def speculative_steps(self, temperatures, choose_neighbour_function, evaluate_moves, current_danger,
+                          changed_machines):
+        '''
+        Generates one candidate neighbor of the current solution for each of the next iterations (with
+        the temperatures of these iterations), evaluates all of them at once and applies the Boltzmann test to them
+        in order. The first accepted candidate is committed; the remaining ones are discarded.
+
+        Since rejected moves leave the solution unchanged, the consumed steps are distributed exactly like
+        the steps of sequential annealing - only the candidates after the accepted one are wasted.
+        The candidates are generated sequentially, so this pays off only when the evaluation dominates.
+
+        :param temperatures: temperatures of the next iterations
+        :param evaluate_moves: function returned by get_moves_evaluator
+        :return: list of consumed steps (new_danger, accepted, move) - all rejected except possibly the last one
+        '''
+        moves = []
+        operators = []
+        for temperature in temperatures:
+            move = self.generate_neighbor(temperature, choose_neighbour_function)
+            if move is not None:
+                move.undo(self.machines)  # Every candidate starts from the current solution
+            moves.append(move)
+            operators.append(self.last_operator)
+
+        eval_start = time.perf_counter()
+        dangers = evaluate_moves(moves, changed_machines)
+        eval_time = (time.perf_counter() - eval_start) / len(moves)  # Shared equally by all candidates
+        for operator in operators:
+            self.operator_stats[operator]['eval_time'] += eval_time
+
+        steps = []
+        for temperature, move, operator, new_danger in zip(temperatures, moves, operators, dangers):
+            delta_danger = new_danger - current_danger
+            if delta_danger < 0 or random.random() < math.exp(-delta_danger / temperature):
+                if move is not None:
+                    move.apply(self.machines)
+                    changed_machines.add(move.machine_index)
+                self.record_acceptance(self.operator_stats[operator], delta_danger)
+                steps.append((new_danger, True, move))
+                break
+            steps.append((new_danger, False, move))
+
+        return steps
+
+    def parallel_simulated_annealing(self, n_chains, workers, initial_temperature, cooling_rate, max_iterations,
+                                     choose_neighbour_function=None, evaluation="incremental", time_limit=None,
+                                     seed=None, schedule="geometric", schedule_options=None):
+        '''
+        Runs 'n_chains' independent simulated annealing chains in a pool of 'workers' processes.
+        Every chain has its own random seed and therefore its own initial routes (Machine.generate_initial_route).
+        The road layout is sent to each worker process only once (pool initializer), not with every task.
+
+        :param n_chains: number of independent chains
+        :param workers: number of worker processes
+        :param time_limit: optional global wall-clock budget in seconds for all chains
+        :param seed: base seed used to draw chain seeds (None -> random)
+        :param schedule, schedule_options: cooling schedule of every chain (see simulated_annealing)
+        :return: best_solution, best_danger, chains -> list of dicts (one per chain) with keys:
+                 'seed', 'best_danger', 'iterations', 'time', 'diagnostics'
+        '''
+        deadline = time.time() + time_limit if time_limit is not None else None
+        seed_generator = random.Random(seed)
+        seeds = [seed_generator.randrange(2 ** 32) for _ in range(n_chains)]
+        speeds = [machine.speed for machine in self.machines]
+        sa_parameters = {
+            'initial_temperature': initial_temperature,
+            'cooling_rate': cooling_rate,
+            'max_iterations': max_iterations,
+            'choose_neighbour_function': neighbour_functions(choose_neighbour_function),
+            'evaluation': evaluation,
+            'schedule': schedule,
+            'schedule_options': schedule_options,
+        }
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_chain_worker,
+                                 initargs=(self.road_layout, self.snowfall_forecast, speeds, self.Tmax)) as executor:
+            chains = list(executor.map(_run_chain, seeds, [sa_parameters] * n_chains, [deadline] * n_chains))
+
+        best_chain = min(chains, key=lambda chain: chain['best_danger'])
+        data_structures.restore_routes(self.machines, best_chain.pop('routes'), self.road_layout)
+        for chain in chains:
+            chain.pop('routes', None)
+
+        return self.machines, best_chain['best_danger'], chains
+
+    def parallel_tempering(self, n_replicas, min_temperature, max_temperature, n_rounds, steps_per_round,
+                           choose_neighbour_function=None, evaluation="incremental", time_limit=None, seed=None):
+        '''
+        Replica exchange (parallel tempering). 'n_replicas' chains, each in its own worker process, run at
+        a geometric ladder of temperatures between 'min_temperature' and 'max_temperature'. After every round of
+        'steps_per_round' Metropolis steps, neighbouring temperatures try to exchange their states with probability
+        min(1, exp((E_i - E_j) * (1 / T_i - 1 / T_j))). Instead of sending the routes between processes,
+        the replicas exchange their temperatures, which is equivalent.
+
+        Even pairs (0-1, 2-3, ...) are tried in even rounds and odd pairs in odd rounds.
+
+        :param time_limit: optional wall-clock budget in seconds
+        :param seed: seed of replica seeds and exchange decisions (None -> random)
+        :return: best_solution, best_danger, diagnostics -> dict with keys:
+                 'temperatures' -> temperature ladder
+                 'swap_attempts', 'swap_accepted', 'swap_acceptance_rate' -> lists, one value per pair of
+                 neighbouring temperatures (i, i + 1)
+                 'danger_history' -> list (per round) of current dangers at each temperature
+                 'acceptance_rate' -> Metropolis acceptance rate at each temperature
+                 'operator_stats' -> per-operator statistics summed over all replicas (see new_operator_stats)
+        Raises RuntimeError (with the worker's traceback, if it could send one) when a replica process fails or dies.
+        '''
+        choose_neighbour_function = neighbour_functions(choose_neighbour_function)
+        deadline = time.time() + time_limit if time_limit is not None else None
+        rng = random.Random(seed)
+
+        if n_replicas > 1:
+            ratio = (max_temperature / min_temperature) ** (1 / (n_replicas - 1))
+            temperatures = [min_temperature * ratio ** i for i in range(n_replicas)]
+        else:
+            temperatures = [min_temperature]
+
+        speeds = [machine.speed for machine in self.machines]
+        connections, processes = [], []
+        for _ in range(n_replicas):
+            parent_connection, child_connection = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=_replica_worker,
+                args=(child_connection, self.road_layout, self.snowfall_forecast, speeds, self.Tmax,
+                      rng.randrange(2 ** 32), choose_neighbour_function, evaluation),
+                daemon=True
+            )
+            process.start()
+            child_connection.close()  # Only the worker keeps this end - recv sees EOF if the worker dies
+            connections.append(parent_connection)
+            processes.append(process)
+
+        replica_at = list(range(n_replicas))  # replica_at[k] -> replica currently running at temperatures[k]
+        swap_attempts = [0] * (n_replicas - 1)
+        swap_accepted = [0] * (n_replicas - 1)
+        steps_done = [0] * n_replicas
+        steps_accepted = [0] * n_replicas
+        danger_history = []
+        results = []
+
+        try:
+            for round_index in range(n_rounds):
+                for k, replica in enumerate(replica_at):
+                    _send_to_replica(connections[replica], processes[replica],
+                                     ('run', temperatures[k], steps_per_round, deadline))
+
+                dangers = []
+                for k, replica in enumerate(replica_at):
+                    danger, accepted, steps = _receive_from_replica(connections[replica], processes[replica])
+                    dangers.append(danger)
+                    steps_accepted[k] += accepted
+                    steps_done[k] += steps
+                danger_history.append(dangers)
+
+                # Exchange states between neighbouring temperatures (Metropolis criterion)
+                for k in range(round_index % 2, n_replicas - 1, 2):
+                    swap_attempts[k] += 1
+                    exponent = (dangers[k] - dangers[k + 1]) * (1 / temperatures[k] - 1 / temperatures[k + 1])
+                    if exponent >= 0 or rng.random() < math.exp(exponent):
+                        swap_accepted[k] += 1
+                        replica_at[k], replica_at[k + 1] = replica_at[k + 1], replica_at[k]
+
+                if deadline is not None and time.time() >= deadline:
+                    break
+
+            for connection, process in zip(connections, processes):
+                _send_to_replica(connection, process, ('best',))
+                results.append(_receive_from_replica(connection, process))
+        finally:
+            for connection in connections:
+                connection.close()
+            for process in processes:
+                # After a failure the other workers may still be waiting for commands (forked siblings keep
+                # copies of the parent's connection ends, so they do not see EOF) - they are terminated
+                process.join(timeout=5 if len(results) == n_replicas else 0)
+                if process.is_alive():
+                    process.terminate()
+                    process.join()
+
+        best_danger, best_solution, _ = min(results, key=lambda result: result[0])
+        data_structures.restore_routes(self.machines, best_solution, self.road_layout)
+
+        diagnostics = {
+            'temperatures': temperatures,
+            'swap_attempts': swap_attempts,
+            'swap_accepted': swap_accepted,
+            'swap_acceptance_rate': [accepted / attempts if attempts else 0.0
+                                     for accepted, attempts in zip(swap_accepted, swap_attempts)],
+            'danger_history': danger_history,
+            'acceptance_rate': [accepted / steps if steps else 0.0
+                                for accepted, steps in zip(steps_accepted, steps_done)],
+            'operator_stats': merge_operator_stats(result[2] for result in results),
+        }
+        return self.machines, best_danger, diagnostics
 
     def simulate_danger(self):
         """
@@ -209,6 +900,7 @@ class RoadClearingProblem:
     def generate_neighbor(self, actual_temperature, choose_neighbour_function):
         """
         Generates a new solution by using specific neighborhood functions.
+        :return: Move describing the change of the solution (None if nothing changed)
         """
         graph_complexity = len(self.road_layout.edges)  # Number of edges/roads in the graph - describes complexity
 
@@ -277,61 +969,53 @@ class RoadClearingProblem:
                 choose_f = f_using[0]
 
             else:
-                print(
-                    '''No neighborhood function provided!
-                    Available:
-                    0, 1, 2, 3 -> specific neighborhood functions
-                    4 -> use all neighborhood functions simultaneously
-
-                    Input format:
-                    For single choice -> e.g., [2]
-                    For multiple choices -> e.g., [0, 2]
-                    '''
-                )
+                raise ValueError(NO_NEIGHBORHOOD_FUNCTION.format(f_using))
 
         else:
             f_codes = [0, 1, 2, 3]
-            if all(elem in f_codes for elem in f_using):
+            if f_using and all(elem in f_codes for elem in f_using):
                 choose_f = random.choice(f_using)
 
             else:
-                print(
-                    '''No neighborhood function provided!
-                    Available:
-                    0, 1, 2, 3 -> specific neighborhood functions
-                    4 -> use all neighborhood functions simultaneously
-
-                    Input format:
-                    For single choice -> e.g., [2]
-                    For multiple choices -> e.g., [0, 2]
-                    '''
-                )
-        print(choose_f)
+                raise ValueError(NO_NEIGHBORHOOD_FUNCTION.format(f_using))
         # --- Used neighborhood functions ---
 
+        stats = self.operator_stats[choose_f]
+        self.last_operator = choose_f
+        operator_start = time.perf_counter()
+
         if choose_f == 0:  # modify_route_avoiding_vertex
-            neighbor_function_1(self.machines, search_depth, self.road_layout, self.Tmax)
+            move = neighbor_function_1(self.machines, search_depth, self.road_layout, self.Tmax)
             '''
             Modifies the existing route of a machine by avoiding one vertex, depending on the 'search_depth' parameter
             (the higher the parameter, the more diverse the new solution).
             '''
 
         elif choose_f == 1:  # reconstruct_route_from_stage
-            neighbor_function_2(self.machines, self.road_layout, self.Tmax, param2)
+            move = neighbor_function_2(self.machines, self.road_layout, self.Tmax, param2)
             '''
             Reconstructs the route from a randomly selected stage, with the possibility of significant changes if early stages are selected.
             '''
 
         elif choose_f == 2:
-            generate_route_from_least_frequent(self.machines, self.road_layout, self.Tmax)
+            self.edge_usage.sync(self.machines)
+            move = generate_route_from_least_frequent(self.machines, self.road_layout, self.Tmax,
+                                                      usage_index=self.edge_usage)
             '''
             Generates a route from the base to the least frequented street and optionally adds streets to fill the time.
             Possibility of introducing larger changes.
             '''
 
         elif choose_f == 3:
-            change_path(self.machines, self.road_layout, self.Tmax)
+            move = change_path(self.machines, self.road_layout, self.Tmax)
             '''
             Modifies the machine's route by removing one edge and replacing it with a new route repaired by the A* algorithm.
             Moves edges to the next stage if Tmax is exceeded.
             '''
+
+        stats['calls'] += 1
+        stats['time'] += time.perf_counter() - operator_start
+
+        if move is not None:
+            move.operator = choose_f
+        return move
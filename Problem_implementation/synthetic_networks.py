@@ -0,0 +1,357 @@
+"""
+Generator of synthetic road networks for load testing.
+
+Three topologies are available (see TOPOLOGIES):
+- grid - Manhattan-like city: a jittered grid with arterial rows/columns and some residential streets removed
+- geometric - random geometric graph: uniformly scattered intersections joined to their nearest neighbours
+- ring_radial - concentric ring roads joined by radial streets, denser with the distance from the centre
+
+Every topology is a generator of street records (punkt1, punkt2, priorytet, pasy) - the same records as consumed by
+Graph.from_edge_records and written in the .txt layout format - produced in a streaming way, so networks with
+millions of edges can be written to a file without keeping them in memory. Coordinates are planar
+(true_location=False), with blocks of about GRID_SPACING units, like in Road_layouts/example*.txt.
+
+Street classes follow OSM 'highway' values and priorities are computed with map_import.calculate_priority,
+so the priority mix (and its dependence on the distance from the centre) resembles the OSM networks.
+
+Usage:
+    python synthetic_networks.py grid 1000000 city.txt --seed 1 --base center
+"""
+
+import argparse
+import math
+import os
+import random
+import tempfile
+
+import numpy as np
+
+from data_structures import Graph, CompactGraph
+from map_import import calculate_priority
+
+GRID_SPACING = 5  # Typical distance between neighbouring intersections
+
+# Possible numbers of lanes for every street class
+HIGHWAY_LANES = {
+    "motorway": (2, 3, 3),
+    "trunk": (2, 2, 3),
+    "primary": (2, 2, 3),
+    "secondary": (1, 2, 2),
+    "tertiary": (1, 1, 2),
+    "residential": (1,),
+    "service": (1,),
+}
+
+
+class _StreetFactory:
+    # Turns (start, end, street class) into a record with priority and lanes, like map_import does for OSM edges
+
+    def __init__(self, rng, extent):
+        min_x, min_y, max_x, max_y = extent
+        self.rng = rng
+        self.center_x = (min_x + max_x) / 2
+        self.center_y = (min_y + max_y) / 2
+        self.max_distance = max(math.hypot(max_x - min_x, max_y - min_y) / 2, 1e-9)
+
+    def __call__(self, start, end, highway):
+        lanes = self.rng.choice(HIGHWAY_LANES[highway])
+        priority = calculate_priority({"highway": highway}, start[0], start[1], end[0], end[1],
+                                      self.center_x, self.center_y, self.max_distance)
+        return start, end, priority, lanes
+
+
+def _point(x, y):
+    return round(x, 3), round(y, 3)
+
+
+# --- Topologies ---
+
+def grid_streets(num_edges, seed=0, spacing=GRID_SPACING, jitter=0.15, removal=0.1, service=0.05):
+    """
+    Jittered square grid. Every 8th row/column is a primary road, every other 4th a secondary one,
+    the rest are residential streets - of which a 'removal' fraction is dropped (dead ends and T-junctions)
+    and a 'service' fraction is marked as service roads.
+
+    :param num_edges: approximate number of directed edges of the graph (two per street)
+    :return: (extent (min_x, min_y, max_x, max_y), generator of street records)
+    """
+    rng = random.Random(seed)
+
+    # A side x side grid has 2 * side * (side - 1) streets, some residential ones are removed
+    side = 2
+    while 4 * side * (side - 1) * (1 - removal * 0.6) < num_edges:
+        side += 1
+    extent = (0, 0, (side - 1) * spacing, (side - 1) * spacing)
+
+    def line_class(index):
+        if index % 8 == 0:
+            return "primary"
+        if index % 4 == 0:
+            return "secondary"
+        return "residential"
+
+    def jittered_row(row):
+        return [_point((column + rng.uniform(-jitter, jitter)) * spacing,
+                       (row + rng.uniform(-jitter, jitter)) * spacing) for column in range(side)]
+
+    def streets():
+        street = _StreetFactory(rng, extent)
+        current = jittered_row(0)
+        for row in range(side):
+            following = jittered_row(row + 1) if row + 1 < side else None
+            for column in range(side):
+                links = []
+                if column + 1 < side:
+                    links.append((current[column + 1], line_class(row)))  # Along the row
+                if following is not None:
+                    links.append((following[column], line_class(column)))  # Along the column
+
+                for end, highway in links:
+                    if highway == "residential":
+                        draw = rng.random()
+                        if draw < removal:
+                            continue
+                        if draw < removal + service:
+                            highway = "service"
+                    yield street(current[column], end, highway)
+            current = following
+
+    return extent, streets()
+
+
+def geometric_streets(num_edges, seed=0, spacing=GRID_SPACING, max_degree=4):
+    """
+    Random geometric graph. Intersections are scattered uniformly (cell by cell, row by row), and each new
+    intersection is joined to 1-2 nearest earlier intersections within 2 * spacing whose degree is below
+    'max_degree'. An intersection without such neighbours is joined to the nearest earlier intersection nearby
+    (or the previous one), so the network is connected. Only two rows of cells are kept in memory.
+
+    :param num_edges: approximate number of directed edges of the graph (two per street)
+    :return: (extent, generator of street records)
+    """
+    rng = random.Random(seed)
+
+    # About 1.6 streets per intersection
+    num_vertices = max(int(num_edges / 3.2), 2)
+    radius = 2 * spacing
+    cells = max(int(math.ceil(math.sqrt(num_vertices) * spacing / radius)), 1)
+    size = cells * radius
+    points_per_cell = num_vertices / cells ** 2
+    extent = (0, 0, size, size)
+
+    def poisson(mean):
+        # Knuth's method - the mean is small (a few points per cell)
+        limit, count, product = math.exp(-mean), 0, rng.random()
+        while product > limit:
+            count += 1
+            product *= rng.random()
+        return count
+
+    def streets():
+        street = _StreetFactory(rng, extent)
+        previous_row = [[] for _ in range(cells)]  # Per cell: list of [point, degree]
+        last = None
+
+        for cell_row in range(cells):
+            current_row = [[] for _ in range(cells)]
+            for cell_column in range(cells):
+                for _ in range(poisson(points_per_cell)):
+                    point = _point((cell_column + rng.random()) * radius, (cell_row + rng.random()) * radius)
+
+                    # Earlier intersections in the neighbouring cells
+                    candidates = [vertex for column in range(cell_column - 1, cell_column + 2) if 0 <= column < cells
+                                  for vertex in previous_row[column]]
+                    candidates += [vertex for column in (cell_column - 1, cell_column) if column >= 0
+                                   for vertex in current_row[column]]
+                    candidates = sorted((math.dist(candidate[0], point), index, candidate)
+                                        for index, candidate in enumerate(candidates))
+
+                    vertex = [point, 0]
+                    links = [candidate for distance, _, candidate in candidates
+                             if candidate[1] < max_degree and distance <= radius]
+                    links = links[:rng.choice((1, 2, 2))]
+                    if not links:
+                        links = [candidates[0][2]] if candidates else ([last] if last is not None else [])
+
+                    for other in links:
+                        highway = rng.choices(("residential", "tertiary", "secondary", "primary"),
+                                              weights=(70, 15, 10, 5))[0]
+                        other[1] += 1
+                        vertex[1] += 1
+                        yield street(other[0], point, highway)
+
+                    current_row[cell_column].append(vertex)
+                    last = vertex
+            previous_row = current_row
+
+    return extent, streets()
+
+
+def ring_radial_streets(num_edges, seed=0, spacing=GRID_SPACING, spokes=8, ring_roads_every=4):
+    """
+    Ring-radial city. Ring r (radius r * spacing) has spokes * 2^k intersections (2^k <= r), so blocks have
+    similar sizes on all rings. Every intersection is joined to its neighbours on the ring and to an intersection
+    of the next ring; every ring_roads_every-th ring is a primary ring road, the main spokes are trunk roads,
+    the other streets are residential/tertiary.
+
+    :param num_edges: approximate number of directed edges of the graph (two per street)
+    :return: (extent, generator of street records)
+    """
+    rng = random.Random(seed)
+
+    def ring_size(ring):
+        return spokes * 2 ** int(math.log2(ring))
+
+    # Number of rings giving the requested number of streets (ring + radial street for every intersection)
+    rings, streets_count = 1, 2 * spokes
+    while 2 * streets_count < num_edges:
+        rings += 1
+        streets_count += 2 * ring_size(rings)
+    radius = rings * spacing
+    extent = (-radius, -radius, radius, radius)
+
+    def vertex(ring, index):
+        if ring == 0:
+            return _point(0, 0)
+        angle = 2 * math.pi * index / ring_size(ring)
+        return _point(ring * spacing * math.cos(angle), ring * spacing * math.sin(angle))
+
+    def streets():
+        street = _StreetFactory(rng, extent)
+
+        # Centre joined to the first ring by the main spokes
+        for index in range(spokes):
+            yield street(vertex(0, 0), vertex(1, index), "trunk")
+
+        for ring in range(1, rings + 1):
+            size = ring_size(ring)
+            per_spoke = size // spokes
+            ring_class = "primary" if ring % ring_roads_every == 0 else "residential"
+
+            for index in range(size):
+                yield street(vertex(ring, index), vertex(ring, (index + 1) % size), ring_class)
+
+                if ring < rings:
+                    ratio = ring_size(ring + 1) // size
+                    radial_class = "trunk" if index % per_spoke == 0 else rng.choice(("residential", "tertiary"))
+                    yield street(vertex(ring, index), vertex(ring + 1, index * ratio), radial_class)
+
+    return extent, streets()
+
+
+TOPOLOGIES = {
+    "grid": grid_streets,
+    "geometric": geometric_streets,
+    "ring_radial": ring_radial_streets,
+}
+
+
+# --- Base placement ---
+
+def base_target(extent, base, seed=0):
+    """
+    Point near which the base is placed: "center", "corner" (min x, min y), "random" or given (x, y).
+    The base is the intersection nearest to this point.
+    """
+    min_x, min_y, max_x, max_y = extent
+    if base == "center":
+        return (min_x + max_x) / 2, (min_y + max_y) / 2
+    if base == "corner":
+        return min_x, min_y
+    if base == "random":
+        rng = random.Random(seed + 1)
+        return rng.uniform(min_x, max_x), rng.uniform(min_y, max_y)
+    return tuple(base)
+
+
+def place_base(graph, target):
+    # Sets the base of the graph to the vertex nearest to 'target'
+    if isinstance(graph, CompactGraph):
+        x, y = graph.vertex_x, graph.vertex_y
+    else:
+        x = np.array([vertex.x for vertex in graph.vertices], dtype=float)
+        y = np.array([vertex.y for vertex in graph.vertices], dtype=float)
+    index = int(np.argmin((x - target[0]) ** 2 + (y - target[1]) ** 2))
+
+    if isinstance(graph, CompactGraph):
+        graph.base = index
+    else:
+        vertex = graph.vertices[index]
+        graph.add_base(vertex.x, vertex.y)
+
+
+# --- Output ---
+
+def generate_graph(topology, num_edges, seed=0, base="center", graph_cls=Graph, **parameters):
+    """
+    Generates a synthetic road network as a Graph (or CompactGraph).
+
+    :param topology: name from TOPOLOGIES
+    :param num_edges: approximate number of directed edges
+    :param base: "center", "corner", "random" or (x, y) - see base_target
+    :param parameters: topology-specific parameters (see the topology functions)
+    """
+    extent, streets = TOPOLOGIES[topology](num_edges, seed, **parameters)
+    graph = graph_cls.from_edge_records(streets, true_location=False)
+    place_base(graph, base_target(extent, base, seed))
+    return graph
+
+
+def _format_street(record):
+    (x1, y1), (x2, y2), priority, lanes = record
+    return f"({x1},{y1}) ({x2},{y2}) {priority} {lanes}\n"
+
+
+def write_layout(path, topology, num_edges, seed=0, base="center", **parameters):
+    """
+    Writes a synthetic road network to a .txt layout file (format of map_import.load_graph_from_file).
+
+    The file format takes the start of the first street as the base, so the streets are first streamed to
+    a temporary file while the street touching the intersection nearest to the base target is tracked;
+    then that street is written first and the rest is copied line by line. Memory use does not depend
+    on the size of the network.
+
+    :return: number of streets written
+    """
+    extent, streets = TOPOLOGIES[topology](num_edges, seed, **parameters)
+    target = base_target(extent, base, seed)
+
+    best_distance, base_line, count = math.inf, None, 0
+    directory = os.path.dirname(os.path.abspath(path))
+    with tempfile.TemporaryFile("w+", dir=directory) as body:
+        for record in streets:
+            start, end, priority, lanes = record
+            for point, other in ((start, end), (end, start)):
+                distance = (point[0] - target[0]) ** 2 + (point[1] - target[1]) ** 2
+                if distance < best_distance:
+                    best_distance, base_line = distance, (count, _format_street((point, other, priority, lanes)))
+            body.write(_format_street(record))
+            count += 1
+
+        body.seek(0)
+        with open(path, "w") as file:
+            if base_line is not None:
+                file.write(base_line[1])
+            for line_number, line in enumerate(body):
+                if base_line is None or line_number != base_line[0]:
+                    file.write(line)
+
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Synthetic road network generator")
+    parser.add_argument("topology", choices=sorted(TOPOLOGIES))
+    parser.add_argument("edges", type=int, help="approximate number of directed edges (two per street)")
+    parser.add_argument("output", help="output .txt layout file")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--base", default="center", help='"center", "corner", "random" or "x,y"')
+    args = parser.parse_args(argv)
+
+    base = args.base if args.base in ("center", "corner", "random") else tuple(map(float, args.base.split(",")))
+    count = write_layout(args.output, args.topology, args.edges, args.seed, base)
+    print(f"Written {count} streets ({2 * count} directed edges) to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
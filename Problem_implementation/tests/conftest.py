@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The modules of Problem_implementation are imported by their flat names (as in road_clearing_app.py)
+PROBLEM_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LAYOUTS_DIR = os.path.join(os.path.dirname(PROBLEM_DIR), "Road_layouts")
+sys.path.insert(0, PROBLEM_DIR)
@@ -0,0 +1,71 @@
+import os
+import pickle
+
+import numpy as np
+import pytest
+
+from conftest import LAYOUTS_DIR
+from binary_graph import MAGIC, HEADER_SIZE, write_binary_graph, open_binary_graph, read_header
+from data_structures import Graph, CompactGraph
+from map_import import load_graph_from_file
+
+
+def edge_multiset(graph):
+    # Edges compared by their end points and attributes - a CompactGraph keeps them in CSR order
+    return sorted((edge.start.x, edge.start.y, edge.end.x, edge.end.y, edge.length, edge.priority, edge.lanes)
+                  for edge in graph.edges)
+
+
+def write_example(tmp_path, graph_cls=CompactGraph):
+    graph = load_graph_from_file(os.path.join(LAYOUTS_DIR, "example2.txt"), graph_cls=graph_cls)
+    path = str(tmp_path / "example2.rcg")
+    write_binary_graph(graph, path)
+    return graph, path
+
+
+@pytest.mark.parametrize("graph_cls", [Graph, CompactGraph], ids=lambda cls: cls.__name__)
+def test_write_and_open_keep_the_edges(tmp_path, graph_cls):
+    graph, path = write_example(tmp_path, graph_cls)
+    mapped = open_binary_graph(path)
+
+    assert isinstance(mapped.edge_length, np.memmap)
+    assert len(mapped.vertices) == len(graph.vertices)
+    assert edge_multiset(mapped) == edge_multiset(graph)
+    assert (mapped.baza.x, mapped.baza.y) == (graph.baza.x, graph.baza.y)
+    if graph_cls is CompactGraph:  # Ids of a CompactGraph are preserved
+        np.testing.assert_array_equal(mapped.targets, graph.targets)
+
+
+def test_corrupted_or_truncated_file_is_rejected(tmp_path):
+    _, path = write_example(tmp_path)
+    with open(path, "rb") as file:
+        data = file.read()
+
+    def rejected(contents):
+        broken = str(tmp_path / "broken.rcg")
+        with open(broken, "wb") as file:
+            file.write(contents)
+        with pytest.raises(ValueError):
+            read_header(broken)
+        with pytest.raises(ValueError):
+            open_binary_graph(broken)
+
+    rejected(b"XXGRAPH\0" + data[len(MAGIC):])  # Wrong magic bytes
+    rejected(MAGIC)  # Header cut short
+    rejected(data[:len(MAGIC)] + (99).to_bytes(4, "little") + data[len(MAGIC) + 4:])  # Unknown format version
+    rejected(data[:HEADER_SIZE + (len(data) - HEADER_SIZE) // 2])  # Arrays cut short
+
+
+def test_pickled_mapped_graph_reopens_the_file(tmp_path):
+    graph, path = write_example(tmp_path)
+    mapped = open_binary_graph(path)
+    # A reference to the file, not a copy of the arrays (the default zero snow level is not stored either)
+    assert len(pickle.dumps(mapped)) < 256 < len(pickle.dumps(graph))
+
+    mapped.snow_level[:] = 3
+    restored = pickle.loads(pickle.dumps(mapped))
+    assert restored.mapped_file == os.path.abspath(path)
+    assert isinstance(restored.edge_length, np.memmap)
+    assert restored.base == mapped.base
+    assert edge_multiset(restored) == edge_multiset(graph)
+    np.testing.assert_array_equal(restored.snow_level, mapped.snow_level)
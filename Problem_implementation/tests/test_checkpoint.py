@@ -0,0 +1,66 @@
+import os
+import random
+import threading
+
+import pytest
+
+from conftest import LAYOUTS_DIR
+from data_structures import route_snapshot
+from map_import import load_graph_from_file
+from solution import RoadClearingProblem, Machine
+
+ITERATIONS = 600
+STOP_AT = 300
+SCHEDULES = [
+    ("geometric", {}),
+    ("adaptive", {'window': 20, 'reheat_after': 40, 'reheat_temperature': 1000}),
+]
+
+
+class StopAtIteration:
+    # Event sink that stops the chain (as the GUI's Cancel button does) after the given iteration
+    enabled = True
+
+    def __init__(self, iteration):
+        self.iteration = iteration
+        self.stop_event = threading.Event()
+
+    def emit(self, event, **fields):
+        if event == "iteration" and fields['iteration'] == self.iteration:
+            self.stop_event.set()
+
+    def close(self):
+        pass
+
+
+def make_problem(seed, event_sink=None):
+    random.seed(seed)
+    road_layout = load_graph_from_file(os.path.join(LAYOUTS_DIR, "example2.txt"))
+    return RoadClearingProblem([3, 4, 5, 6], road_layout, [Machine(30), Machine(40), Machine(50)], 2,
+                               event_sink=event_sink)
+
+
+def summary(result):
+    solution, best_danger, diagnostics = result
+    return best_danger, route_snapshot(solution), diagnostics[:3], diagnostics[4]
+
+
+@pytest.mark.parametrize("batch_size", [1, 4])
+@pytest.mark.parametrize("schedule,schedule_options", SCHEDULES, ids=[name for name, _ in SCHEDULES])
+def test_resumed_chain_makes_the_same_moves(tmp_path, schedule, schedule_options, batch_size):
+    parameters = dict(initial_temperature=500, cooling_rate=0.99, max_iterations=ITERATIONS,
+                      evaluation="vectorized" if batch_size > 1 else "incremental", batch_size=batch_size,
+                      schedule=schedule, schedule_options=schedule_options)
+    expected = summary(make_problem(5).simulated_annealing(**parameters))
+
+    path = str(tmp_path / "chain.npz")
+    sink = StopAtIteration(STOP_AT)
+    stopped = make_problem(5, sink).simulated_annealing(**parameters, stop_event=sink.stop_event,
+                                                        checkpoint_path=path, checkpoint_every=100)
+    assert len(stopped[2][0]) < ITERATIONS + 1
+
+    # Different initial routes - they are replaced by the checkpointed ones
+    resumed = summary(make_problem(99).resume_from(path))
+    assert resumed == expected
+    if 'reheat_after' in schedule_options:
+        assert any(decision['decision'] == "reheat" for decision in resumed[3])
@@ -0,0 +1,23 @@
+import os
+import pickle
+
+from conftest import LAYOUTS_DIR
+from data_structures import Graph, CompactGraph
+from map_import import load_graph_from_file
+
+
+def test_get_edge_by_coordinates_matches_graph():
+    path = os.path.join(LAYOUTS_DIR, "example2.txt")
+    graph = load_graph_from_file(path, graph_cls=Graph)
+    compact = load_graph_from_file(path, graph_cls=CompactGraph)
+
+    for edge in graph.edges:
+        start, end = (edge.start.x, edge.start.y), (edge.end.x, edge.end.y)
+        found = compact.get_edge(start, end)
+        assert (found.start.x, found.start.y, found.end.x, found.end.y) == start + end
+        assert found.priority == edge.priority and found.lanes == edge.lanes
+    assert compact.get_edge((-1e9, -1e9), (graph.edges[0].end.x, graph.edges[0].end.y)) is None
+
+    # The coordinate index is built lazily and not pickled
+    assert compact._vertex_of_point is not None
+    assert pickle.loads(pickle.dumps(compact))._vertex_of_point is None
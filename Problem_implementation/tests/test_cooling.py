@@ -0,0 +1,31 @@
+import random
+
+import pytest
+
+from cooling import get_schedule
+
+SCHEDULE_OPTIONS = [
+    ("geometric", {}),
+    ("geometric", {'reheat_after': 7, 'min_temperature': 5}),
+    ("lundy_mees", {'reheat_after': 3, 'max_reheats': 4}),
+    ("logarithmic", {'reheat_after': 5, 'min_temperature': 20}),
+    ("adaptive", {'window': 10}),
+    ("adaptive", {'window': 4, 'reheat_after': 6}),
+]
+
+
+@pytest.mark.parametrize("name,options", SCHEDULE_OPTIONS)
+def test_preview_matches_update_in_batches(name, options):
+    rng = random.Random(0)
+    schedule = get_schedule(name, 100, 0.9, 400, options)
+    iteration = 0
+    while iteration < 400 and not schedule.frozen():
+        temperatures = schedule.preview(iteration, 8)
+        # In a batch every step but the last is rejected; the last one may be accepted and improve the best
+        for offset, temperature in enumerate(temperatures):
+            assert schedule.temperature == temperature
+            last = offset == len(temperatures) - 1
+            accepted = last and rng.random() < 0.5
+            schedule.update(iteration, accepted, accepted and rng.random() < 0.3)
+            iteration += 1
+    assert any(decision['decision'] == "reheat" for decision in schedule.decisions) == ('reheat_after' in options)
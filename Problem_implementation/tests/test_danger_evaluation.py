@@ -0,0 +1,93 @@
+import logging
+import os
+import random
+
+import pytest
+
+from conftest import LAYOUTS_DIR
+from data_structures import Graph, CompactGraph
+from danger_evaluation import IncrementalDangerEvaluator, VectorizedDangerEvaluator
+from map_import import load_graph_from_file
+from solution import RoadClearingProblem, Machine
+
+LAYOUTS = ["example1.txt", "example2.txt", "example3.txt"]
+GRAPH_CLASSES = [Graph, CompactGraph]
+FORECASTS = {"integer": [3, 4, 5, 6], "fractional": [0.1, 0.7, 1.3, 2.9, 0.3]}
+MOVES = 60
+
+
+def make_problem(layout, graph_cls, forecast, seed=0):
+    random.seed(seed)
+    road_layout = load_graph_from_file(os.path.join(LAYOUTS_DIR, layout), graph_cls=graph_cls)
+    return RoadClearingProblem(FORECASTS[forecast], road_layout, [Machine(30), Machine(40)], 2)
+
+
+@pytest.mark.parametrize("forecast", sorted(FORECASTS))
+@pytest.mark.parametrize("graph_cls", GRAPH_CLASSES, ids=lambda cls: cls.__name__)
+@pytest.mark.parametrize("layout", LAYOUTS)
+def test_incremental_matches_simulation_after_random_moves(layout, graph_cls, forecast):
+    problem = make_problem(layout, graph_cls, forecast)
+    evaluate = problem.get_danger_evaluator("incremental")
+    assert evaluate() == problem.simulate_danger()
+
+    for _ in range(MOVES):
+        move = problem.generate_neighbor(50, [4])
+        changed = {move.machine_index} if move is not None else set()
+        assert evaluate(changed) == problem.simulate_danger()
+        if move is not None and random.random() < 0.5:  # Rejected moves are undone, as in metropolis_step
+            move.undo(problem.machines)
+            assert evaluate({move.machine_index}) == problem.simulate_danger()
+
+
+@pytest.mark.parametrize("forecast", sorted(FORECASTS))
+@pytest.mark.parametrize("graph_cls", GRAPH_CLASSES, ids=lambda cls: cls.__name__)
+@pytest.mark.parametrize("layout", LAYOUTS)
+def test_vectorized_matches_simulation_bit_for_bit(layout, graph_cls, forecast):
+    problem = make_problem(layout, graph_cls, forecast)
+    evaluator = VectorizedDangerEvaluator(problem.road_layout, problem.snowfall_forecast)
+    assert evaluator.evaluate(problem.machines) == problem.simulate_danger()
+
+    for _ in range(MOVES):
+        problem.generate_neighbor(50, [4])
+        assert evaluator.evaluate(problem.machines) == problem.simulate_danger()
+
+
+@pytest.mark.parametrize("forecast", sorted(FORECASTS))
+@pytest.mark.parametrize("graph_cls", GRAPH_CLASSES, ids=lambda cls: cls.__name__)
+@pytest.mark.parametrize("layout", LAYOUTS)
+def test_vectorized_moves_match_simulation(layout, graph_cls, forecast):
+    problem = make_problem(layout, graph_cls, forecast)
+    evaluator = VectorizedDangerEvaluator(problem.road_layout, problem.snowfall_forecast)
+
+    for _ in range(MOVES // 10):
+        moves = []
+        expected = []
+        for _ in range(8):
+            move = problem.generate_neighbor(50, [4])
+            expected.append(problem.simulate_danger())
+            if move is not None:
+                move.undo(problem.machines)  # Every candidate starts from the current solution
+            moves.append(move)
+        assert evaluator.evaluate_moves(problem.machines, moves) == expected
+        if moves[-1] is not None:
+            moves[-1].apply(problem.machines)
+
+
+def test_incremental_evaluator_rejects_fractional_forecast():
+    road_layout = load_graph_from_file(os.path.join(LAYOUTS_DIR, LAYOUTS[0]))
+    with pytest.raises(ValueError):
+        IncrementalDangerEvaluator(road_layout, FORECASTS["fractional"])
+    IncrementalDangerEvaluator(road_layout, [3.0, 4.0, 5.0])  # Whole numbers are exact
+
+
+def test_fractional_forecast_replaces_incremental_evaluation_with_a_warning(caplog):
+    problem = make_problem(LAYOUTS[0], Graph, "fractional")
+    with caplog.at_level(logging.WARNING, logger="solution"):
+        evaluate = problem.get_danger_evaluator("incremental")
+    assert evaluate() == problem.simulate_danger()
+    assert "replaced by the vectorized one" in caplog.text
+
+    caplog.clear()
+    with caplog.at_level(logging.WARNING, logger="solution"):
+        make_problem(LAYOUTS[0], Graph, "integer").get_danger_evaluator("incremental")
+    assert not caplog.records
@@ -0,0 +1,23 @@
+import queue
+
+import events
+from events import QueueEventSink
+
+
+def test_queue_sink_throttles_listed_events(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(events.time, "monotonic", lambda: now[0])
+    progress = queue.Queue()
+    sink = QueueEventSink(progress, events=["iteration", "schedule"], throttle={"iteration": 0.125})
+
+    for iteration in range(1000):
+        now[0] = iteration / 1024  # Exact in binary floating point
+        sink.emit("iteration", iteration=iteration)
+    sink.emit("schedule", iteration=999)
+    sink.emit("schedule", iteration=999)
+    sink.emit("termination", reason="max_iterations")
+
+    queued = [progress.get_nowait() for _ in range(progress.qsize())]
+    assert [fields['iteration'] for event, fields in queued if event == "iteration"] == list(range(0, 1000, 128))
+    assert [event for event, _ in queued].count("schedule") == 2  # Not throttled
+    assert "termination" not in [event for event, _ in queued]  # Not subscribed
@@ -0,0 +1,70 @@
+import re
+
+import pytest
+
+from data_structures import Graph, CompactGraph
+from map_import import NETWORK_EXCLUSIONS, MAIN_ROADS, _way_filter, _convert_osm_graph
+
+
+def test_network_filter_keeps_roads_of_the_network_type():
+    drive = _way_filter("drive")
+    assert drive({"highway": "residential"})
+    assert drive({"highway": ["primary", "secondary"]})  # Merged ways of a simplified edge
+    assert not drive({"highway": "footway"})
+    assert not drive({"highway": "residential", "access": "private"})
+    assert not drive({"highway": "unclassified", "service": "parking_aisle"})
+    assert not drive({"name": "no highway tag"})
+
+    walk = _way_filter("walk")
+    assert walk({"highway": "footway"})
+    assert not walk({"highway": "motorway_link"})  # Regexes are searched, as in Overpass
+
+    with pytest.raises(ValueError):
+        _way_filter("boat")
+
+
+def test_road_types_replace_the_network_filter():
+    main_roads = _way_filter(road_types=MAIN_ROADS)
+    assert main_roads({"highway": "primary"})
+    assert not main_roads({"highway": "residential"})
+    assert main_roads({"highway": "trunk_link", "access": "private"})
+
+    custom = _way_filter(road_types=["service"])
+    assert custom({"highway": "service", "service": "parking_aisle"})
+
+
+def test_network_exclusions_follow_osmnx():
+    ox = pytest.importorskip("osmnx")
+    get_network_filter = getattr(getattr(ox, "_overpass", None), "_get_network_filter", None)
+    if get_network_filter is None:
+        pytest.skip("this OSMnx version does not expose its network filters")
+
+    for network_type, exclusions in NETWORK_EXCLUSIONS.items():
+        conditions = dict(re.findall(r'\["([^"]+)"!~"([^"]*)"\]', get_network_filter(network_type)))
+        kept = {key: regex for key, regex in conditions.items() if key in ox.settings.useful_tags_way}
+        assert {key: set(regex.split("|")) for key, regex in exclusions.items()} == \
+               {key: set(regex.split("|")) for key, regex in kept.items()}, network_type
+
+
+def osm_graph():
+    nx = pytest.importorskip("networkx")
+    pytest.importorskip("osmnx")
+    G_osm = nx.MultiDiGraph(crs="epsg:4326")
+    nodes = [(101, 19.930, 50.060), (102, 19.931, 50.060), (103, 19.931, 50.061), (104, 19.9310000001, 50.061)]
+    for node, x, y in nodes:
+        G_osm.add_node(node, x=x, y=y)
+    G_osm.add_edge(101, 102, highway="primary", lanes="2")
+    G_osm.add_edge(102, 103, highway=["residential", "service"])  # Merged ways of a simplified edge, no lanes
+    G_osm.add_edge(104, 101, highway="tertiary", lanes="2;3")  # 104 is merged with 103 by coord_precision
+    return G_osm
+
+
+@pytest.mark.parametrize("graph_cls", [Graph, CompactGraph], ids=lambda cls: cls.__name__)
+def test_convert_osm_graph_keeps_osm_node_ids_on_vertices(graph_cls):
+    graph = _convert_osm_graph(osm_graph(), (50.0605, 19.9305), 800, 7, graph_cls)
+
+    assert [vertex.osm_id for vertex in graph.vertices] == [101, 102, 103]
+    assert graph.osm_node_ids.tolist() == [101, 102, 103]
+    # Every OSM edge becomes a pair of opposite edges (a CompactGraph keeps them in CSR order)
+    assert sorted((edge.start.osm_id, edge.end.osm_id, edge.lanes) for edge in graph.edges) == \
+           [(101, 102, 2), (101, 103, 1), (102, 101, 2), (102, 103, 1), (103, 101, 1), (103, 102, 1)]
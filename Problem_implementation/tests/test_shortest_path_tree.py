@@ -0,0 +1,30 @@
+import os
+
+import numpy as np
+import pytest
+
+from conftest import LAYOUTS_DIR
+from data_structures import Graph, CompactGraph
+from map_import import load_graph_from_file
+
+
+@pytest.mark.parametrize("graph_cls", [Graph, CompactGraph], ids=lambda cls: cls.__name__)
+def test_edge_arrival_times_are_cached_per_speed_with_the_tree(graph_cls):
+    road_layout = load_graph_from_file(os.path.join(LAYOUTS_DIR, "example2.txt"), graph_cls=graph_cls)
+    path_tree = road_layout.shortest_path_tree()
+
+    arrival_times = path_tree.edge_arrival_times(30)
+    assert path_tree.edge_arrival_times(30) is arrival_times
+    assert path_tree.edge_arrival_times(40) is not arrival_times
+    np.testing.assert_array_equal(arrival_times,
+                                  path_tree.distance[path_tree.edge_start] / 30 + path_tree.edge_length / 30)
+    with pytest.raises(ValueError):
+        arrival_times[0] = 0
+
+    # A new base replaces the tree together with its arrival times
+    vertex = road_layout.vertices[-1]
+    if graph_cls is CompactGraph:
+        road_layout.base = vertex.id
+    else:
+        road_layout.add_base(vertex.x, vertex.y)
+    assert road_layout.shortest_path_tree().edge_arrival_times(30) is not arrival_times
@@ -0,0 +1,23 @@
+import os
+import random
+
+import pytest
+
+from conftest import LAYOUTS_DIR
+from map_import import load_graph_from_file
+from solution import RoadClearingProblem, Machine, neighbour_functions
+
+
+def test_neighbour_functions_are_checked_before_the_annealing():
+    assert neighbour_functions(None) == [4]
+    assert neighbour_functions([3, 2, 1, 0]) == [4]
+    assert neighbour_functions((0, 2)) == [0, 2]
+
+    random.seed(0)
+    road_layout = load_graph_from_file(os.path.join(LAYOUTS_DIR, "example1.txt"))
+    problem = RoadClearingProblem([3, 4, 5], road_layout, [Machine(30), Machine(40)], 2)
+    for invalid in ([], [5], [4, 0], [1, 7]):
+        with pytest.raises(ValueError, match="No neighborhood function provided"):
+            problem.simulated_annealing(100, 0.99, 10, choose_neighbour_function=invalid)
+        with pytest.raises(ValueError, match="No neighborhood function provided"):
+            problem.generate_neighbor(1, invalid)